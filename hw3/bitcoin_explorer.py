@@ -7,11 +7,21 @@ import json
 import time
 from typing import Dict, Any
 
+from block_schema import (
+    INSERT_BLOCK_SQL, STORAGE_FORMAT, create_block_schema, detect_storage_format,
+    block_row, copy_blocks, fill_tx_columns, add_tx_indexes, open_bulk_db, publish_bulk_db
+)
+from partitioned_db import PARTITION_SIZE, PartitionWriter
+
 app = App(name="chongchen-bitcoin-explorer")  # Use modal.App
 
 # Define the volume and Docker image
 volume = Volume.from_name("chongchen-bitcoin-data", create_if_missing=True)
-bitcoin_image = modal.Image.debian_slim().pip_install("requests")
+bitcoin_image = (
+    modal.Image.debian_slim()
+    .pip_install("requests")
+    .add_local_python_source("block_schema", "partitioned_db")
+)
 
 class BitcoinRPC:
     """Handles RPC communication with Bitcoin node via Chainstack"""
@@ -61,79 +71,45 @@ class BitcoinRPC:
         resp = self.make_rpc_call("getblock", [block_hash, 2])
         return resp["result"]
 
-def get_db_connection():
+DB_PATH = "/data/bitcoin.db"
+BULK_SCRATCH_PATH = "/tmp/bitcoin_bulk.db"  # Container-local disk, not the Volume
+
+def get_db_connection(db_path: str = DB_PATH):
     """Connect to SQLite database in Modal Volume"""
-    return sqlite3.connect('/data/bitcoin.db')
+    return sqlite3.connect(db_path)
 
-def init_db():
-    """Initialize database schema if not exists"""
+def init_db() -> str:
+    """Initialize database schema if not exists; returns the storage format"""
     with get_db_connection() as conn:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS block (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                hash VARCHAR(255) NOT NULL,
-                confirmations INTEGER NOT NULL,
-                height INTEGER NOT NULL,
-                version INTEGER NOT NULL,
-                versionHex VARCHAR(255) NOT NULL,
-                merkleroot VARCHAR(255) NOT NULL,
-                time INTEGER NOT NULL,
-                mediantime INTEGER NOT NULL,
-                nonce INTEGER NOT NULL,
-                bits VARCHAR(255) NOT NULL,
-                difficulty REAL NOT NULL,
-                chainwork VARCHAR(255) NOT NULL,
-                nTx INTEGER NOT NULL,
-                previousblockhash VARCHAR(255) NOT NULL,
-                nextblockhash VARCHAR(255) NOT NULL,
-                strippedsize INTEGER NOT NULL,
-                size INTEGER NOT NULL,
-                weight INTEGER NOT NULL,
-                tx JSON NOT NULL
-            );
-        """)
+        # WAL lets the read-only query pools read while blocks are written
+        conn.execute("PRAGMA journal_mode = WAL")
+        storage_format = create_block_schema(conn)
         conn.commit()
+    return storage_format
 
 def get_max_height() -> int:
     """Get the highest block height from the database"""
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT MAX(height) AS max_height FROM block")
+        cursor.execute("SELECT MAX(height) AS max_height FROM block_header")
         row = cursor.fetchone()
         return row[0] if row[0] is not None else -1
 
-def save_block(block_data: Dict):
-    """Save block to database and Volume"""
+def save_block(block_data: Dict, conn: sqlite3.Connection = None,
+               storage_format: str = "hex"):
+    """Save block to database and Volume.
+
+    With ``conn`` (bulk-load mode) the row is written on the caller's
+    connection and committing is left to the caller.
+    """
+    row = block_row(block_data, storage_format)
+    if conn is not None:
+        conn.execute(INSERT_BLOCK_SQL, row)
+        return
+
     # Insert into SQLite
     with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO block (
-                hash, confirmations, height, version, versionHex, merkleroot,
-                time, mediantime, nonce, bits, difficulty, chainwork, nTx,
-                previousblockhash, nextblockhash, strippedsize, size, weight, tx
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            block_data['hash'],
-            block_data.get('confirmations', 0),
-            block_data['height'],
-            block_data['version'],
-            block_data['versionHex'],
-            block_data['merkleroot'],
-            block_data['time'],
-            block_data.get('mediantime', block_data['time']),
-            block_data['nonce'],
-            block_data['bits'],
-            block_data['difficulty'],
-            block_data['chainwork'],
-            block_data['nTx'],
-            block_data.get('previousblockhash', ''),
-            block_data.get('nextblockhash', ''),
-            block_data['strippedsize'],
-            block_data['size'],
-            block_data['weight'],
-            json.dumps(block_data['tx'])
-        ))
+        conn.execute(INSERT_BLOCK_SQL, row)
         conn.commit()
     
     # Save JSON to Volume
@@ -149,30 +125,130 @@ def save_block(block_data: Dict):
     timeout=86400  # Extend timeout for long syncing
 )
 def sync_blocks():
-    """Main function to sync blocks continuously"""
-    init_db()
+    """Main function to sync blocks continuously.
+
+    With BLOCK_PARTITION_SIZE set, blocks are also written to per-range
+    partition files under /data/partitions. /data/bitcoin.db is always
+    written, since every reader opens it; partitions that lag it (e.g. a
+    layout enabled on an existing database) are backfilled from the node.
+    """
+    storage_format = init_db()
+    writer = PartitionWriter(storage_format=storage_format) if PARTITION_SIZE else None
     rpc = BitcoinRPC()
     
     while True:
         current_height = rpc.get_block_count()
         max_synced = get_max_height()
+        partition_synced = writer.max_height() if writer else max_synced
+        start_height = min(max_synced, partition_synced) + 1
         
-        if max_synced >= current_height:
+        if start_height > current_height:
             print("All blocks synced. Sleeping for 10 minutes.")
             time.sleep(600)
             continue
         
-        print(f"Syncing blocks {max_synced + 1} to {current_height}")
-        for height in range(max_synced + 1, current_height + 1):
+        print(f"Syncing blocks {start_height} to {current_height}")
+        for height in range(start_height, current_height + 1):
             try:
                 block_hash = rpc.get_block_hash(height)
                 block_data = rpc.get_block(block_hash)
-                save_block(block_data)
+                if height > max_synced:
+                    save_block(block_data, storage_format=storage_format)
+                if writer and height > partition_synced:
+                    writer.save_block(block_data)
                 print(f"Block {height} synced")
             except Exception as e:
                 print(f"Failed to sync block {height}: {e}")
                 break  # Retry from current height on next iteration
 
+@app.function(
+    volumes={"/data": volume},
+    image=bitcoin_image,
+    secrets=[Secret.from_name("chongchen-bitcoin-chainstack")],
+    timeout=86400
+)
+def bulk_load_blocks(end_height: int = None, commit_every: int = 1000):
+    """Initial import: load blocks 0..end_height locally, then publish.
+
+    Replaces /data/bitcoin.db, so it is only meant for an empty Volume;
+    ``sync_blocks`` picks up from the published tip afterwards.
+    """
+    if os.path.exists(DB_PATH):
+        try:
+            has_blocks = get_max_height() >= 0
+        except sqlite3.OperationalError:  # File exists but no block table yet
+            has_blocks = False
+        if has_blocks:
+            print(f"{DB_PATH} already has blocks; use sync_blocks instead.")
+            return
+
+    rpc = BitcoinRPC()
+    if end_height is None:
+        end_height = rpc.get_block_count()
+
+    conn = open_bulk_db(BULK_SCRATCH_PATH)
+    start = time.time()
+    for height in range(0, end_height + 1):
+        block_hash = rpc.get_block_hash(height)
+        save_block(rpc.get_block(block_hash), conn, STORAGE_FORMAT)
+        if (height + 1) % commit_every == 0:
+            conn.commit()
+            print(f"Loaded {height + 1} blocks ({time.time() - start:.1f}s)")
+
+    publish_bulk_db(conn, DB_PATH)
+    volume.commit()
+    print(f"Published blocks 0 to {end_height} in {time.time() - start:.1f}s")
+
+@app.function(
+    volumes={"/data": volume},
+    image=bitcoin_image,
+    timeout=86400
+)
+def convert_storage_format(storage_format: str = "binary"):
+    """Rewrite /data/bitcoin.db with hashes stored as hex text or BLOBs.
+
+    Goes through the bulk-load scratch DB, so the result is indexed,
+    compacted and swapped in atomically. Stop sync_blocks while it runs.
+    """
+    with get_db_connection() as conn:
+        current = detect_storage_format(conn)
+    if current == storage_format:
+        print(f"{DB_PATH} is already stored as {storage_format}")
+        return
+
+    start = time.time()
+    conn = open_bulk_db(BULK_SCRATCH_PATH, storage_format)
+    copy_blocks(conn, DB_PATH, storage_format)
+    before = os.path.getsize(DB_PATH)
+    publish_bulk_db(conn, DB_PATH)
+    volume.commit()
+    print(f"Converted {current} -> {storage_format}: {before} -> "
+          f"{os.path.getsize(DB_PATH)} bytes in {time.time() - start:.1f}s")
+
+@app.function(
+    volumes={"/data": volume},
+    image=bitcoin_image,
+    timeout=86400
+)
+def backfill_tx_columns(indexes: str = ""):
+    """Fill the tx summary columns of /data/bitcoin.db and index them.
+
+    Adds the block_schema.TX_COLUMNS a database from before them lacks,
+    computes them for every row that has none (one pass over the tx JSON,
+    committed per batch so sync_blocks keeps writing), and indexes
+    ``indexes``: a comma-separated subset of TX_COLUMNS, all by default.
+    """
+    names = [c.strip() for c in indexes.split(",") if c.strip()] or None
+    start = time.time()
+    init_db()
+    with get_db_connection() as conn:
+        filled = fill_tx_columns(conn)
+        indexed = add_tx_indexes(conn, names)
+        conn.execute("ANALYZE")
+        conn.commit()
+    volume.commit()
+    print(f"Filled {filled} rows, indexed {indexed or 'no new columns'} in {time.time() - start:.1f}s")
+
 if __name__ == "__main__":
     with app.run():
         sync_blocks.call()
\ No newline at end of file
@@ -0,0 +1,409 @@
+import os
+import json
+import sqlite3
+from typing import Optional, Dict, Any, List
+
+# "hex" keeps the 32-byte hashes as 64-char text (the original layout);
+# "binary" stores them as 32-byte BLOBs, roughly halving rows and indexes.
+# The format only applies to new databases; existing ones keep theirs.
+STORAGE_FORMATS = ("hex", "binary")
+STORAGE_FORMAT = os.environ.get("BLOCK_STORAGE_FORMAT", "hex")
+
+HASH_COLUMNS = ("hash", "merkleroot", "chainwork", "previousblockhash")
+
+BLOCK_HEADER_DDL = """
+    CREATE TABLE IF NOT EXISTS block_header (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        hash {hash_type} NOT NULL,
+        height INTEGER NOT NULL,
+        version INTEGER NOT NULL,
+        versionHex VARCHAR(255) NOT NULL,
+        merkleroot {hash_type} NOT NULL,
+        time INTEGER NOT NULL,
+        mediantime INTEGER NOT NULL,
+        nonce INTEGER NOT NULL,
+        bits VARCHAR(255) NOT NULL,
+        difficulty REAL NOT NULL,
+        chainwork {hash_type} NOT NULL,
+        nTx INTEGER NOT NULL,
+        previousblockhash {hash_type} NOT NULL,
+        strippedsize INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        weight INTEGER NOT NULL,
+        tx JSON NOT NULL,
+        total_output_value REAL,
+        input_count INTEGER,
+        output_count INTEGER,
+        coinbase_value REAL,
+        total_fee REAL
+    );
+"""
+
+# confirmations and nextblockhash change with every new tip, so they are
+# derived here from the tip height and the parent linkage instead of being
+# stored. Column names and order match the old stored table, and hashes are
+# always presented as lowercase hex whatever the storage format. With binary
+# storage no index covers the hex expressions; hw4's query_planner rewrites
+# hash filters and joins in generated SQL into block_header index seeks.
+BLOCK_VIEW_DDL = """
+    CREATE {temp}VIEW IF NOT EXISTS block AS
+    SELECT
+        b.id,
+        {hash} AS hash,
+        {tip} - b.height + 1 AS confirmations,
+        b.height,
+        b.version,
+        b.versionHex,
+        {merkleroot} AS merkleroot,
+        b.time,
+        b.mediantime,
+        b.nonce,
+        b.bits,
+        b.difficulty,
+        {chainwork} AS chainwork,
+        b.nTx,
+        {previousblockhash} AS previousblockhash,
+        COALESCE(
+            (SELECT {next_hash} FROM {children} n WHERE n.previousblockhash = b.hash),
+            ''
+        ) AS nextblockhash,
+        b.strippedsize,
+        b.size,
+        b.weight,
+        b.tx,
+        b.total_output_value,
+        b.input_count,
+        b.output_count,
+        b.coinbase_value,
+        b.total_fee
+    FROM block_header b;
+"""
+
+BLOCK_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_block_height ON block_header (height)",
+    "CREATE INDEX IF NOT EXISTS idx_block_hash ON block_header (hash)",
+    "CREATE INDEX IF NOT EXISTS idx_block_time ON block_header (time)",
+    # Child lookup behind the derived nextblockhash
+    "CREATE INDEX IF NOT EXISTS idx_block_previousblockhash ON block_header (previousblockhash)",
+]
+
+# Summaries of the tx JSON, stored as plain block_header columns so
+# queries can filter on fees or output counts without parsing the blob.
+# block_row computes them on insert and fill_tx_columns fills rows
+# written before the columns existed; no SQL function is involved, so any
+# connection (the sqlite3 CLI, other writers) can read and write the table.
+# Indexes on them are optional (add_tx_indexes).
+TX_COLUMNS = {
+    "total_output_value": "REAL",
+    "input_count": "INTEGER",
+    "output_count": "INTEGER",
+    "coinbase_value": "REAL",
+    "total_fee": "REAL",
+}
+
+INSERT_BLOCK_SQL = """
+    INSERT INTO block_header (
+        hash, height, version, versionHex, merkleroot, time, mediantime,
+        nonce, bits, difficulty, chainwork, nTx, previousblockhash,
+        strippedsize, size, weight, tx, total_output_value, input_count,
+        output_count, coinbase_value, total_fee
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def _check_format(storage_format: str):
+    if storage_format not in STORAGE_FORMATS:
+        raise ValueError(f"Unknown storage format: {storage_format!r}")
+
+def encode_hash(value: Optional[str], storage_format: str = "hex"):
+    """Convert a hex hash into its stored representation"""
+    if storage_format == "binary":
+        return bytes.fromhex(value or "")
+    return value or ""
+
+def decode_hash(value) -> str:
+    """Convert a stored hash (hex text or BLOB) back to hex"""
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).hex()
+    return value
+
+def _round_btc(value: float) -> float:
+    return round(value, 8)
+
+def tx_summary(tx) -> tuple:
+    """TX_COLUMNS values, in order, for a block's tx list (or its JSON).
+
+    Values are in BTC. coinbase_value is NULL without a coinbase input and
+    total_fee is NULL when no transaction carries a ``fee`` field.
+    """
+    txs = json.loads(tx) if isinstance(tx, str) else tx
+    if not isinstance(txs, list):
+        txs = []
+    outputs = [out for t in txs for out in t.get("vout", [])]
+    coinbase_value = None
+    if txs and any("coinbase" in vin for vin in txs[0].get("vin", [])):
+        coinbase_value = _round_btc(sum(out.get("value") or 0 for out in txs[0].get("vout", [])))
+    fees = [t["fee"] for t in txs if t.get("fee") is not None]
+    return (
+        _round_btc(sum(out.get("value") or 0 for out in outputs)),
+        sum(len(t.get("vin", [])) for t in txs),
+        len(outputs),
+        coinbase_value,
+        _round_btc(sum(fees)) if fees else None,
+    )
+
+def block_row(block_data: Dict[str, Any], storage_format: str = "hex") -> tuple:
+    """Map an RPC block onto the INSERT_BLOCK_SQL parameter tuple"""
+    tx = block_data['tx']  # Already-encoded JSON is stored as is
+    return (
+        encode_hash(block_data['hash'], storage_format),
+        block_data['height'],
+        block_data['version'],
+        block_data['versionHex'],
+        encode_hash(block_data['merkleroot'], storage_format),
+        block_data['time'],
+        block_data.get('mediantime', block_data['time']),
+        block_data['nonce'],
+        block_data['bits'],
+        block_data['difficulty'],
+        encode_hash(block_data['chainwork'], storage_format),
+        block_data['nTx'],
+        encode_hash(block_data.get('previousblockhash'), storage_format),
+        block_data['strippedsize'],
+        block_data['size'],
+        block_data['weight'],
+        tx if isinstance(tx, str) else json.dumps(tx),
+        *tx_summary(tx)
+    )
+
+def detect_storage_format(conn: sqlite3.Connection) -> Optional[str]:
+    """Return the storage format of an existing block_header, else None"""
+    for _, name, col_type, *_ in conn.execute("PRAGMA table_info(block_header)"):
+        if name == "hash":
+            return "binary" if col_type.upper() == "BLOB" else "hex"
+    return None
+
+def create_block_table(conn: sqlite3.Connection, storage_format: str = "hex") -> List[str]:
+    """Create the block_header table (without indexes or views).
+
+    An existing table gets any missing TX_COLUMNS; returns the ones added.
+    """
+    _check_format(storage_format)
+    hash_type = "BLOB" if storage_format == "binary" else "VARCHAR(255)"
+    conn.execute(BLOCK_HEADER_DDL.format(hash_type=hash_type))
+    return ensure_tx_columns(conn)
+
+def create_block_indexes(conn: sqlite3.Connection):
+    """Create secondary indexes on block_header"""
+    for statement in BLOCK_INDEXES:
+        conn.execute(statement)
+
+def ensure_tx_columns(conn: sqlite3.Connection) -> List[str]:
+    """Add missing TX_COLUMNS to block_header as plain (NULL) columns.
+
+    Databases from before the columns were stored had them as VIRTUAL
+    generated columns calling Python functions; those are dropped, with
+    their indexes and the block view, and re-added as plain columns.
+    Returns the columns added; fill_tx_columns fills them.
+    """
+    columns = {name: hidden for _, name, *_, hidden in conn.execute("PRAGMA table_xinfo(block_header)")}
+    added = []
+    for name, col_type in TX_COLUMNS.items():
+        if columns.get(name) in (2, 3):  # Generated
+            conn.execute(f"DROP INDEX IF EXISTS idx_block_{name}")
+            conn.execute("DROP VIEW IF EXISTS block")
+            conn.execute(f"ALTER TABLE block_header DROP COLUMN {name}")
+        elif name in columns:
+            continue
+        conn.execute(f"ALTER TABLE block_header ADD COLUMN {name} {col_type}")
+        added.append(name)
+    return added
+
+def fill_tx_columns(conn: sqlite3.Connection, batch: int = 1000) -> int:
+    """Compute TX_COLUMNS for rows that lack them; returns the rows filled.
+
+    Works in id order and commits per batch, so a writer waiting on the
+    lock only waits for one batch.
+    """
+    names = list(TX_COLUMNS)
+    update = f"UPDATE block_header SET {', '.join(f'{n} = ?' for n in names)} WHERE id = ?"
+    filled, last_id = 0, 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, tx FROM block_header WHERE id > ? AND output_count IS NULL ORDER BY id LIMIT ?",
+            (last_id, batch)
+        ).fetchall()
+        if not rows:
+            return filled
+        conn.executemany(update, [(*tx_summary(tx), row_id) for row_id, tx in rows])
+        conn.commit()
+        filled += len(rows)
+        last_id = rows[-1][0]
+
+def tx_indexes(conn: sqlite3.Connection) -> List[str]:
+    """TX_COLUMNS that have an index on block_header"""
+    indexes = {name for _, name, *_ in conn.execute("PRAGMA index_list(block_header)")}
+    return [name for name in TX_COLUMNS if f"idx_block_{name}" in indexes]
+
+def add_tx_indexes(conn: sqlite3.Connection, names: Optional[List[str]] = None) -> List[str]:
+    """Index TX_COLUMNS (all by default); returns the newly indexed ones"""
+    existing = tx_indexes(conn)
+    added = []
+    for name in names or list(TX_COLUMNS):
+        if name not in TX_COLUMNS:
+            raise ValueError(f"Unknown tx column: {name!r}")
+        if name in existing:
+            continue
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_block_{name} ON block_header ({name})")
+        added.append(name)
+    conn.commit()
+    return added
+
+def create_block_views(conn: sqlite3.Connection, storage_format: str = "hex",
+                       temp: bool = False,
+                       tip: str = "(SELECT MAX(height) FROM block_header)",
+                       children: str = "block_header"):
+    """Create the backwards-compatible ``block`` view.
+
+    ``temp``, ``tip`` and ``children`` let the partition router build the
+    view per connection over its own UNION ALL block_header.
+    """
+    _check_format(storage_format)
+    if storage_format == "binary":
+        columns = {c: f"lower(hex(b.{c}))" for c in HASH_COLUMNS}
+        columns["next_hash"] = "lower(hex(n.hash))"
+    else:
+        columns = {c: f"b.{c}" for c in HASH_COLUMNS}
+        columns["next_hash"] = "n.hash"
+    conn.execute(BLOCK_VIEW_DDL.format(
+        temp="TEMP " if temp else "", tip=tip, children=children, **columns
+    ))
+
+def migrate_stored_block_table(conn: sqlite3.Connection):
+    """Convert a legacy ``block`` table into block_header + ``block`` view.
+
+    Older databases stored confirmations/nextblockhash in a ``block`` table.
+    The table is renamed (its rows and indexes move with it) and the two
+    tip-dependent columns are dropped.
+    """
+    row = conn.execute(
+        "SELECT type FROM sqlite_master WHERE name = 'block'"
+    ).fetchone()
+    if row is None or row[0] != "table":
+        return
+    conn.execute("ALTER TABLE block RENAME TO block_header")
+    conn.execute("ALTER TABLE block_header DROP COLUMN confirmations")
+    conn.execute("ALTER TABLE block_header DROP COLUMN nextblockhash")
+
+def create_block_schema(conn: sqlite3.Connection, storage_format: str = STORAGE_FORMAT) -> str:
+    """Create (or migrate to) the full schema: table, indexes and views.
+
+    Returns the effective storage format, which is the existing one if the
+    database already has a block_header table.
+    """
+    migrate_stored_block_table(conn)
+    storage_format = detect_storage_format(conn) or storage_format
+    if create_block_table(conn, storage_format):
+        conn.execute("DROP VIEW IF EXISTS block")  # Re-created with the new columns
+    create_block_indexes(conn)
+    create_block_views(conn, storage_format)
+    return storage_format
+
+def find_block_by_hash(conn: sqlite3.Connection, block_hash: str):
+    """Look up a block (via the hex view) by its hex hash.
+
+    The hash is converted to the stored representation and matched against
+    block_header's index, so this stays an index seek in both formats.
+    """
+    storage_format = detect_storage_format(conn) or "hex"
+    return conn.execute(
+        "SELECT * FROM block WHERE id = (SELECT id FROM block_header WHERE hash = ?)",
+        (encode_hash(block_hash, storage_format),)
+    ).fetchone()
+
+def copy_blocks(conn: sqlite3.Connection, src_path: str, storage_format: str):
+    """Copy every block from another database into ``conn``'s block_header.
+
+    Used to convert an existing database between storage formats: the source
+    format is detected and hashes are re-encoded in a single INSERT ... SELECT.
+    TX_COLUMNS are recomputed from the tx JSON.
+    """
+    conn.create_function("to_stored_hash", 1,
+                         lambda v: encode_hash(decode_hash(v), storage_format),
+                         deterministic=True)
+    conn.execute("ATTACH DATABASE ? AS src", (src_path,))
+    conn.execute(f"""
+        INSERT INTO block_header (
+            hash, height, version, versionHex, merkleroot, time, mediantime,
+            nonce, bits, difficulty, chainwork, nTx, previousblockhash,
+            strippedsize, size, weight, tx
+        )
+        SELECT
+            to_stored_hash(hash), height, version, versionHex,
+            to_stored_hash(merkleroot), time, mediantime, nonce, bits,
+            difficulty, to_stored_hash(chainwork), nTx,
+            to_stored_hash(previousblockhash), strippedsize, size, weight, tx
+        FROM src.block_header
+        ORDER BY height
+    """)
+    conn.commit()
+    conn.execute("DETACH DATABASE src")
+    fill_tx_columns(conn)
+
+def open_bulk_db(scratch_path: str, storage_format: str = STORAGE_FORMAT) -> sqlite3.Connection:
+    """Open a fresh scratch database tuned for a one-shot bulk load.
+
+    The table is created without indexes and the journal is switched off,
+    so a crash mid-load leaves an unusable scratch file; the load is simply
+    restarted. Never roll back on this connection: without a journal that
+    is undefined.
+    """
+    if os.path.exists(scratch_path):
+        os.remove(scratch_path)
+    conn = sqlite3.connect(scratch_path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA locking_mode = EXCLUSIVE")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -262144")  # 256 MiB
+    create_block_table(conn, storage_format)
+    conn.commit()
+    return conn
+
+def publish_bulk_db(conn: sqlite3.Connection, db_path: str):
+    """Index the scratch DB, add views, compact it and swap it in.
+
+    ``VACUUM INTO`` writes a defragmented copy next to ``db_path`` which is
+    then renamed over it, so readers never observe a half-written file.
+    Stale WAL/SHM files of the old database are removed first because they
+    would otherwise be replayed against the new file. Indexes on tx summary
+    columns of the old database are carried over. ``conn`` is closed.
+    """
+    conn.commit()
+    create_block_indexes(conn)
+    create_block_views(conn, detect_storage_format(conn))
+    if os.path.exists(db_path):
+        old_conn = sqlite3.connect(db_path)
+        try:
+            carried = tx_indexes(old_conn)
+        finally:
+            old_conn.close()
+        if carried:
+            add_tx_indexes(conn, carried)
+    conn.execute("ANALYZE")
+    conn.commit()
+
+    staging_path = f"{db_path}.publish"
+    if os.path.exists(staging_path):
+        os.remove(staging_path)
+    conn.execute("VACUUM INTO ?", (staging_path,))
+    conn.close()
+
+    for suffix in ("-wal", "-shm", "-journal"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    os.replace(staging_path, db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")  # Readers and the sync writer run concurrently
+    finally:
+        conn.close()
@@ -0,0 +1,191 @@
+import os
+import json
+import sqlite3
+from typing import Dict, Any, List, Optional
+
+from block_schema import (
+    INSERT_BLOCK_SQL, STORAGE_FORMAT, create_block_table, create_block_indexes,
+    create_block_views, block_row
+)
+
+# Optional layout: one SQLite file per PARTITION_SIZE-block height range,
+# written alongside /data/bitcoin.db (0 disables it). The single file stays
+# the database every reader (query pools, QA, web apps) opens; sealed
+# partitions are immutable per-range files for backups and volume syncs,
+# and PartitionRouter serves height-range queries from only the files the
+# range needs.
+DB_PATH = "/data/bitcoin.db"
+PARTITION_DIR = "/data/partitions"
+PARTITION_SIZE = int(os.environ.get("BLOCK_PARTITION_SIZE", "0"))
+MANIFEST_NAME = "manifest.json"
+
+# SQLite's compile-time default for attached databases (SQLITE_MAX_ATTACHED,
+# at most 125). It cannot be raised at runtime, so a router connection spans
+# at most this many partitions: whole-chain SQL through the router needs
+# PARTITION_SIZE above chain height / 10; otherwise run it against
+# /data/bitcoin.db, which is always kept complete.
+MAX_ATTACHED = 10
+
+def partition_file(index: int, partition_size: int) -> str:
+    """File name of the partition holding heights [index*size, (index+1)*size)"""
+    start = index * partition_size
+    return f"blocks_{start:08d}_{start + partition_size - 1:08d}.db"
+
+def load_manifest(directory: str) -> Dict[str, Any]:
+    """Read the partition manifest, or an empty one for a new directory"""
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {"partition_size": None, "storage_format": None, "partitions": [], "sealed": []}
+    with open(path) as f:
+        return json.load(f)
+
+def save_manifest(directory: str, manifest: Dict[str, Any]):
+    """Write the manifest atomically (readers never see a partial file)"""
+    path = os.path.join(directory, MANIFEST_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+class PartitionWriter:
+    """Appends blocks to the partition file covering their height.
+
+    Blocks arrive in height order, so when the writer moves on to a new
+    partition the previous one is complete: it is ANALYZEd and marked
+    sealed in the manifest, after which it is never written again.
+    """
+    def __init__(self, directory: str = PARTITION_DIR,
+                 partition_size: int = PARTITION_SIZE,
+                 storage_format: str = STORAGE_FORMAT):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.manifest = load_manifest(directory)
+        # The layout of an existing directory wins over the arguments
+        self.partition_size = self.manifest["partition_size"] or partition_size
+        self.storage_format = self.manifest["storage_format"] or storage_format
+        if not self.partition_size:
+            raise ValueError("partition_size must be set for a new partition directory")
+        self.manifest["partition_size"] = self.partition_size
+        self.manifest["storage_format"] = self.storage_format
+        self.conn = None
+        self.current = None
+
+    def _open(self, index: int):
+        if self.conn is not None:
+            self.conn.close()
+        path = os.path.join(self.directory, partition_file(index, self.partition_size))
+        self.conn = sqlite3.connect(path)
+        create_block_table(self.conn, self.storage_format)
+        create_block_indexes(self.conn)
+        self.conn.commit()
+        self.current = index
+        if index not in self.manifest["partitions"]:
+            self.manifest["partitions"].append(index)
+            save_manifest(self.directory, self.manifest)
+
+    def seal(self, index: int):
+        """Mark a complete partition read-only for routers"""
+        path = os.path.join(self.directory, partition_file(index, self.partition_size))
+        with sqlite3.connect(path) as conn:
+            conn.execute("ANALYZE")
+        if index not in self.manifest["sealed"]:
+            self.manifest["sealed"].append(index)
+            save_manifest(self.directory, self.manifest)
+
+    def save_block(self, block_data: Dict[str, Any]):
+        """Insert one block into its partition and commit"""
+        index = block_data["height"] // self.partition_size
+        if index != self.current:
+            self._open(index)
+            # Also covers a restart right at a partition boundary
+            for older in self.manifest["partitions"]:
+                if older < index and older not in self.manifest["sealed"]:
+                    self.seal(older)
+        self.conn.execute(INSERT_BLOCK_SQL, block_row(block_data, self.storage_format))
+        self.conn.commit()
+
+    def max_height(self) -> int:
+        """Highest stored height across partitions, -1 if empty"""
+        for index in sorted(self.manifest["partitions"], reverse=True):
+            path = os.path.join(self.directory, partition_file(index, self.partition_size))
+            with sqlite3.connect(path) as conn:
+                row = conn.execute("SELECT MAX(height) FROM block_header").fetchone()
+            if row[0] is not None:
+                return row[0]
+        return -1
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+class PartitionRouter:
+    """Read-side router over a partition directory.
+
+    ``connect`` returns an in-memory connection that ATTACHes only the
+    partitions overlapping the requested height range (sealed ones with
+    ``immutable=1``, the live one ``mode=ro``) and defines TEMP
+    ``block_header`` (UNION ALL) and ``block`` views over them, so ad-hoc SQL
+    written for the single-file layout runs unchanged. A connection spans at
+    most SQLite's attach limit of partitions (see MAX_ATTACHED).
+    """
+    def __init__(self, directory: str = PARTITION_DIR):
+        self.directory = directory
+        self.manifest = load_manifest(directory)
+        if not self.manifest["partitions"]:
+            raise FileNotFoundError(f"No partitions in {directory}")
+        self.partition_size = self.manifest["partition_size"]
+
+    def partitions_for(self, min_height: Optional[int] = None,
+                       max_height: Optional[int] = None) -> List[int]:
+        """Partition indexes overlapping [min_height, max_height]"""
+        lo = 0 if min_height is None else min_height // self.partition_size
+        hi = float("inf") if max_height is None else max_height // self.partition_size
+        return [i for i in sorted(self.manifest["partitions"]) if lo <= i <= hi]
+
+    def _uri(self, index: int) -> str:
+        path = os.path.join(self.directory, partition_file(index, self.partition_size))
+        if index in self.manifest["sealed"]:
+            return f"file:{path}?mode=ro&immutable=1"
+        return f"file:{path}?mode=ro"
+
+    def connect(self, min_height: Optional[int] = None,
+                max_height: Optional[int] = None) -> sqlite3.Connection:
+        """Open a connection exposing only the partitions the range needs"""
+        indexes = self.partitions_for(min_height, max_height)
+        latest = max(self.manifest["partitions"])
+        # The newest partition is always attached: it holds the tip that
+        # the derived confirmations column is computed from. The partition
+        # after the range is attached too, for the last block's child.
+        following = [i for i in self.manifest["partitions"]
+                     if indexes and i == max(indexes) + 1]
+        attached = sorted(set(indexes + following + [latest]))
+
+        conn = sqlite3.connect("file::memory:", uri=True)
+        # The build's actual limit where Python exposes it (3.11+)
+        limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) if hasattr(conn, "getlimit") else MAX_ATTACHED
+        if len(attached) > limit:
+            conn.close()
+            raise ValueError(
+                f"Range needs {len(attached)} partitions but SQLite attaches at most "
+                f"{limit}; narrow the range, use larger partitions or query {DB_PATH}"
+            )
+        for index in attached:
+            conn.execute(f"ATTACH DATABASE ? AS p{index}", (self._uri(index),))
+
+        union = "\nUNION ALL\n".join(f"SELECT * FROM p{i}.block_header" for i in indexes)
+        if not union:  # Range beyond the stored chain: keep the schema, no rows
+            union = f"SELECT * FROM p{latest}.block_header WHERE 0"
+        conn.execute(f"CREATE TEMP VIEW block_header AS {union}")
+        children = "block_header"
+        if following:
+            conn.execute(
+                f"CREATE TEMP VIEW block_children AS SELECT * FROM block_header "
+                f"UNION ALL SELECT * FROM p{following[0]}.block_header"
+            )
+            children = "block_children"
+        create_block_views(
+            conn, self.manifest["storage_format"], temp=True,
+            tip=f"(SELECT MAX(height) FROM p{latest}.block_header)",
+            children=children
+        )
+        return conn
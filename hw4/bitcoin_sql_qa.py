@@ -1,94 +1,190 @@
 import modal
 import sqlite3
 import os
+import time
 from openai import OpenAI
-from datetime import datetime
+
+from db_pool import get_pool
+from prompt_context import get_schema_text, get_prompt_context_cache, estimate_tokens
+from sql_cache import get_sql_cache
+from result_cache import get_result_cache
+from query_guard import TIME_BUDGET, guarded_execute
+from query_planner import MAX_COST, review_sql, cheaper_query_prompt
+from sql_functions import FUNCTION_DOCS
+from sql_templates import match_template
+from sql_candidates import LATENCY_BUDGET, generate_candidates, first_success
+from qa_history import get_history_log, result_summary
 
 app = modal.App("bitcoin-sql-qa")
 volume = modal.Volume.from_name("chongchen-bitcoin-data", create_if_missing=True)
-image = modal.Image.debian_slim().pip_install("openai")
+image = (
+    modal.Image.debian_slim()
+    .pip_install("openai")
+    .add_local_python_source("db_pool", "prompt_context", "schema_pruner", "sql_cache", "result_cache", "query_guard", "query_planner", "sql_functions", "sql_templates", "sql_candidates", "qa_history")
+)
 
 SYSTEM_PROMPT = """You are a SQL developer that is expert in Bitcoin and you answer natural \
     language questions about the bitcoind database in a sqlite database. \
-        You always only respond with SQL statements that are correct."""
+        You always only respond with SQL statements that are correct. \
+        Use the column statistics and example rows to pick exact values and formats.
+
+""" + FUNCTION_DOCS
 
 def get_schema(conn):
     """Extract schema from SQLite database."""
-    cursor = conn.cursor()
-    cursor.execute("SELECT sql FROM sqlite_master WHERE type IN ('table', 'view') AND sql IS NOT NULL")
-    schemas = cursor.fetchall()
-    return '\n'.join([schema[0] for schema in schemas])
+    return get_schema_text(conn)
 
 def execute_sql(conn, sql):
-    """Execute SQL query and return results or error."""
-    try:
-        cursor = conn.cursor()
-        cursor.execute(sql)
-        result = cursor.fetchall()
-        return result, None
-    except sqlite3.Error as e:
-        return None, str(e)
+    """Execute SQL query and return results or error (time- and size-capped)."""
+    outcome = guarded_execute(conn, sql)
+    if outcome["error"]:
+        return None, outcome["error"]
+    return outcome["rows"], None
 
-def log_qa_history(volume, question, sql, result, error):
-    """Log QA history to a file in the Modal Volume."""
-    log_dir = "/data/qa_history"
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir, exist_ok=True)
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_file = os.path.join(log_dir, f"{timestamp}.txt")
-    
-    log_content = f"Question: {question}\nGenerated SQL: {sql}\n"
-    if error:
-        log_content += f"Error: {error}\n"
-    else:
-        log_content += f"Result: {result}\n"
-    
-    with open(log_file, 'w') as f:
-        f.write(log_content)
-    
-    volume.commit()  # Persist changes to the volume
+def complete_sql(client, messages, temperature=0.2):
+    """Ask the LLM for a SQL statement."""
+    response = client.chat.completions.create(
+        model="grok-3",
+        messages=messages,
+        temperature=temperature,
+        max_tokens=500
+    )
+    return response.choices[0].message.content.strip()
+
+def log_qa_history(volume, question, sql, result, error, **fields):
+    """Buffer a QA record for the history log; flushed and committed in the background."""
+    get_history_log(commit=volume.commit).append({
+        "kind": "qa", "question": question, "sql": sql, "error": error,
+        **result_summary(result), **fields
+    })
 
 @app.function(
     image=image,
     volumes={"/data": volume},
     secrets=[modal.Secret.from_name("chongchen-llm-api-key")]
 )
-def answer_question(question: str, db_path: str):
-    """Main function to answer natural language questions using the SQLite database."""
-    # Connect to the database
-    conn = sqlite3.connect(db_path)
+def answer_question(question: str, db_path: str, candidates: int = 1):
+    """Main function to answer natural language questions using the SQLite database.
+
+    With ``candidates`` > 1, that many SQL candidates are generated in
+    parallel, ranked by estimated plan cost and executed cheapest first
+    until one succeeds within the latency budget.
+    """
+    started = time.monotonic()
+    # Read-only connections are pooled across calls in a warm container
+    pool = get_pool(db_path)
     
-    # Extract schema and prepare user prompt
-    schema = get_schema(conn)
-    user_prompt = f"Database schema:\n{schema}\n\nQuestion: {question}"
+    # Common question shapes are answered from local templates, no LLM
+    template = match_template(question)
+    params, rewrites, cache_hit, reviews, deadline = (), [], None, [], None
+    prompt_tokens, llm_calls, llm_latency = 0, 0, 0.0
+    if template is not None:
+        path = "template"
+        attempts, params = [template["sql"]], template["params"]
+    else:
+        # Schema, column statistics and example rows of the tables and columns the
+        # question needs; cached per schema version and tip
+        context_cache = get_prompt_context_cache(db_path)
+        with pool.connection() as conn:
+            context = context_cache.get(conn, question)
+        user_prompt = f"{context}\n\nQuestion: {question}"
     
-    # Generate SQL using OpenAI API
-    llm_api_key = os.environ["DMX_API"]
-    client = OpenAI(
-        base_url="https://www.dmxapi.com/v1", 
-        api_key=llm_api_key
-    )
+        # Identical or re-worded questions reuse previously generated SQL
+        sql_cache = get_sql_cache(commit=volume.commit)
+        generated_sql, cache_hit = sql_cache.lookup(question, context_cache.schema_key)
+        path = "sql_cache" if generated_sql else "llm"
+        attempts = [generated_sql]
+        
+        if generated_sql is None:
+            # Generate SQL using OpenAI API
+            llm_api_key = os.environ["DMX_API"]
+            client = OpenAI(
+                base_url="https://www.dmxapi.com/v1", 
+                api_key=llm_api_key
+            )
+            messages = [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt}
+            ]
+            prompt_tokens = estimate_tokens(SYSTEM_PROMPT + user_prompt)
+            llm_started = time.monotonic()
+        
+        if generated_sql is None and candidates > 1:
+            # K candidates at once, each validated with EXPLAIN as it arrives;
+            # the valid ones run cheapest first (invalid ones only to report an error)
+            reviews = generate_candidates(
+                lambda msgs, temperature: complete_sql(client, msgs, temperature),
+                pool.connection, messages, candidates
+            )
+            valid = [r for r in reviews if r["error"] is None]
+            attempts = [r["sql"] for r in (valid or reviews[:1])]
+            deadline = started + LATENCY_BUDGET
+            llm_calls = candidates
+        elif generated_sql is None:
+            generated_sql = complete_sql(client, messages)
+            llm_calls = 1
+        
+            # Rewrite known-slow patterns; if the plan is still too expensive,
+            # show it to the LLM once and keep whichever query is cheaper
+            with pool.connection() as conn:
+                review = review_sql(conn, generated_sql)
+            if review["cost"] is not None and review["cost"] > MAX_COST:
+                messages += [
+                    {"role": "assistant", "content": generated_sql},
+                    {"role": "user", "content": cheaper_query_prompt(review["sql"], review["plan"], review["cost"])}
+                ]
+                retry_sql = complete_sql(client, messages)
+                llm_calls += 1
+                with pool.connection() as conn:
+                    retry = review_sql(conn, retry_sql)
+                if retry["error"] is None and retry["cost"] < review["cost"]:
+                    review = retry
+            attempts, rewrites = [review["sql"]], review["rewrites"]
+        if llm_calls:
+            llm_latency = time.monotonic() - llm_started
     
-    response = client.chat.completions.create(
-        model="grok-3",
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": user_prompt}
-        ],
-        temperature=0.2,
-        max_tokens=500
-    )
-    generated_sql = response.choices[0].message.content.strip()
+    # Execute the SQL against one consistent snapshot, unless the result for
+    # this SQL and data version is cached. Execution is capped in time and
+    # size so one runaway query cannot stall the container.
+    result_cache = get_result_cache(db_path)
+    with pool.snapshot() as (conn, tip_height):
+        def execute(sql, time_budget):
+            key = result_cache.key(conn, template["rendered"] if template else sql, tip_height)
+            cached = result_cache.get(key)
+            if cached is not None:
+                return {**cached, "error": None, "execution": None}
+            budget = TIME_BUDGET if time_budget is None else min(TIME_BUDGET, time_budget)
+            outcome = guarded_execute(conn, sql, params, time_budget=budget)
+            entry = {"columns": outcome["columns"], "rows": outcome["rows"], "truncated": outcome["truncated"]}
+            if outcome["error"] is None:
+                result_cache.put(key, entry)
+            stats = {k: outcome[k] for k in ("elapsed", "cpu_time", "vm_steps", "row_count")}
+            return {**entry, "error": outcome["error"], "execution": stats}
+        
+        outcome = first_success(attempts, execute, deadline)
+    error = outcome["error"]
+    result = None if error else outcome["rows"]
+    generated_sql = outcome["sql"]
+    display_sql = template["rendered"] if template else generated_sql
+    if reviews:
+        rewrites = next((r["rewrites"] for r in reviews if r["sql"] == generated_sql), [])
     
-    # Execute the generated SQL
-    result, error = execute_sql(conn, generated_sql)
-    conn.close()
+    if error is None and path == "llm":
+        sql_cache.store(question, generated_sql, context_cache.schema_key)
     
-    # Log the interaction
-    log_qa_history(volume, question, generated_sql, result, error)
+    # Log the interaction (buffered; off the request path)
+    log_qa_history(volume, question, display_sql, result, error,
+                   path=path, cache_hit=cache_hit, tip_height=tip_height,
+                   latency=time.monotonic() - started, llm_latency=llm_latency,
+                   llm_calls=llm_calls, prompt_tokens=prompt_tokens,
+                   attempts=outcome.get("attempts", 0), execution=outcome.get("execution"))
     
-    return {"result": result, "error": error}
+    return {"result": result, "columns": None if error else outcome.get("columns"),
+            "error": error, "truncated": outcome.get("truncated", False),
+            "tip_height": tip_height, "path": path, "sql": display_sql,
+            "cache_hit": cache_hit, "rewrites": rewrites, "execution": outcome.get("execution"),
+            "attempts": outcome.get("attempts", 0),
+            "candidates": [{"sql": r["sql"], "cost": r["cost"], "error": r["error"]} for r in reviews]}
 
 # Local testing entry point
 if __name__ == "__main__":
@@ -2,132 +2,15 @@ import modal
 import sqlite3
 import os
 from openai import OpenAI
-from datetime import datetime
+
+from sql_functions import register_functions
+from qa_history import get_history_log, result_summary
+from result_compare import compare_queries
+from sql_test_cases import normal_test_cases, hard_test_cases
 
 app = modal.App("bitcoin-sql-qa")
 volume = modal.Volume.from_name("chongchen-bitcoin-data", create_if_missing=True)
-image = modal.Image.debian_slim().pip_install("openai")
-
-normal_test_cases = [
-    {
-        "question": "How many blocks are there between height 1000 and 10000?",
-        "correct_sql": "SELECT COUNT(*) FROM block WHERE height BETWEEN 1000 AND 10000;"
-    },
-    {
-        "question": "How many blocks have exactly 100 confirmations (for blocks below height 50000)?",
-        "correct_sql": "SELECT COUNT(*) FROM block WHERE confirmations = 100 AND height < 50000;"
-    },
-    {
-        "question": "What is the average difficulty of the first 1000 blocks?",
-        "correct_sql": "SELECT AVG(difficulty) FROM block WHERE height <= 1000;"
-    },
-    {
-        "question": "List the top 5 smallest blocks by size (where size > 0 bytes).",
-        "correct_sql": "SELECT * FROM block WHERE size > 0 ORDER BY size ASC LIMIT 5;"
-    },
-    {
-        "question": "What is the previous block hash of the block at height 60000?",
-        "correct_sql": "SELECT previousblockhash FROM block WHERE height = 60000;"
-    },
-    {
-        "question": "How many blocks have a nonce value between 1000 and 2000?",
-        "correct_sql": "SELECT COUNT(*) FROM block WHERE nonce BETWEEN 1000 AND 2000;"
-    },
-    {
-        "question": "What is the earliest timestamp (time) of a block with exactly 200 transactions?",
-        "correct_sql": "SELECT MIN(time) FROM block WHERE ntx = 200;"
-    },
-    {
-        "question": "What is the total weight of blocks mined in the last 1000 blocks?",
-        "correct_sql": "SELECT SUM(weight) FROM block WHERE height >= 59000;"
-    },
-    {
-        "question": "Which block has the highest difficulty among the first 1000 blocks?",
-        "correct_sql": "SELECT * FROM block WHERE height <= 1000 ORDER BY difficulty DESC LIMIT 1;"
-    },
-    {
-        "question": "List blocks where the merkleroot starts with '0000' (limited to 10).",
-        "correct_sql": "SELECT * FROM block WHERE merkleroot LIKE '0000%' LIMIT 10;"
-    }
-]
-
-hard_test_cases = [
-    {
-        "question": "Find the block where the difficulty increased by more than 10% compared to its previous block, but only if it was mined at least 2 hours after the median time of the prior 50 blocks. Include the percentage increase and the time difference.",
-        "expected_sql": """
-            WITH BlockPairs AS (
-                SELECT 
-                    b1.height AS current_height,
-                    b1.difficulty AS current_difficulty,
-                    b1.time AS current_time,
-                    b2.difficulty AS prev_difficulty,
-                    b2.time AS prev_time,
-                    (SELECT AVG(b3.mediantime) 
-                     FROM block b3 
-                     WHERE b3.height BETWEEN b1.height - 50 AND b1.height - 1) AS prior_50_median
-                FROM block b1
-                JOIN block b2 ON b1.previousblockhash = b2.hash
-            )
-            SELECT 
-                current_height,
-                ((current_difficulty - prev_difficulty) / prev_difficulty) * 100 AS percent_increase,
-                (current_time - prior_50_median) AS time_diff_seconds
-            FROM BlockPairs
-            WHERE (current_difficulty / prev_difficulty) > 1.10
-            AND (current_time - prior_50_median) >= 7200
-            LIMIT 1;
-        """
-    },
-    {
-        "question": "How many blocks contain at least 3 transactions where the first transaction’s input script contains the hex pattern 'deadbeef' and the last transaction’s output value exceeds 1 BTC?",
-        "expected_sql": """
-            SELECT COUNT(*)
-            FROM block
-            WHERE (
-                SELECT COUNT(*)
-                FROM json_each(block.tx) AS tx
-                WHERE 
-                    json_extract(tx.value, '$.inputs[0].script') LIKE '%deadbeef%'
-                    AND (
-                        SELECT json_extract(tx.value, '$.outputs[0].value')
-                        FROM json_each(tx.value) 
-                        ORDER BY CAST(json_extract(tx.value, '$.index') AS INT) DESC
-                        LIMIT 1
-                    ) > 100000000
-            ) >= 3;
-        """
-    },
-    {
-        "question": "Identify the 10-block consecutive sequence (by height) with the steepest exponential increase in chainwork value, calculated as the sum of chainwork differences between adjacent blocks.",
-        "expected_sql": """
-            WITH ChainworkNumeric AS (
-                SELECT 
-                    height,
-                    CAST(chainwork AS INTEGER) AS chainwork_num  -- Will FAIL in SQLite (hex-to-decimal)
-                FROM block
-            ),
-            Diffs AS (
-                SELECT
-                    height,
-                    chainwork_num - LAG(chainwork_num, 1) OVER (ORDER BY height) AS diff
-                FROM ChainworkNumeric
-            ),
-            Windows AS (
-                SELECT
-                    height,
-                    SUM(diff) OVER (ORDER BY height ROWS BETWEEN 9 PRECEDING AND CURRENT ROW) AS total_diff
-                FROM Diffs
-            )
-            SELECT 
-                height - 9 AS start_height,
-                height AS end_height,
-                total_diff
-            FROM Windows
-            ORDER BY total_diff DESC
-            LIMIT 1;
-        """
-    }
-]
+image = modal.Image.debian_slim().pip_install("openai").add_local_python_source("sql_functions", "qa_history", "query_guard", "result_compare", "sql_test_cases")
 
 SYSTEM_PROMPT = """
     You are a SQL developer that is expert in Bitcoin and you answer natural \
@@ -154,24 +37,11 @@ def execute_sql(conn, sql):
         return None, str(e)
 
 def log_qa_history(volume, question, sql, result, error):
-    """Log QA history to a file in the Modal Volume."""
-    log_dir = "/data/qa_history"
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir, exist_ok=True)
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_file = os.path.join(log_dir, f"{timestamp}.txt")
-    
-    log_content = f"Question: {question}\nGenerated SQL: {sql}\n"
-    if error:
-        log_content += f"Error: {error}\n"
-    else:
-        log_content += f"Result: {result}\n"
-    
-    with open(log_file, 'w') as f:
-        f.write(log_content)
-    
-    volume.commit()  # Persist changes to the volume
+    """Buffer a QA record for the history log; flushed and committed in the background."""
+    get_history_log(commit=volume.commit).append({
+        "kind": "qa", "question": question, "sql": sql, "error": error,
+        **result_summary(result)
+    })
 
 @app.function(
     image=image,
@@ -179,7 +49,7 @@ def log_qa_history(volume, question, sql, result, error):
     secrets=[modal.Secret.from_name("chongchen-llm-api-key")]
 )
 def answer_question(question: str, db_path: str):
-    conn = sqlite3.connect(db_path)
+    conn = register_functions(sqlite3.connect(db_path))
     schema = get_schema(conn)
     user_prompt = f"Database schema:\n{schema}\n\nQuestion: {question}"
     
@@ -210,15 +80,10 @@ def answer_question(question: str, db_path: str):
         "error": error
     }
 
-def log_test_result(test_type: str, content: str, filename: str):
-    log_dir = f"/data/sql_tests/{test_type}"
-    os.makedirs(log_dir, exist_ok=True)
-    # timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_file = os.path.join(log_dir, f"{filename}.txt")
-    
-    with open(log_file, 'w') as f:
-        f.write(content)
-    volume.commit()
+def log_test_result(test_type: str, test_id: int, **fields):
+    get_history_log(commit=volume.commit).append({
+        "kind": f"test_{test_type}", "test_id": test_id, **fields
+    })
 
 @app.function(
     image=image,
@@ -226,7 +91,7 @@ def log_test_result(test_type: str, content: str, filename: str):
     secrets=[modal.Secret.from_name("chongchen-llm-api-key")]
 )
 def test_normal_cases(db_path = "/data/bitcoin.db"):
-    conn = sqlite3.connect(db_path)
+    conn = register_functions(sqlite3.connect(db_path))
     for test_id, case in enumerate(normal_test_cases):
         question = case["question"]
         correct_sql = case["correct_sql"]
@@ -240,19 +105,14 @@ def test_normal_cases(db_path = "/data/bitcoin.db"):
         generated_answer = response["result"]
         error = response["error"]
         
-        # Build log content
-        log_content = (
-            f"Question: {question}\n"
-            f"Correct SQL: {correct_sql}\n"
-            f"Expected Answer: {expected_answer}\n"
-            f"Generated SQL: {generated_sql}\n"
-            f"Generated Answer: {generated_answer}\n"
+        log_test_result(
+            "normal", test_id, question=question, expected_sql=correct_sql,
+            expected=result_summary(expected_answer), sql=generated_sql,
+            **result_summary(generated_answer), error=error,
+            match=error is None and compare_queries(conn, correct_sql, generated_sql)["match"]
         )
-        if error:
-            log_content += f"Error: {error}\n"
-        
-        log_test_result("normal", log_content, f"test_{test_id}")
     conn.close()
+    get_history_log(commit=volume.commit).flush(commit=True)
 
 @app.function(
     image=image,
@@ -260,7 +120,7 @@ def test_normal_cases(db_path = "/data/bitcoin.db"):
     secrets=[modal.Secret.from_name("chongchen-llm-api-key")]
 )
 def test_hard_cases(db_path = "/data/bitcoin.db"):
-    conn = sqlite3.connect(db_path)
+    conn = register_functions(sqlite3.connect(db_path))
     for test_id, case in enumerate(hard_test_cases, start=1):
         question = case["question"]
         expected_sql = case["expected_sql"]
@@ -274,19 +134,14 @@ def test_hard_cases(db_path = "/data/bitcoin.db"):
         generated_answer = response["result"]
         error = response["error"]
         
-        # Build log content
-        log_content = (
-            f"Question: {question}\n"
-            f"Expected SQL: {expected_sql}\n"
-            f"Expected Answer: {expected_answer}\n"
-            f"Generated SQL: {generated_sql}\n"
-            f"Generated Answer: {generated_answer}\n"
+        log_test_result(
+            "hard", test_id, question=question, expected_sql=expected_sql,
+            expected=result_summary(expected_answer), sql=generated_sql,
+            **result_summary(generated_answer), error=error,
+            match=error is None and compare_queries(conn, expected_sql, generated_sql)["match"]
         )
-        if error:
-            log_content += f"Error: {error}\n"
-        
-        log_test_result("hard", log_content, f"test_{test_id}")
     conn.close()
+    get_history_log(commit=volume.commit).flush(commit=True)
 
 if __name__ == "__main__":
     with app.run():
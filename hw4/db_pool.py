@@ -0,0 +1,124 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple, Optional
+
+from sql_functions import register_functions
+
+DB_PATH = "/data/bitcoin.db"
+ACQUIRE_TIMEOUT = 30  # seconds a borrower waits for a busy pool
+
+class ReadOnlyPool:
+    """Pool of read-only SQLite connections shared by requests in a container.
+
+    Connections are opened once with ``mode=ro`` and ``query_only`` and kept
+    open, so requests skip the connect cost and each connection's statement
+    cache (``cached_statements``) keeps repeated SQL prepared. With the
+    database in WAL mode (set by the sync writer) readers never block the
+    writer and vice versa.
+    """
+    def __init__(self, db_path: str = DB_PATH, size: int = 4, cached_statements: int = 256):
+        self.db_path = db_path
+        self.size = size
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            f"file:{self.db_path}?mode=ro",
+            uri=True,
+            check_same_thread=False,  # Handed between threads, used by one at a time
+            cached_statements=self.cached_statements,
+            isolation_level=None,  # Transactions are explicit, see snapshot()
+        )
+        conn.execute("PRAGMA query_only = ON")
+        return register_functions(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection, opening one if the pool is not yet full.
+
+        Raises sqlite3.OperationalError if every connection stays busy for
+        ACQUIRE_TIMEOUT seconds.
+        """
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                try:
+                    conn = self._open()
+                except BaseException:
+                    # Give the slot back, e.g. when the DB does not exist yet
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=ACQUIRE_TIMEOUT)
+                except queue.Empty:
+                    raise sqlite3.OperationalError(
+                        f"No database connection free after {ACQUIRE_TIMEOUT}s"
+                    ) from None
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            self._idle.put(conn)
+
+    @contextmanager
+    def snapshot(self) -> Iterator[Tuple[sqlite3.Connection, Optional[int]]]:
+        """Borrow a connection inside a read transaction.
+
+        Every statement run in the block sees the same snapshot, which is
+        the one the reported tip height was read from.
+        """
+        with self.connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                tip_height = conn.execute("SELECT MAX(height) FROM block").fetchone()[0]
+                yield conn, tip_height
+            finally:
+                conn.execute("COMMIT")
+
+    @contextmanager
+    def dedicated_snapshot(self) -> Iterator[Tuple[sqlite3.Connection, Optional[int]]]:
+        """Like snapshot(), on a connection of its own outside the pool.
+
+        For long-lived readers such as result streams, which would otherwise
+        keep a pooled connection for as long as a client takes to download.
+        The connection is closed (and its transaction ended) on exit.
+        """
+        conn = self._open()
+        try:
+            conn.execute("BEGIN")
+            yield conn, conn.execute("SELECT MAX(height) FROM block").fetchone()[0]
+        finally:
+            conn.close()
+
+    def close(self):
+        """Close the idle connections"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._opened -= 1
+
+_pools: Dict[str, ReadOnlyPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path: str = DB_PATH) -> ReadOnlyPool:
+    """Return the container-wide pool for ``db_path``"""
+    with _pools_lock:
+        if db_path not in _pools:
+            _pools[db_path] = ReadOnlyPool(db_path)
+        return _pools[db_path]
@@ -0,0 +1,96 @@
+import zlib
+from typing import Callable, List, Optional, Tuple
+
+import brotli
+
+MIN_SIZE = 1024            # smaller one-shot bodies are sent as is
+COMPRESSIBLE = ("application/json", "application/x-ndjson", "text/", "application/javascript")
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5         # brotli's speed/ratio knee for dynamic responses
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Preferred encoding the client accepts: br, then gzip, else None"""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        token, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if quality > 0:
+            accepted.add(token.strip())
+    for encoding in ("br", "gzip"):
+        if encoding in accepted or "*" in accepted:
+            return encoding
+    return None
+
+class _Compressor:
+    """One response's compressor; ``chunk`` flushes so streamed lines arrive promptly"""
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._gzip = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.flush()
+        return self._gzip.compress(data) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.finish()
+        return self._gzip.compress(data) + self._gzip.flush()
+
+class CompressionMiddleware:
+    """ASGI middleware compressing text and JSON responses with brotli or gzip.
+
+    Works on streamed responses too: every body chunk is compressed and
+    flushed on its own, so NDJSON rows reach the client as they are
+    produced. One-shot bodies under ``minimum_size`` and responses that
+    already have a Content-Encoding are passed through.
+    """
+    def __init__(self, app: Callable, minimum_size: int = MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message  # Held until the first body chunk decides
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                return await send(message)
+            body, more = message.get("body", b""), message.get("more_body", False)
+            if compressor is None:
+                response_headers: List[Tuple[bytes, bytes]] = list(start.get("headers", []))
+                names = {name.lower(): value for name, value in response_headers}
+                content_type = names.get(b"content-type", b"").decode("latin-1")
+                if (b"content-encoding" in names or not content_type.startswith(COMPRESSIBLE)
+                        or (not more and len(body) < self.minimum_size)):
+                    passthrough = True
+                    await send(start)
+                    return await send(message)
+                response_headers = [(n, v) for n, v in response_headers if n.lower() != b"content-length"]
+                response_headers += [(b"content-encoding", encoding.encode()), (b"vary", b"Accept-Encoding")]
+                await send({**start, "headers": response_headers})
+                compressor = _Compressor(encoding)
+            data = compressor.chunk(body) if more else compressor.finish(body)
+            await send({"type": "http.response.body", "body": data, "more_body": more})
+
+        await self.app(scope, receive, send_compressed)
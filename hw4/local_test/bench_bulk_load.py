@@ -0,0 +1,98 @@
+import os
+import time
+import json
+import hashlib
+import tempfile
+import argparse
+from typing import Dict, Any, Iterator
+
+from db_inserter import BlockDBInserter
+
+def fake_block(height: int, n_tx: int = 5) -> Dict[str, Any]:
+    """
+    Build a getblock(verbosity=2)-shaped dictionary for benchmarking.
+
+    Args:
+        height: Block height
+        n_tx: Number of (tiny) transactions to attach
+
+    Returns:
+        Dict[str, Any]: Block data
+    """
+    def h(*parts) -> str:
+        return hashlib.sha256(":".join(map(str, parts)).encode()).hexdigest()
+
+    block = {
+        "hash": h("block", height),
+        "confirmations": 1,
+        "height": height,
+        "version": 1,
+        "versionHex": "00000001",
+        "merkleroot": h("merkle", height),
+        "time": 1231006505 + height * 600,
+        "mediantime": 1231006505 + height * 600 - 3000,
+        "nonce": (height * 2654435761) % 2**32,
+        "bits": "1d00ffff",
+        "difficulty": 1.0,
+        "chainwork": f"{(height + 1) * 2**32:064x}",
+        "nTx": n_tx,
+        "nextblockhash": h("block", height + 1),
+        "strippedsize": 285,
+        "size": 285,
+        "weight": 1140,
+        "tx": [{"txid": h("tx", height, i), "vin": [], "vout": [{"value": 50.0, "n": 0}]}
+               for i in range(n_tx)],
+    }
+    if height:  # Genesis has no previousblockhash, as in the RPC output
+        block["previousblockhash"] = h("block", height - 1)
+    return block
+
+def blocks(n: int) -> Iterator[Dict[str, Any]]:
+    for height in range(n):
+        yield fake_block(height)
+
+def bench_per_row(db_path: str, n: int) -> float:
+    """Current path: one INSERT + COMMIT per block into an indexed table."""
+    inserter = BlockDBInserter(db_path)
+    start = time.perf_counter()
+    for block in blocks(n):
+        inserter.insert_block(block)
+    elapsed = time.perf_counter() - start
+    inserter.close()
+    return elapsed
+
+def bench_bulk(scratch_path: str, dest_path: str, n: int, batch: int = 1000) -> float:
+    """Bulk path: unindexed scratch DB, batched commits, then publish."""
+    start = time.perf_counter()
+    inserter = BlockDBInserter(scratch_path, bulk=True)
+    it = blocks(n)
+    while True:
+        chunk = [b for _, b in zip(range(batch), it)]
+        if not chunk:
+            break
+        inserter.insert_blocks(chunk)
+    inserter.publish(dest_path)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-row and bulk block loading.")
+    parser.add_argument("--blocks", type=int, default=20000, help="Number of synthetic blocks")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        per_row_db = os.path.join(tmp, "per_row.db")
+        bulk_db = os.path.join(tmp, "bulk.db")
+
+        per_row = bench_per_row(per_row_db, args.blocks)
+        bulk = bench_bulk(os.path.join(tmp, "scratch.db"), bulk_db, args.blocks)
+
+        print(json.dumps({
+            "blocks": args.blocks,
+            "per_row_seconds": round(per_row, 3),
+            "per_row_blocks_per_sec": round(args.blocks / per_row),
+            "per_row_db_bytes": os.path.getsize(per_row_db),
+            "bulk_seconds": round(bulk, 3),
+            "bulk_blocks_per_sec": round(args.blocks / bulk),
+            "bulk_db_bytes": os.path.getsize(bulk_db),
+            "speedup": round(per_row / bulk, 1),
+        }, indent=2))
@@ -1,49 +1,57 @@
+import sys
 import sqlite3
 import json
-from typing import Dict, Any
+from typing import Dict, Any, Iterable
 from pathlib import Path
 
+# The block schema lives in hw3/block_schema.py; it is imported from there
+# so local loads, benchmarks and synthetic chains match production exactly
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "hw3"))
+
+from block_schema import (  # noqa: E402
+    INSERT_BLOCK_SQL, STORAGE_FORMAT, block_row, create_block_schema,
+    open_bulk_db, publish_bulk_db,
+)
+
 class BlockDBInserter:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, bulk: bool = False,
+                 storage_format: str = STORAGE_FORMAT):
         """Initialize database connection.
         
         Args:
             db_path (str): Path to SQLite database file
+            bulk (bool): Bulk-load mode. ``db_path`` is treated as a scratch
+                file (see ``block_schema.open_bulk_db``): it is recreated
+                with journaling off and no indexes, rows are not committed
+                one by one, and ``publish`` must be called to build the
+                indexes and copy it to its destination.
+            storage_format (str): "hex" or "binary" hash storage for a new
+                database; an existing one keeps its format
         """
-        self.conn = sqlite3.connect(db_path)
+        self.bulk = bulk
+        # Indexes and the view are deferred in bulk mode and built by ``publish``
+        if bulk:
+            self.conn = open_bulk_db(db_path, storage_format)
+            self.storage_format = storage_format
+        else:
+            self.conn = sqlite3.connect(db_path)
+            self.storage_format = create_block_schema(self.conn, storage_format)
+            self.conn.commit()
         self.conn.execute("PRAGMA foreign_keys = ON")
         self.cursor = self.conn.cursor()
-        
-        # Ensure the block table exists
-        self._create_table()
-
-    def _create_table(self):
-        """Ensure the block table exists before inserting data."""
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS block (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                hash TEXT UNIQUE NOT NULL,
-                confirmations INTEGER,
-                height INTEGER NOT NULL,
-                version INTEGER,
-                versionhex TEXT,
-                merkleroot TEXT,
-                time INTEGER,
-                mediantime INTEGER,
-                nonce INTEGER,
-                bits TEXT,
-                difficulty REAL,
-                chainwork TEXT,
-                ntx INTEGER,
-                previousblockhash TEXT,
-                nextblockhash TEXT,
-                strippedsize INTEGER,
-                size INTEGER,
-                weight INTEGER,
-                tx TEXT
-            )
-        """)
-        self.conn.commit()
+
+    def _block_params(self, block_data: Dict[str, Any]) -> tuple:
+        """Map an RPC block onto the INSERT_BLOCK_SQL parameters."""
+        return block_row(block_data, self.storage_format)
+
+    def _rollback(self):
+        """Roll back the open transaction, except in bulk mode.
+
+        ROLLBACK is undefined with ``journal_mode = OFF`` and would drop
+        every uncommitted bulk row, so bulk errors only propagate.
+        """
+        if not self.bulk:
+            self.conn.rollback()
 
     def insert_block(self, block_data: Dict[str, Any]) -> int:
         """Insert a block record into the database.
@@ -55,60 +63,58 @@ class BlockDBInserter:
             int: ID of the inserted block record
         """
         try:
-            # Convert TX data to JSON string if it isn't already
-            block_data['tx'] = json.dumps(block_data.get('tx', []))
-
-            # SQL query with named parameters
-            sql = """
-                INSERT INTO block (
-                    hash, confirmations, height, version, versionhex,
-                    merkleroot, time, mediantime, nonce, bits,
-                    difficulty, chainwork, ntx, previousblockhash,
-                    nextblockhash, strippedsize, size, weight, tx
-                ) VALUES (
-                    :hash, :confirmations, :height, :version, :versionhex,
-                    :merkleroot, :time, :mediantime, :nonce, :bits,
-                    :difficulty, :chainwork, :ntx, :previousblockhash,
-                    :nextblockhash, :strippedsize, :size, :weight, :tx
-                )
-            """
-            
-            # Execute the insert
-            self.cursor.execute(sql, {
-                'hash': block_data.get('hash'),
-                'confirmations': block_data.get('confirmations', 0),
-                'height': block_data.get('height'),
-                'version': block_data.get('version'),
-                'versionhex': block_data.get('versionHex'),
-                'merkleroot': block_data.get('merkleroot'),
-                'time': block_data.get('time'),
-                'mediantime': block_data.get('mediantime'),
-                'nonce': block_data.get('nonce'),
-                'bits': block_data.get('bits'),
-                'difficulty': block_data.get('difficulty'),
-                'chainwork': block_data.get('chainwork'),
-                'ntx': block_data.get('nTx'),
-                'previousblockhash': block_data.get('previousblockhash'),
-                'nextblockhash': block_data.get('nextblockhash', None),
-                'strippedsize': block_data.get('strippedsize'),
-                'size': block_data.get('size'),
-                'weight': block_data.get('weight'),
-                'tx': block_data['tx']
-            })
-            self.conn.commit()
-            
+            self.cursor.execute(INSERT_BLOCK_SQL, self._block_params(block_data))
+            if not self.bulk:
+                self.conn.commit()
+
             return self.cursor.lastrowid
             
         except sqlite3.IntegrityError as e:
-            self.conn.rollback()
+            self._rollback()
             raise Exception(f"Integrity error: {str(e)}")
         except sqlite3.Error as e:
-            self.conn.rollback()
+            self._rollback()
             raise Exception(f"Database error: {str(e)}")
         except Exception as e:
-            self.conn.rollback()
+            self._rollback()
             raise Exception(f"Error inserting block: {str(e)}")
 
+    def insert_blocks(self, blocks: Iterable[Dict[str, Any]]) -> int:
+        """Insert many blocks with a single executemany and one commit.
+
+        Args:
+            blocks (Iterable[Dict[str, Any]]): Block dictionaries
+
+        Returns:
+            int: Number of rows inserted
+        """
+        try:
+            self.cursor.executemany(
+                INSERT_BLOCK_SQL, (self._block_params(b) for b in blocks)
+            )
+            self.conn.commit()
+            return self.cursor.rowcount
+        except sqlite3.Error as e:
+            self._rollback()
+            raise Exception(f"Database error: {str(e)}")
+
+    def publish(self, dest_path: str):
+        """Finish a bulk load and atomically replace ``dest_path``.
+
+        Same as the production bulk load (``block_schema.publish_bulk_db``):
+        builds the deferred indexes and views, runs ANALYZE, writes a
+        compacted copy with ``VACUUM INTO`` next to ``dest_path`` and
+        renames it into place. The scratch connection is closed afterwards.
+
+        Args:
+            dest_path (str): Final database path (e.g. /data/bitcoin.db)
+        """
+        if not self.bulk:
+            raise Exception("publish() is only available in bulk mode")
+
+        publish_bulk_db(self.conn, dest_path)
+        self.conn = None
+
     def close(self):
         """Close the database connection."""
         if self.conn:
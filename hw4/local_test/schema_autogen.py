@@ -1,5 +1,13 @@
+import os
+import sys
 import json
-from typing import List, Any
+import glob
+import heapq
+import hashlib
+import sqlite3
+import argparse
+import itertools
+from typing import List, Any, Dict, Iterable, Optional
 
 def infer_sql_type(value: Any) -> str:
     """
@@ -107,15 +115,419 @@ def generate_sql_schema(data: Any, base_table_name: str) -> str:
     schema.extend(tables)
     return "\n\n".join(schema) + "\n"
 
+# Widening order for scalar types seen across samples
+TYPE_ORDER = ["BOOLEAN", "INTEGER", "REAL", "VARCHAR(255)", "TEXT", "JSON"]
+TYPE_RANK = {sql_type: rank for rank, sql_type in enumerate(TYPE_ORDER)}
+SCALAR_TYPES = {bool: "BOOLEAN", int: "INTEGER", float: "REAL"}
+MASK64 = (1 << 64) - 1
+
+def _mix64(value: Any) -> int:
+    """Uniform 64-bit hash for the KMV sketch.
+
+    hash() is randomized per process for str, which would make the distinct
+    estimates differ from run to run; blake2b over repr() is stable.
+    """
+    digest = hashlib.blake2b(repr(value).encode("utf-8", "surrogatepass"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+class ColumnStats:
+    """
+    Running statistics for one scalar (or JSON) column.
+
+    Memory is bounded: distinct values are estimated with a k-minimum-values
+    sketch that keeps at most ``sketch_size`` hashes.
+    """
+    __slots__ = ("key", "sql_type", "non_null", "min_len", "max_len",
+                 "min_value", "max_value", "_sketch", "_members", "sketch_size")
+
+    def __init__(self, key: str, sketch_size: int = 256):
+        self.key = key
+        self.sql_type = None
+        self.non_null = 0
+        self.min_len = None
+        self.max_len = None
+        self.min_value = None
+        self.max_value = None
+        self._sketch = []  # Max-heap (negated) of the smallest hashes
+        self._members = set()
+        self.sketch_size = sketch_size
+
+    def widen(self, sql_type: str):
+        if self.sql_type is None or TYPE_RANK[sql_type] > TYPE_RANK[self.sql_type]:
+            self.sql_type = sql_type
+
+    def observe(self, value: Any):
+        if value is None:
+            return
+        self.non_null += 1
+        scalar_type = SCALAR_TYPES.get(type(value))
+        if scalar_type is not None:
+            if scalar_type != self.sql_type:
+                self.widen(scalar_type)
+            # Numbers only: a column can mix them with strings across samples
+            if self.min_value is None or value < self.min_value:
+                self.min_value = value
+            if self.max_value is None or value > self.max_value:
+                self.max_value = value
+        elif isinstance(value, str):
+            length = len(value)
+            self.widen("VARCHAR(255)" if length <= 255 else "TEXT")
+            if self.min_len is None or length < self.min_len:
+                self.min_len = length
+            if self.max_len is None or length > self.max_len:
+                self.max_len = length
+        else:  # list/dict stored as a JSON column
+            self.widen("JSON")
+            return
+
+        h = _mix64(value)
+        if h in self._members:
+            return
+        if len(self._sketch) < self.sketch_size:
+            heapq.heappush(self._sketch, -h)
+            self._members.add(h)
+        elif h < -self._sketch[0]:
+            self._members.discard(-heapq.heappushpop(self._sketch, -h))
+            self._members.add(h)
+
+    def distinct_estimate(self) -> int:
+        if len(self._sketch) < self.sketch_size:
+            return len(self._sketch)
+        kth = -self._sketch[0]
+        return int((self.sketch_size - 1) * (MASK64 + 1) / (kth + 1))
+
+    def as_dict(self, rows: int) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "type": self.sql_type or "TEXT",
+            "null_fraction": round(1 - self.non_null / rows, 6) if rows else 0.0,
+            "min_len": self.min_len,
+            "max_len": self.max_len,
+            # A range is only meaningful while the column is still numeric
+            "min": self.min_value if self.sql_type in SCALAR_TYPES.values() else None,
+            "max": self.max_value if self.sql_type in SCALAR_TYPES.values() else None,
+            "distinct_estimate": self.distinct_estimate(),
+        }
+
+class Field:
+    """A key of a table: a scalar column, a nested dict, or a list of dicts."""
+    __slots__ = ("name", "key", "kind", "column", "child")
+
+    def __init__(self, name: str, key: str, sketch_size: int):
+        self.name = name
+        self.key = key
+        self.kind = None  # "scalar" | "dict" | "list" (of dicts) | "json"
+        self.column = ColumnStats(key, sketch_size)
+        self.child = None
+
+class TableStats:
+    """Schema and statistics inferred for one (possibly nested) table."""
+    def __init__(self, name: str, parent: "TableStats" = None, is_list: bool = False,
+                 sketch_size: int = 256):
+        self.name = name
+        self.parent = parent
+        self.is_list = is_list  # Child rows come from a list (carry a seq column)
+        self.rows = 0
+        self.fields: Dict[str, Field] = {}
+        self._by_key: Dict[str, Field] = {}  # Raw key -> field, skips re-sanitizing
+        self.sketch_size = sketch_size
+
+    def _field(self, key: str) -> Field:
+        field = self._by_key.get(key)
+        if field is not None:
+            return field
+        name = sanitize_identifier(key)
+        if name in ("id", "seq") or (self.parent and name == f"{self.parent.name}_id"):
+            name = f"{name}_value"  # Reserved by the generated table layout
+        field = self.fields.get(name)
+        if field is None:
+            field = self.fields[name] = Field(name, key, self.sketch_size)
+        self._by_key[key] = field
+        return field
+
+    def _child(self, field: Field, is_list: bool) -> "TableStats":
+        if field.child is None:
+            field.child = TableStats(f"{self.name}_{field.name}", self, is_list, self.sketch_size)
+        return field.child
+
+    def observe(self, doc: Dict[str, Any]):
+        self.rows += 1
+        by_key = self._by_key
+        for key, value in doc.items():
+            field = by_key.get(key) or self._field(key)
+            if value is None:
+                continue  # Only affects nullability (non_null < rows)
+            if isinstance(value, dict) and field.kind in (None, "dict"):
+                field.kind = "dict"
+                field.column.non_null += 1
+                self._child(field, False).observe(value)
+            elif (isinstance(value, list) and field.kind in (None, "list")
+                  and all(isinstance(item, dict) for item in value)):
+                field.column.non_null += 1
+                if not value:
+                    # Item shape still unknown; JSON unless dicts show up later
+                    field.column.widen("JSON")
+                    continue
+                field.kind = "list"
+                child = self._child(field, True)
+                for item in value:
+                    child.observe(item)
+            elif isinstance(value, (dict, list)) or field.kind in ("dict", "list", "json"):
+                # Mixed shapes across samples: fall back to a JSON column,
+                # whatever scalar type this particular value has
+                field.child = None
+                field.kind = "json"
+                field.column.widen("JSON")
+                field.column.observe(value)
+            else:
+                field.kind = "scalar"
+                field.column.observe(value)
+
+    def tables(self) -> List["TableStats"]:
+        """This table followed by its nested tables, parents first."""
+        result = [self]
+        for field in self.fields.values():
+            if field.child is not None:
+                result.extend(field.child.tables())
+        return result
+
+    def ddl(self) -> str:
+        columns = ["id INTEGER PRIMARY KEY AUTOINCREMENT"]
+        if self.parent:
+            columns.append(f"{self.parent.name}_id INTEGER NOT NULL REFERENCES {self.parent.name}(id)")
+        if self.is_list:
+            columns.append("seq INTEGER NOT NULL")
+        for field in self.fields.values():
+            if field.kind in ("dict", "list"):
+                continue
+            sql_type = field.column.sql_type or "TEXT"
+            nullable = "NOT NULL" if field.column.non_null == self.rows else "NULL"
+            columns.append(f"{field.name} {sql_type} {nullable}")
+        columns_sql = ",\n    ".join(columns)
+        return f"""CREATE TABLE IF NOT EXISTS {self.name} (
+    {columns_sql}
+);"""
+
+    def statistics(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "parent": self.parent.name if self.parent else None,
+            "columns": {
+                name: field.column.as_dict(self.rows)
+                for name, field in self.fields.items()
+                if field.kind not in ("dict", "list")
+            },
+        }
+
+class SchemaInferrer:
+    """
+    Streaming schema inference over many sample documents.
+
+    Each document is folded into running per-table statistics in one pass,
+    widening types (BOOLEAN < INTEGER < REAL < VARCHAR(255) < TEXT < JSON)
+    and nullability across samples. Nested dicts and lists of dicts become
+    child tables keyed by ``<parent>_id``; lists of scalars stay JSON.
+    """
+    def __init__(self, base_table_name: str, sketch_size: int = 256):
+        self.root = TableStats(sanitize_identifier(base_table_name), sketch_size=sketch_size)
+        self.documents = 0
+
+    def observe(self, doc: Dict[str, Any]):
+        self.root.observe(doc)
+        self.documents += 1
+
+    def observe_files(self, paths: Iterable[str], unwrap_key: Optional[str] = "result"):
+        """
+        Fold JSON files into the statistics, one file in memory at a time.
+
+        Args:
+            paths: JSON files, each one document (RPC envelopes are unwrapped)
+            unwrap_key: Envelope key holding the document, e.g. "result"
+        """
+        for path in paths:
+            with open(path, "r") as f:
+                doc = json.load(f)
+            if unwrap_key and isinstance(doc, dict) and isinstance(doc.get(unwrap_key), dict):
+                doc = doc[unwrap_key]
+            self.observe(doc)
+
+    def tables(self) -> List[TableStats]:
+        return self.root.tables()
+
+    def sql_schema(self) -> str:
+        schema = ["PRAGMA foreign_keys = ON;", ""]
+        schema.append(f"-- Table Definitions (inferred from {self.documents} documents)")
+        schema.extend(table.ddl() for table in self.tables())
+        return "\n\n".join(schema) + "\n"
+
+    def statistics(self) -> Dict[str, Any]:
+        return {
+            "documents": self.documents,
+            "tables": {table.name: table.statistics() for table in self.tables()},
+        }
+
+def _loader_function(table: TableStats) -> List[str]:
+    """Source lines of the generated load function for one table."""
+    params = ["doc"]
+    if table.parent:
+        params.append("parent_id")
+    if table.is_list:
+        params.append("seq")
+    lines = [f"def load_{table.name}({', '.join(params)}):",
+             f"    row_id = _next_{table.name}()",
+             "    g = doc.get"]
+
+    values = ["row_id"] + params[1:]
+    for field in table.fields.values():
+        if field.kind in ("dict", "list"):
+            continue
+        getter = f"g({field.key!r})"
+        # Scalar columns still JSON-encode a dict/list no sample showed
+        values.append(f"_json({getter})" if field.column.sql_type == "JSON" else f"_scalar({getter})")
+    lines.append(f"    _append_{table.name}(({', '.join(values)},))")
+
+    for field in table.fields.values():
+        if field.kind == "dict":
+            lines.append(f"    value = g({field.key!r})")
+            lines.append("    if value is not None:")
+            lines.append(f"        load_{field.child.name}(value, row_id)")
+        elif field.kind == "list":
+            lines.append(f"    for position, item in enumerate(g({field.key!r}) or ()):")
+            lines.append(f"        load_{field.child.name}(item, row_id, position)")
+    lines.append("    return row_id")
+    return lines
+
+def generate_loader_source(inferrer: SchemaInferrer) -> str:
+    """
+    Generate Python source for loading documents into the inferred tables.
+
+    One function per table, with the key paths and column order baked in:
+    loading a document is a single recursive pass that appends a tuple per
+    row, with no schema lookups or SQL formatting at load time.
+
+    Args:
+        inferrer: SchemaInferrer that has observed the samples
+
+    Returns:
+        str: Python source defining ``load_<table>`` functions
+    """
+    lines = ["# Generated by schema_autogen.generate_loader_source -- do not edit", ""]
+    for table in inferrer.tables():
+        lines.extend(_loader_function(table))
+        lines.append("")
+    return "\n".join(lines)
+
+def insert_statement(table: TableStats) -> str:
+    """Prepared INSERT with the same column order as the generated loader."""
+    columns = ["id"]
+    if table.parent:
+        columns.append(f"{table.parent.name}_id")
+    if table.is_list:
+        columns.append("seq")
+    columns.extend(f.name for f in table.fields.values() if f.kind not in ("dict", "list"))
+    placeholders = ", ".join("?" for _ in columns)
+    return f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({placeholders})"
+
+class CompiledLoader:
+    """
+    Loads documents into the normalized schema produced by SchemaInferrer.
+
+    Rows are buffered per table with explicit ids (so children can reference
+    parents without a round trip for lastrowid) and written by ``flush`` with
+    one ``executemany`` per table, parents first, in a single transaction.
+    """
+    def __init__(self, conn: sqlite3.Connection, inferrer: SchemaInferrer, create_tables: bool = True):
+        self.conn = conn
+        self.tables = inferrer.tables()
+        if create_tables:
+            for table in self.tables:
+                conn.execute(table.ddl())
+            conn.commit()
+
+        self.insert_sql = {t.name: insert_statement(t) for t in self.tables}
+        self.rows = {t.name: [] for t in self.tables}
+        self.source = generate_loader_source(inferrer)
+
+        namespace = {
+            "_json": lambda v: None if v is None else json.dumps(v),
+            "_scalar": lambda v: json.dumps(v) if isinstance(v, (dict, list)) else v,
+        }
+        for table in self.tables:
+            start = conn.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table.name}").fetchone()[0]
+            namespace[f"_next_{table.name}"] = itertools.count(start).__next__
+            namespace[f"_append_{table.name}"] = self.rows[table.name].append
+        exec(compile(self.source, "<schema_autogen loader>", "exec"), namespace)
+        self._load_root = namespace[f"load_{self.tables[0].name}"]
+
+    def load(self, doc: Dict[str, Any]) -> int:
+        """Buffer one document's rows; returns the root row id."""
+        return self._load_root(doc)
+
+    def pending(self) -> int:
+        return sum(len(rows) for rows in self.rows.values())
+
+    def flush(self):
+        """Write buffered rows with one executemany per table."""
+        with self.conn:
+            for table in self.tables:
+                rows = self.rows[table.name]
+                if rows:
+                    self.conn.executemany(self.insert_sql[table.name], rows)
+                    rows.clear()  # In place: the loader holds rows.append
+
 # Example usage
 if __name__ == "__main__":
-    # Read JSON file
-    with open("/home/tourist/neu/INFO7500-cryptocurrency/hw3/block_data/block_0.json", "r") as f:
-        json_obj = json.load(f)
-    
-    # Generate schema
-    sql_schema = generate_sql_schema(json_obj["result"], "block")
-    
-    # Write to file
-    with open("/home/tourist/neu/INFO7500-cryptocurrency/hw4/schema.sql", "w") as f:
-        f.write(sql_schema)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate a SQL schema from block JSON samples.")
+    parser.add_argument("samples", nargs="*", help="JSON files or directories to infer from")
+    parser.add_argument("--table", default="block", help="Root table name")
+    parser.add_argument("--out", help="Write the DDL here instead of stdout")
+    parser.add_argument("--stats", help="Write column statistics (JSON) here")
+    parser.add_argument("--loader", help="Write the generated loader source here")
+    parser.add_argument("--load", help="Create the schema in this SQLite DB and load the samples")
+    args = parser.parse_args()
+
+    if not args.samples:
+        # Single-document mode (original behaviour)
+        with open("/home/tourist/neu/INFO7500-cryptocurrency/hw3/block_data/block_0.json", "r") as f:
+            json_obj = json.load(f)
+        
+        # Generate schema
+        sql_schema = generate_sql_schema(json_obj["result"], "block")
+        
+        # Write to file
+        with open("/home/tourist/neu/INFO7500-cryptocurrency/hw4/schema.sql", "w") as f:
+            f.write(sql_schema)
+        sys.exit(0)
+
+    paths = []
+    for sample in args.samples:
+        if os.path.isdir(sample):
+            paths.extend(sorted(glob.glob(os.path.join(sample, "*.json"))))
+        else:
+            paths.append(sample)
+
+    inferrer = SchemaInferrer(args.table)
+    inferrer.observe_files(paths)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(inferrer.sql_schema())
+    else:
+        print(inferrer.sql_schema())
+    if args.stats:
+        with open(args.stats, "w") as f:
+            json.dump(inferrer.statistics(), f, indent=2)
+    if args.loader:
+        with open(args.loader, "w") as f:
+            f.write(generate_loader_source(inferrer))
+    if args.load:
+        conn = sqlite3.connect(args.load)
+        loader = CompiledLoader(conn, inferrer)
+        for path in paths:
+            with open(path, "r") as f:
+                doc = json.load(f)
+            loader.load(doc["result"] if isinstance(doc.get("result"), dict) else doc)
+            if loader.pending() >= 50000:
+                loader.flush()
+        loader.flush()
+        conn.close()
@@ -0,0 +1,384 @@
+import os
+import json
+import math
+import time
+import random
+import hashlib
+import argparse
+from bisect import bisect_right
+from collections import deque
+from typing import Dict, Any, Iterator, List, Optional, Sequence, Tuple
+
+from db_inserter import BlockDBInserter
+
+GENESIS_TIME = 1231006505
+TARGET_SPACING = 600            # seconds per block the retarget aims for
+RETARGET_INTERVAL = 2016        # blocks per difficulty period
+HALVING_INTERVAL = 210000
+MAX_TARGET = 0xFFFF << 208      # difficulty 1 (bits 1d00ffff)
+SEGWIT_HEIGHT = 481824
+MAX_BLOCK_SIZE = 1_000_000
+MAX_BLOCK_WEIGHT = 4_000_000
+MAX_TX = 16                     # transactions listed per block by default
+SPENDABLE = 50_000              # recent outputs new transactions may spend
+BATCH = 1000                    # blocks per executemany when writing a database
+
+# (height, value) anchors interpolated linearly between points and
+# extrapolated along the last segment. Roughly mainnet's history:
+# natural log of the difficulty the hashrate would sustain at 10 minutes
+# per block, mean transactions per block, and median fee rate in sat/vB.
+LOG_HASHRATE_CURVE = [
+    (0, -0.4), (32000, 0.0), (68000, 3.8), (100000, 9.6), (160000, 14.2), (215000, 15.0),
+    (278000, 21.0), (336000, 24.4), (392000, 25.4), (446000, 26.4), (502000, 28.3),
+    (610000, 30.3), (716000, 30.8), (823000, 31.9),
+]
+TX_COUNT_CURVE = [
+    (0, 1), (100000, 10), (170000, 60), (250000, 400), (330000, 900), (400000, 1700),
+    (480000, 2200), (600000, 2500), (700000, 2300), (800000, 3000),
+]
+FEE_RATE_CURVE = [
+    (0, 0.0), (80000, 0.0), (100000, 2.0), (300000, 20.0), (450000, 60.0), (500000, 40.0),
+    (600000, 10.0), (700000, 20.0), (800000, 30.0),
+]
+# Share of transactions spending segwit inputs, rising after activation
+SEGWIT_CURVE = [(0, 0.0), (SEGWIT_HEIGHT, 0.0), (550000, 0.4), (700000, 0.8), (800000, 0.9)]
+# Block version by activation height: BIP34, BIP66, BIP65, then version bits
+VERSION_HEIGHTS = [(0, 1), (227931, 2), (363725, 3), (388381, 4), (419328, 0x20000000)]
+
+TX_BYTES = 450                  # mean serialized size of a non-coinbase transaction
+TX_BYTES_SD = 600
+WITNESS_SHARE = 0.55            # witness bytes of a segwit transaction
+
+BASE58 = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+BASE58_CHUNK = 58 ** 10
+BASE58_PAIRS = [a + b for a in BASE58 for b in BASE58]
+ADDRESSES = 100_000             # recent addresses outputs may pay again
+ADDRESS_REUSE = 0.4             # share of outputs paying a recent address
+
+def interpolate(curve: Sequence[Tuple[int, float]], height: int) -> float:
+    """Piecewise-linear value of ``curve`` at ``height``"""
+    i = min(max(bisect_right(curve, (height, math.inf)) - 1, 0), len(curve) - 2)
+    (h0, v0), (h1, v1) = curve[i], curve[i + 1]
+    return v0 + (v1 - v0) * (height - h0) / (h1 - h0)
+
+def sha256d(data: bytes) -> bytes:
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+def target_to_bits(target: int) -> int:
+    """Compact ("nBits") encoding of a target, as in arith_uint256::GetCompact"""
+    size = (target.bit_length() + 7) // 8
+    mantissa = target >> 8 * (size - 3) if size > 3 else target << 8 * (3 - size)
+    if mantissa & 0x800000:
+        mantissa >>= 8
+        size += 1
+    return size << 24 | mantissa
+
+def bits_to_target(bits: int) -> int:
+    size, mantissa = bits >> 24, bits & 0x7FFFFF
+    return mantissa >> 8 * (3 - size) if size <= 3 else mantissa << 8 * (size - 3)
+
+def subsidy(height: int) -> float:
+    """Block reward in BTC at ``height``"""
+    halvings = height // HALVING_INTERVAL
+    return (50 * 10**8 >> halvings) / 1e8 if halvings < 64 else 0.0
+
+def merkle_root(leaves: List[bytes]) -> bytes:
+    """Bitcoin merkle root of txids in internal byte order"""
+    level = leaves
+    while len(level) > 1:
+        if len(level) % 2:
+            level = level + level[-1:]
+        level = [sha256d(level[i] + level[i + 1]) for i in range(0, len(level), 2)]
+    return level[0]
+
+def base58check(payload: bytes) -> str:
+    data = payload + sha256d(payload)[:4]
+    n = int.from_bytes(data, "big")
+    pairs = []
+    while n:
+        # Ten digits per big-int division, then two digits per table lookup
+        n, chunk = divmod(n, BASE58_CHUNK)
+        for _ in range(5):
+            chunk, r = divmod(chunk, 3364)
+            pairs.append(BASE58_PAIRS[r])
+    pad = len(data) - len(data.lstrip(b"\0"))
+    return "1" * pad + "".join(reversed(pairs)).lstrip("1")
+
+def _remember(pool: List, item: Any, limit: int, rng: random.Random):
+    if len(pool) < limit:
+        pool.append(item)
+    else:
+        pool[rng.randrange(limit)] = item
+
+class ChainGenerator:
+    """Deterministic, statistically realistic synthetic Bitcoin chain.
+
+    Blocks follow each other from height 0 with valid ``previousblockhash``
+    linkage and real header hashes (double SHA-256 of the 80-byte header;
+    there is no proof of work, so hashes do not meet their target).
+    Inter-block times are exponential around the current hashrate and
+    difficulty, difficulty retargets every 2016 blocks from the period's
+    actual timespan (clamped to 4x, as in consensus), and ``mediantime``
+    is the median of the last 11 times. Hashrate, transactions per block,
+    fee rates and segwit adoption follow the module curves, with block
+    size and weight capped at the consensus limits of each era.
+
+    Only the first ``max_tx`` transactions of a block are listed (all of
+    them when ``max_tx`` is None), in ``getblock`` verbosity 2 shape with
+    vin/vout. A complete block's size, weight and coinbase value add up
+    from its transactions; for a truncated one ``nTx``, size and weight
+    still describe the whole block and the coinbase pays the subsidy plus
+    its estimated fees. Inputs spend recent synthetic outputs without a
+    UTXO set, so an output may be spent twice.
+
+    Transaction details have their own RNG stream, so times, difficulty
+    and transaction counts are identical across ``max_tx``; hashes depend
+    on the listed txids through the merkle root. The same ``seed`` and
+    ``max_tx`` always reproduce the same chain.
+    """
+    def __init__(self, seed: int = 0, max_tx: Optional[int] = MAX_TX):
+        self.seed = seed
+        self.max_tx = max_tx
+        self.rng = random.Random(seed)
+        self.height = 0
+        self.target = MAX_TARGET
+        self.chainwork = 0
+        self.prev_hash: Optional[str] = None
+        self.clock = float(GENESIS_TIME)
+        self.times = deque(maxlen=11)
+        self.period_start = GENESIS_TIME
+        self.hashrate_noise = 0.0
+        # Random-access pools; once full, a new entry replaces a random one
+        self.spendable: List[Tuple[str, int]] = []
+        self.addresses: List[Tuple[str, str, str]] = []
+
+    def _retarget(self):
+        """Consensus retarget at the first block of a period"""
+        timespan = self.times[-1] - self.period_start
+        expected = RETARGET_INTERVAL * TARGET_SPACING
+        timespan = min(max(timespan, expected // 4), expected * 4)
+        target = bits_to_target(target_to_bits(self.target)) * timespan // expected
+        self.target = bits_to_target(target_to_bits(min(target, MAX_TARGET)))
+
+    def _block_time(self) -> int:
+        """Advance the true clock by one block and return the miner's timestamp"""
+        rng = self.rng
+        # Mean-reverting random walk around the hashrate trend
+        self.hashrate_noise = 0.999 * self.hashrate_noise + rng.gauss(0, 0.01)
+        hashrate = math.exp(interpolate(LOG_HASHRATE_CURVE, self.height) + self.hashrate_noise)
+        difficulty = MAX_TARGET / self.target
+        self.clock += rng.expovariate(hashrate / (difficulty * TARGET_SPACING))
+        # Miners' clocks drift, but a time must exceed the median of the last 11
+        stamp = int(self.clock + rng.gauss(0, 90))
+        if self.times:
+            stamp = max(stamp, sorted(self.times)[len(self.times) // 2] + 1)
+        return stamp
+
+    def _block_shape(self) -> Dict[str, Any]:
+        """Transaction count, sizes and fee rate of the next block"""
+        rng = self.rng
+        mean = interpolate(TX_COUNT_CURVE, self.height)
+        segwit = interpolate(SEGWIT_CURVE, self.height)
+        # Bytes the non-coinbase transactions may take under the era's size or weight limit
+        if self.height < SEGWIT_HEIGHT:
+            limit = MAX_BLOCK_SIZE - 80 - 3 - 160
+        else:
+            limit = (MAX_BLOCK_WEIGHT - 4 * (80 + 3 + 160)) / (4 - 3 * segwit * WITNESS_SHARE)
+        extra = max(mean - 1, 0.0)
+        others = min(int(rng.gammavariate(2.0, extra / 2)) if extra else 0, int(limit / TX_BYTES))
+        # Sum of their sizes, by the central limit theorem
+        tx_bytes = others * TX_BYTES + rng.gauss(0, TX_BYTES_SD * math.sqrt(others))
+        tx_bytes = int(min(max(tx_bytes, others * 150), limit))
+        witness_bytes = math.ceil(tx_bytes * segwit * WITNESS_SHARE)
+        fee_rate = interpolate(FEE_RATE_CURVE, self.height) * rng.lognormvariate(0, 0.5)
+        return {"ntx": others + 1, "tx_bytes": tx_bytes, "witness_bytes": witness_bytes,
+                "segwit": segwit, "fee_rate": fee_rate}
+
+    def _address(self, rng: random.Random) -> Tuple[str, str, str]:
+        """(type, script hex, address) of a new or recently paid address"""
+        if self.addresses and rng.random() < ADDRESS_REUSE:
+            return self.addresses[rng.randrange(len(self.addresses))]
+        h160 = rng.getrandbits(160).to_bytes(20, "big")
+        if rng.random() < 0.15:
+            address = ("scripthash", f"a914{h160.hex()}87", base58check(b"\x05" + h160))
+        else:
+            address = ("pubkeyhash", f"76a914{h160.hex()}88ac", base58check(b"\x00" + h160))
+        _remember(self.addresses, address, ADDRESSES, rng)
+        return address
+
+    def _output(self, rng: random.Random, value: float, n: int) -> Dict[str, Any]:
+        kind, script, address = self._address(rng)
+        return {"value": round(value, 8), "n": n,
+                "scriptPubKey": {"hex": script, "address": address, "type": kind}}
+
+    def _transaction(self, rng: random.Random, segwit: float, fee_rate: float) -> Tuple[Dict[str, Any], bytes]:
+        txid = rng.getrandbits(256).to_bytes(32, "little")
+        n_in = 1 + (rng.random() < 0.3) + (rng.random() < 0.1)
+        n_out = 2 if rng.random() < 0.7 else rng.choice((1, 3, 4))
+        vin = []
+        for _ in range(n_in):
+            if self.spendable:
+                prev_txid, outputs = self.spendable[rng.randrange(len(self.spendable))]
+                vout = rng.randrange(outputs)
+            else:
+                prev_txid, vout = rng.getrandbits(256).to_bytes(32, "little").hex(), 0
+            vin.append({"txid": prev_txid, "vout": vout,
+                        "scriptSig": {"asm": "", "hex": ""}, "sequence": 4294967295})
+        size = 10 + 148 * n_in + 34 * n_out
+        witness = int(size * WITNESS_SHARE) if rng.random() < segwit else 0
+        weight = 3 * (size - witness) + size
+        vsize = (weight + 3) // 4
+        fee = round(vsize * fee_rate * rng.lognormvariate(0, 0.4) / 1e8, 8)
+        vout = [self._output(rng, rng.lognormvariate(-2.5, 2.0), n) for n in range(n_out)]
+        txid_hex = txid[::-1].hex()
+        _remember(self.spendable, (txid_hex, n_out), SPENDABLE, rng)
+        return ({"txid": txid_hex, "hash": txid_hex, "version": 2 if witness else 1,
+                 "size": size, "vsize": vsize, "weight": weight, "locktime": 0,
+                 "vin": vin, "vout": vout, "fee": fee}, txid)
+
+    def _transactions(self, shape: Dict[str, Any], tx_seed: int) -> Tuple[List[Dict[str, Any]], bytes, float, int]:
+        """Listed transactions, merkle root, total fees (BTC) and listed bytes"""
+        rng = random.Random(tx_seed)
+        listed = shape["ntx"] if self.max_tx is None else max(min(shape["ntx"], self.max_tx), 1)
+        txs, leaves = [], []
+        for _ in range(listed - 1):
+            tx, txid = self._transaction(rng, shape["segwit"], shape["fee_rate"])
+            txs.append(tx)
+            leaves.append(txid)
+        fees = sum(tx["fee"] for tx in txs)
+        tx_bytes = sum(tx["size"] for tx in txs)
+        if listed < shape["ntx"]:
+            # Unlisted transactions: estimated fees and one leaf standing in for their txids
+            fees = shape["tx_bytes"] * shape["fee_rate"] * (1 - shape["segwit"] * WITNESS_SHARE * 0.75) / 1e8
+            leaves.append(sha256d(f"{self.seed}:{self.height}:rest".encode()))
+
+        coinbase_id = rng.getrandbits(256).to_bytes(32, "little")
+        height_push = self.height.to_bytes(4, "little").hex()
+        coinbase = {
+            "txid": coinbase_id[::-1].hex(), "hash": coinbase_id[::-1].hex(), "version": 1,
+            "size": 160, "vsize": 160, "weight": 640, "locktime": 0,
+            "vin": [{"coinbase": f"03{height_push[:6]}{rng.getrandbits(64):016x}", "sequence": 4294967295}],
+            "vout": [self._output(rng, subsidy(self.height) + fees, 0)],
+        }
+        _remember(self.spendable, (coinbase["txid"], 1), SPENDABLE, rng)
+        return [coinbase] + txs, merkle_root([coinbase_id] + leaves), round(fees, 8), tx_bytes + 160
+
+    def next_block(self) -> Dict[str, Any]:
+        """Generate the next block (without confirmations or nextblockhash)"""
+        height = self.height
+        if height and height % RETARGET_INTERVAL == 0:
+            self._retarget()
+        stamp = self._block_time()
+        if height % RETARGET_INTERVAL == 0:
+            self.period_start = stamp
+        self.times.append(stamp)
+        shape = self._block_shape()
+        version = VERSION_HEIGHTS[bisect_right(VERSION_HEIGHTS, (height, math.inf)) - 1][1]
+        if version >= 0x20000000:
+            version |= self.rng.getrandbits(13) << 1 if self.rng.random() < 0.3 else 0
+        nonce = self.rng.getrandbits(32)
+        txs, merkle, fees, listed_bytes = self._transactions(shape, self.rng.getrandbits(64))
+
+        bits = target_to_bits(self.target)
+        prev = bytes.fromhex(self.prev_hash)[::-1] if self.prev_hash else bytes(32)
+        header = (version.to_bytes(4, "little") + prev + merkle + stamp.to_bytes(4, "little")
+                  + bits.to_bytes(4, "little") + nonce.to_bytes(4, "little"))
+        block_hash = sha256d(header)[::-1].hex()
+        self.chainwork += (1 << 256) // (self.target + 1)
+
+        # Header, transaction count varint and every transaction
+        if len(txs) == shape["ntx"]:
+            size = 80 + 3 + listed_bytes
+            witness = sum(tx["size"] * 4 - tx["weight"] for tx in txs) // 3
+        else:
+            size = 80 + 3 + 160 + shape["tx_bytes"]
+            witness = shape["witness_bytes"]
+        block = {
+            "hash": block_hash,
+            "height": height,
+            "version": version,
+            "versionHex": f"{version:08x}",
+            "merkleroot": merkle[::-1].hex(),
+            "time": stamp,
+            "mediantime": sorted(self.times)[len(self.times) // 2],
+            "nonce": nonce,
+            "bits": f"{bits:08x}",
+            "difficulty": MAX_TARGET / self.target,
+            "chainwork": f"{self.chainwork:064x}",
+            "nTx": shape["ntx"],
+            "strippedsize": size - witness,
+            "size": size,
+            "weight": 3 * (size - witness) + size,
+            "tx": txs,
+        }
+        if self.prev_hash:  # Genesis has no previousblockhash, as in the RPC output
+            block["previousblockhash"] = self.prev_hash
+        self.prev_hash = block_hash
+        self.height += 1
+        return block
+
+    def blocks(self, n: int) -> Iterator[Dict[str, Any]]:
+        """Yield the next ``n`` blocks as a node with tip ``n - 1`` would.
+
+        Each block is held back until its successor exists so that
+        ``nextblockhash`` can be filled in; the last block has none.
+        """
+        tip = self.height + n - 1
+        pending = None
+        for _ in range(n):
+            block = self.next_block()
+            if pending is not None:
+                pending["nextblockhash"] = block["hash"]
+                yield pending
+            block["confirmations"] = tip - block["height"] + 1
+            pending = block
+        if pending is not None:
+            yield pending
+
+def write_database(generator: ChainGenerator, db_path: str, n: int, batch: int = BATCH) -> int:
+    """Bulk-load ``n`` generated blocks into a fresh ``block`` schema at ``db_path``"""
+    inserter = BlockDBInserter(f"{db_path}.scratch", bulk=True)
+    it = generator.blocks(n)
+    while True:
+        chunk = [b for _, b in zip(range(batch), it)]
+        if not chunk:
+            break
+        inserter.insert_blocks(chunk)
+    inserter.publish(db_path)
+    os.remove(f"{db_path}.scratch")
+    return n
+
+def write_json(generator: ChainGenerator, out_dir: str, n: int) -> int:
+    """Write ``n`` generated blocks as getblock responses, ``block_<height>.json``"""
+    os.makedirs(out_dir, exist_ok=True)
+    for block in generator.blocks(n):
+        with open(os.path.join(out_dir, f"block_{block['height']}.json"), "w") as f:
+            json.dump({"result": block, "error": None, "id": 1}, f)
+    return n
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic Bitcoin chain.")
+    parser.add_argument("--blocks", type=int, default=100000, help="Number of blocks (heights 0..N-1)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-tx", type=int, default=MAX_TX,
+                        help="Transactions listed per block; -1 lists all of them")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--db", help="SQLite database to (re)create")
+    output.add_argument("--json-dir", help="Directory for block_<height>.json files")
+    args = parser.parse_args()
+
+    generator = ChainGenerator(args.seed, None if args.max_tx < 0 else args.max_tx)
+    start = time.perf_counter()
+    if args.db:
+        write_database(generator, args.db, args.blocks)
+    else:
+        write_json(generator, args.json_dir, args.blocks)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "blocks": args.blocks,
+        "seed": args.seed,
+        "seconds": round(elapsed, 3),
+        "blocks_per_hour": round(args.blocks / elapsed * 3600),
+        "tip_hash": generator.prev_hash,
+        "tip_difficulty": MAX_TARGET / generator.target,
+    }, indent=2))
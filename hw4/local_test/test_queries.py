@@ -32,7 +32,6 @@ def execute_query(query, params=None, fetch=False):
 # 1. Insert a test block
 test_block_1 = {
     "hash": "000000000000000000076d286d8bcf76d9e84f4df5de2d5b2f3e0b8b7ec3a891",
-    "confirmations": 100,
     "height": 700000,
     "version": 536870912,
     "versionhex": "20000000",
@@ -45,21 +44,21 @@ test_block_1 = {
     "chainwork": "0000000000000000000000000000000000000000000000100000000000000000",
     "ntx": 2500,
     "previousblockhash": "0000000000000000000a4c0db58de5f7c1f3e4a80e23a1dd0b9d9c8a482fbcf2",
-    "nextblockhash": "0000000000000000000132a4b6e5d3c2f8a9e2d5b7c8e3f1a0b9d9c7e6d5c4a3",
     "strippedsize": 1000000,
     "size": 1200000,
     "weight": 4000000,
     "tx": json.dumps(["tx1", "tx2", "tx3"])
 }
 
+# confirmations/nextblockhash are derived by the block view, not inserted
 insert_block_query = """
-    INSERT INTO block (
-        hash, confirmations, height, version, versionhex, merkleroot, time, mediantime,
-        nonce, bits, difficulty, chainwork, ntx, previousblockhash, nextblockhash, 
+    INSERT INTO block_header (
+        hash, height, version, versionhex, merkleroot, time, mediantime,
+        nonce, bits, difficulty, chainwork, ntx, previousblockhash,
         strippedsize, size, weight, tx
     ) VALUES (
-        :hash, :confirmations, :height, :version, :versionhex, :merkleroot, :time, :mediantime,
-        :nonce, :bits, :difficulty, :chainwork, :ntx, :previousblockhash, :nextblockhash,
+        :hash, :height, :version, :versionhex, :merkleroot, :time, :mediantime,
+        :nonce, :bits, :difficulty, :chainwork, :ntx, :previousblockhash,
         :strippedsize, :size, :weight, :tx
     )
 """
@@ -86,12 +85,12 @@ print("Total blocks:", execute_query(count_blocks_query, fetch=True))
 highest_difficulty_query = "SELECT * FROM block ORDER BY difficulty DESC LIMIT 1"
 print("Block with highest difficulty:", execute_query(highest_difficulty_query, fetch=True))
 
-# 7. Update block confirmations
-update_confirmations_query = "UPDATE block SET confirmations = confirmations + 1 WHERE height = ?"
-execute_query(update_confirmations_query, (700000,))
+# 7. Block confirmations (derived from the tip, no UPDATE needed)
+confirmations_query = "SELECT confirmations, nextblockhash FROM block WHERE height = ?"
+print("Confirmations at height 700000:", execute_query(confirmations_query, (700000,), fetch=True))
 
 # 8. Delete block by hash
-delete_block_query = "DELETE FROM block WHERE hash = ?"
+delete_block_query = "DELETE FROM block_header WHERE hash = ?"
 execute_query(delete_block_query, ("000000000000000000076d286d8bcf76d9e84f4df5de2d5b2f3e0b8b7ec3a891",))
 
 # 9. Verify block deletion
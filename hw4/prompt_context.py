@@ -0,0 +1,321 @@
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from schema_pruner import SchemaRanker
+
+# Declared types whose values are large documents: no stats, truncated samples
+SKIP_STATS_TYPES = ("JSON", "BLOB")
+SAMPLE_VALUE_CHARS = 80
+
+def get_schema_text(conn: sqlite3.Connection) -> str:
+    """CREATE statements of the user tables and views"""
+    rows = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type IN ('table', 'view') "
+        "AND sql IS NOT NULL AND name NOT LIKE 'sqlite_%'"
+    ).fetchall()
+    return '\n'.join(row[0] for row in rows)
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def _short(value) -> str:
+    if isinstance(value, (bytes, memoryview)):
+        value = bytes(value).hex()
+    text = repr(value)
+    if len(text) > SAMPLE_VALUE_CHARS:
+        text = text[:SAMPLE_VALUE_CHARS] + "...'"
+    return text
+
+def table_statistics(conn: sqlite3.Connection, table: str) -> Tuple[int, List[str]]:
+    """Row count and one min/max/distinct line per scalar column.
+
+    All columns are aggregated in a single scan of the table.
+    """
+    count, stats = column_statistics(conn, table)
+    return count, list(stats.values())
+
+def column_statistics(conn: sqlite3.Connection, table: str) -> Tuple[int, Dict[str, str]]:
+    """Row count and the min/max/distinct line of each scalar column, by name"""
+    count, ranges = _column_ranges(conn, table)
+    return count, {name: _stat_line(name, *values) for name, values in ranges.items()}
+
+def _stat_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [
+        name for _, name, col_type, *_ in conn.execute(f"PRAGMA table_info({_quote(table)})")
+        if not any(t in (col_type or "").upper() for t in SKIP_STATS_TYPES)
+    ]
+
+def _column_ranges(conn: sqlite3.Connection, table: str, after_rowid: Optional[int] = None,
+                   distinct: bool = True) -> Tuple[int, Dict[str, List]]:
+    """Row count and [min, max, distinct count] of each scalar column in one
+    scan; only of the rows past ``after_rowid`` when given, and without the
+    (costly) distinct counts, which are then None, unless ``distinct``"""
+    columns = _stat_columns(conn, table)
+    aggregates = ["COUNT(*)"]
+    for name in columns:
+        q = _quote(name)
+        aggregates += [f"MIN({q})", f"MAX({q})", f"COUNT(DISTINCT {q})" if distinct else "NULL"]
+    sql = f"SELECT {', '.join(aggregates)} FROM {_quote(table)}"
+    row = conn.execute(sql + " WHERE rowid > ?" if after_rowid is not None else sql,
+                       (after_rowid,) if after_rowid is not None else ()).fetchone()
+    return row[0], {name: list(row[1 + 3 * i: 4 + 3 * i]) for i, name in enumerate(columns)}
+
+def _stat_line(name: str, lo, hi, distinct) -> str:
+    return f"  {name}: min {_short(lo)}, max {_short(hi)}, {distinct} distinct"
+
+def _max_rowid(conn: sqlite3.Connection, table: str) -> Optional[int]:
+    try:
+        return conn.execute(f"SELECT MAX(rowid) FROM {_quote(table)}").fetchone()[0]
+    except sqlite3.OperationalError:  # WITHOUT ROWID table
+        return None
+
+def _sqlite_order(value) -> Tuple:
+    """Sort key following SQLite's cross-type order: NULL, numbers, text, BLOB"""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    return (2, value) if isinstance(value, str) else (3, bytes(value))
+
+def sample_rows(conn: sqlite3.Connection, table: str, limit: int = 2) -> List[str]:
+    """The most recently inserted rows, with long values truncated"""
+    return [_render_row(row) for row in _sample_values(conn, table, limit)]
+
+def _sample_values(conn: sqlite3.Connection, table: str, limit: int) -> List[List[Tuple[str, str]]]:
+    cursor = conn.execute(f"SELECT * FROM {_quote(table)} ORDER BY rowid DESC LIMIT ?", (limit,))
+    names = [d[0] for d in cursor.description]
+    return [[(n, _short(v)) for n, v in zip(names, row)] for row in cursor]
+
+def _render_row(row: List[Tuple[str, str]]) -> str:
+    return "  {" + ", ".join(f"{n}: {v}" for n, v in row) + "}"
+
+def describe_database(conn: sqlite3.Connection, samples: int = 2) -> Dict[str, Dict]:
+    """Structured schema, statistics and example rows, by table or view name.
+
+    Each entry has type, sql (the CREATE statement), columns as
+    (name, declared type), keys (primary key and indexed columns), and for
+    tables count, stats (line per column), samples (rows of
+    (column, value text)) and, for ``update_statistics``, ranges
+    ([min, max, distinct] per column) and the last rowid scanned. Entries
+    are in ``sqlite_master`` order.
+    """
+    info = {}
+    for name, kind, sql in conn.execute(
+        "SELECT name, type, sql FROM sqlite_master WHERE type IN ('table', 'view') "
+        "AND sql IS NOT NULL AND name NOT LIKE 'sqlite_%'"
+    ):
+        columns = [(col, col_type or "") for _, col, col_type, *_ in
+                   conn.execute(f"PRAGMA table_info({_quote(name)})")]
+        keys = {col for _, col, _, _, _, pk in conn.execute(f"PRAGMA table_info({_quote(name)})") if pk}
+        for _, index, *_ in conn.execute(f"PRAGMA index_list({_quote(name)})"):
+            keys |= {row[2] for row in conn.execute(f"PRAGMA index_info({_quote(index)})") if row[2]}
+        info[name] = {"type": kind, "sql": sql, "columns": columns, "keys": keys,
+                      "count": None, "stats": {}, "samples": [], "ranges": {}, "rowid": None}
+        if kind == "table":
+            entry = info[name]
+            entry["rowid"] = _max_rowid(conn, name)
+            entry["count"], entry["ranges"] = _column_ranges(conn, name)
+            entry["stats"] = {col: _stat_line(col, *values) for col, values in entry["ranges"].items()}
+            entry["samples"] = _sample_values(conn, name, samples)
+    return info
+
+def update_statistics(conn: sqlite3.Connection, info: Dict[str, Dict], samples: int = 2) -> Dict[str, Dict]:
+    """``describe_database`` output brought up to date without a full scan.
+
+    Only rows appended since (rowid past the last one scanned) are read, to
+    extend the row counts and min/max ranges, and the example rows are
+    re-read. Distinct counts stay as of the full scan, and rows deleted or
+    updated in place (a reorg) are not noticed until the next full scan.
+    """
+    updated = {}
+    for name, entry in info.items():
+        entry = dict(entry)
+        updated[name] = entry
+        if entry["type"] != "table":
+            continue
+        rowid = _max_rowid(conn, name)
+        if rowid is not None and entry["rowid"] is not None and rowid > entry["rowid"]:
+            count, new = _column_ranges(conn, name, after_rowid=entry["rowid"], distinct=False)
+            ranges = {}
+            for col, (lo, hi, distinct) in entry["ranges"].items():
+                new_lo, new_hi, _ = new.get(col, (None, None, None))
+                bounds = [v for v in (lo, new_lo) if v is not None]
+                lo = min(bounds, key=_sqlite_order) if bounds else None
+                bounds = [v for v in (hi, new_hi) if v is not None]
+                hi = max(bounds, key=_sqlite_order) if bounds else None
+                ranges[col] = [lo, hi, distinct]
+            entry.update(rowid=rowid, count=entry["count"] + count, ranges=ranges,
+                         stats={col: _stat_line(col, *values) for col, values in ranges.items()})
+        entry["samples"] = _sample_values(conn, name, samples)
+    return updated
+
+def render_context(info: Dict[str, Dict], keep: Optional[Dict[str, List[str]]] = None,
+                   details: bool = True) -> str:
+    """Prompt text for ``describe_database`` output.
+
+    Args:
+        info: Output of describe_database
+        keep: Columns to show per table; None shows the full schema
+        details: Include column statistics and example rows
+
+    Returns:
+        str: Schema (CREATE statements, or compact column lists of the
+        kept columns when pruned), then statistics and example rows
+    """
+    if keep is None:
+        parts = ["Database schema:\n" + "\n".join(entry["sql"] for entry in info.values())]
+        tables = sorted(name for name, entry in info.items() if entry["type"] == "table")
+        shown = {name: [col for col, _ in info[name]["columns"]] for name in tables}
+    else:
+        lines = []
+        for name, columns in keep.items():
+            entry = info[name]
+            types = dict(entry["columns"])
+            lines.append(f"{name} ({entry['type']}): " +
+                         ", ".join(f"{col} {types[col]}".rstrip() for col in columns))
+            omitted = [col for col, _ in entry["columns"] if col not in columns]
+            if omitted:
+                lines.append(f"  other columns: {', '.join(omitted)}")
+        parts = ["Database schema (columns relevant to the question):\n" + "\n".join(lines)]
+        shown = {}
+        for name, columns in sorted(keep.items()):
+            source = _statistics_source(info, name, columns)
+            if source is not None:
+                shown.setdefault(source, [])
+                shown[source] += [col for col in columns if col not in shown[source]]
+    if not details:
+        return parts[0]
+
+    parts.append("Column statistics:")
+    for name, columns in shown.items():
+        stats = info[name]["stats"]
+        parts.append(f"{name} ({info[name]['count']} rows)\n" +
+                     "\n".join(stats[col] for col in columns if col in stats))
+    parts.append("Example rows:")
+    for name, columns in shown.items():
+        wanted = set(columns)
+        rows = [_render_row([(n, v) for n, v in row if n in wanted]) for row in info[name]["samples"]]
+        if rows:
+            parts.append(f"{name}\n" + "\n".join(rows))
+    return "\n\n".join(parts)
+
+def _statistics_source(info: Dict[str, Dict], name: str, columns: List[str]) -> Optional[str]:
+    """Table whose statistics describe ``columns`` of ``name``.
+
+    Views have no statistics of their own; the table sharing the most
+    column names (the one the view selects from) stands in for them.
+    """
+    if info[name]["type"] == "table":
+        return name
+    overlap = {table: len(set(columns) & {col for col, _ in entry["columns"]})
+               for table, entry in info.items() if entry["type"] == "table"}
+    best = max(overlap, key=overlap.get, default=None)
+    return best if best and overlap[best] else None
+
+def build_prompt_context(conn: sqlite3.Connection, samples: int = 2) -> str:
+    """Schema, per-column statistics and example rows for the LLM prompt"""
+    return render_context(describe_database(conn, samples))
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count (about four characters per token)"""
+    return (len(text) + 3) // 4
+
+class PromptContextCache:
+    """Caches the prompt context for one database.
+
+    The described schema is reused while ``PRAGMA schema_version`` and the
+    tip height are unchanged, so repeated questions in a warm container cost
+    two cheap lookups instead of a full introspection and statistics scan.
+    A new tip only reads the rows appended since (``update_statistics``);
+    the full scan runs again only when the schema changes. Either runs
+    outside the lock, by one request at a time, while the others keep
+    using the previous context. Given the question, the context is pruned
+    to the relevant tables and columns (see ``schema_pruner``) and the
+    token saving is logged.
+    """
+    def __init__(self, samples: int = 2):
+        self.samples = samples
+        self._key = None
+        self._info = None
+        self._full: Dict[bool, str] = {}
+        self.ranker = None
+        self.schema_key = None  # Digest of the schema text, for dependent caches
+        self._lock = threading.Lock()          # guards the cached context
+        self._building = threading.Lock()      # one rebuild at a time
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def version(conn: sqlite3.Connection) -> Tuple[int, Optional[int]]:
+        """(schema_version, tip height) the cached context is valid for"""
+        schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        try:
+            tip_height = conn.execute("SELECT MAX(height) FROM block").fetchone()[0]
+        except sqlite3.OperationalError:  # Not a block database
+            tip_height = None
+        return schema_version, tip_height
+
+    def _refresh(self, conn: sqlite3.Connection):
+        key = self.version(conn)
+        with self._lock:
+            if key == self._key:
+                self.hits += 1
+                return
+            self.misses += 1
+            have_context = self._info is not None
+        # Without a context yet every request has to wait for the first build
+        if not self._building.acquire(blocking=not have_context):
+            return  # Being rebuilt; serve the previous context meanwhile
+        try:
+            with self._lock:
+                info, built = self._info, self._key
+            if built == key:
+                return
+            ranker, schema_key = self.ranker, self.schema_key
+            if built is None or built[0] != key[0]:
+                info = describe_database(conn, self.samples)
+                ranker = SchemaRanker(info)
+                schema_key = hashlib.sha1(get_schema_text(conn).encode()).hexdigest()
+            else:
+                info = update_statistics(conn, info, self.samples)
+            full = {details: render_context(info, details=details) for details in (True, False)}
+            with self._lock:
+                self._info, self._full, self.ranker, self.schema_key = info, full, ranker, schema_key
+                self._key = key
+        finally:
+            self._building.release()
+
+    def get(self, conn: sqlite3.Connection, question: Optional[str] = None,
+            details: bool = True) -> str:
+        """Return the prompt context, rebuilding it only when stale.
+
+        Args:
+            conn: Connection to the database
+            question: When given, prune to the tables and columns it needs
+            details: Include column statistics and example rows
+
+        Returns:
+            str: Prompt context text
+        """
+        self._refresh(conn)
+        with self._lock:
+            full, info, ranker = self._full[details], self._info, self.ranker
+        if question is None:
+            return full
+        keep = ranker.select(question)
+        text = full if keep is None else render_context(info, keep, details)
+        print(f"Prompt context: {estimate_tokens(full)} -> {estimate_tokens(text)} tokens "
+              f"({', '.join(keep) if keep else 'unpruned'})")
+        return text
+
+_caches: Dict[str, PromptContextCache] = {}
+_caches_lock = threading.Lock()
+
+def get_prompt_context_cache(db_path: str) -> PromptContextCache:
+    """Return the container-wide prompt context cache for ``db_path``"""
+    with _caches_lock:
+        if db_path not in _caches:
+            _caches[db_path] = PromptContextCache()
+        return _caches[db_path]
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import uuid
+import atexit
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+HISTORY_DIR = "/data/qa_history"
+FLUSH_INTERVAL = 5.0               # seconds between background flushes
+FLUSH_RECORDS = 200                # buffered records that trigger an early flush
+SEGMENT_BYTES = 4 * 1024 * 1024    # segment size at which a new segment is started
+MAX_LOGGED_ROWS = 50               # result rows kept per record
+
+# Columns of the table query_history loads; the full record is in "record"
+HISTORY_COLUMNS = ["ts", "kind", "question", "sql", "path", "cache_hit", "error",
+                   "row_count", "latency", "llm_latency", "prompt_tokens", "tip_height"]
+
+class HistoryLog:
+    """Buffered, append-only JSONL log of questions and test results.
+
+    ``append`` only puts the record on an in-memory buffer. A background
+    thread writes the buffer to the current segment file every
+    ``flush_interval`` seconds, or sooner once ``flush_records`` are waiting,
+    and commits the volume after each flush that wrote records, so a
+    container that is killed loses at most one interval. A segment is
+    sealed once it reaches ``segment_bytes``. ``close`` (also run at
+    interpreter exit) flushes and commits; a later ``append`` restarts the
+    background flush. Every log instance writes its own segments, so
+    concurrent containers never append to the same file.
+    """
+    def __init__(self, directory: str = HISTORY_DIR, commit: Optional[Callable[[], None]] = None,
+                 flush_interval: float = FLUSH_INTERVAL, flush_records: int = FLUSH_RECORDS,
+                 segment_bytes: int = SEGMENT_BYTES):
+        self.directory = directory
+        self.commit = commit
+        self.flush_interval = flush_interval
+        self.flush_records = flush_records
+        self.segment_bytes = segment_bytes
+        self._writer = uuid.uuid4().hex[:8]
+        self._segment = None
+        self._sequence = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+        self._registered = False
+
+    def append(self, record: Dict[str, Any]):
+        """Buffer a copy of one record (a timestamp is added); never blocks on I/O"""
+        record = {"ts": time.time(), **record}
+        with self._lock:
+            self._buffer.append(record)
+            if self._thread is None or self._closed:
+                self._closed = False
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+                if not self._registered:
+                    atexit.register(self.close)
+                    self._registered = True
+            full = len(self._buffer) >= self.flush_records
+        if full:
+            self._wake.set()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _next_segment(self) -> str:
+        self._sequence += 1
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.gmtime())
+        return os.path.join(self.directory, f"{stamp}_{self._writer}_{self._sequence:04d}.jsonl")
+
+    def flush(self, commit: bool = False):
+        """Write the buffered records to the current segment.
+
+        The volume is committed if any records were written.
+
+        Args:
+            commit: Commit the volume even if there was nothing to write
+        """
+        with self._lock:
+            records, self._buffer = self._buffer, []
+        with self._flush_lock:
+            if records:
+                os.makedirs(self.directory, exist_ok=True)
+                if self._segment is None:
+                    self._segment = self._next_segment()
+                lines = "".join(json.dumps(r, default=str, separators=(",", ":")) + "\n" for r in records)
+                with open(self._segment, "a") as f:
+                    f.write(lines)
+                if os.path.getsize(self._segment) >= self.segment_bytes:
+                    self._segment = None  # Sealed
+            if (records or commit) and self.commit is not None:
+                self.commit()
+
+    def close(self):
+        """Stop the background flush and persist everything buffered"""
+        self._closed = True
+        self._wake.set()
+        self.flush(commit=True)
+
+_logs: Dict[str, HistoryLog] = {}
+_logs_lock = threading.Lock()
+
+def get_history_log(directory: str = HISTORY_DIR, commit: Optional[Callable[[], None]] = None) -> HistoryLog:
+    """Return the container-wide history log writing to ``directory``"""
+    with _logs_lock:
+        if directory not in _logs:
+            _logs[directory] = HistoryLog(directory, commit)
+        return _logs[directory]
+
+def result_summary(result: Optional[List]) -> Dict[str, Any]:
+    """row_count plus the first MAX_LOGGED_ROWS rows of a result"""
+    if result is None:
+        return {"row_count": None, "result": None}
+    return {"row_count": len(result), "result": [list(row) for row in result[:MAX_LOGGED_ROWS]]}
+
+def read_history(directory: str = HISTORY_DIR, since: Optional[float] = None,
+                 kind: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Yield logged records in segment order, optionally filtered.
+
+    Args:
+        directory: Directory holding the JSONL segments
+        since: Only records with ts at or after this unix time
+        kind: Only records of this kind ("qa", "test_normal", ...)
+    """
+    if not os.path.isdir(directory):
+        return
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".jsonl"):
+            continue
+        with open(os.path.join(directory, name)) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:  # Torn last line of a segment still being written
+                    continue
+                if since is not None and record.get("ts", 0) < since:
+                    continue
+                if kind is not None and record.get("kind") != kind:
+                    continue
+                yield record
+
+def query_history(sql: str, directory: str = HISTORY_DIR, since: Optional[float] = None) -> List[tuple]:
+    """Run ``sql`` against the history loaded into an in-memory ``history`` table.
+
+    The table has HISTORY_COLUMNS plus ``record`` (the full JSON record),
+    e.g. ``SELECT path, AVG(latency) FROM history GROUP BY path``.
+    """
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute(f"CREATE TABLE history ({', '.join(HISTORY_COLUMNS)}, record JSON)")
+        conn.executemany(
+            f"INSERT INTO history VALUES ({', '.join('?' * (len(HISTORY_COLUMNS) + 1))})",
+            ([_scalar(r.get(c)) for c in HISTORY_COLUMNS] + [json.dumps(r)]
+             for r in read_history(directory, since))
+        )
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+def _scalar(value: Any) -> Any:
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    return json.dumps(value, default=str)
@@ -0,0 +1,331 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import resource
+import statistics
+import multiprocessing
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sql_functions import register_functions
+from query_planner import estimate_cost
+from sql_test_cases import load_cases
+
+RESULTS_DB = "bench_results.db"
+WORK_DIR = "bench_dbs"
+REPEAT = 5                 # warm runs per query and size
+STEP_INTERVAL = 100        # VM instructions per progress callback when counting
+QUERY_TIMEOUT = 300        # seconds for a query's cold run before it is abandoned
+REGRESSION = 1.25          # warm latency or VM step ratio flagged in the diff
+MIN_DELTA_MS = 2.0         # latency changes below this are noise
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def open_db(path: str, readonly: bool = False) -> sqlite3.Connection:
+    if readonly:
+        return register_functions(sqlite3.connect(f"file:{path}?mode=ro", uri=True))
+    return register_functions(sqlite3.connect(path))
+
+def make_sized_copy(src_path: str, dest_path: str, max_height: int) -> str:
+    """Copy of ``src_path`` holding the blocks below ``max_height``.
+
+    The schema (tables, indexes, views) is replayed from
+    ``sqlite_master``; tables with a height column are cut at
+    ``max_height``, the rest are copied whole. The copy is ANALYZEd so the
+    planner sees the same kind of statistics as the source. An existing
+    copy is reused while the source file is unchanged.
+    """
+    stamp = os.stat(src_path)
+    marker = f"{os.path.abspath(src_path)}:{stamp.st_size}:{stamp.st_mtime_ns}:{max_height}"
+    if os.path.exists(dest_path):
+        conn = sqlite3.connect(dest_path)
+        try:
+            if conn.execute("SELECT value FROM bench_source").fetchone()[0] == marker:
+                return dest_path
+        except sqlite3.Error:
+            pass
+        finally:
+            conn.close()
+        os.remove(dest_path)
+
+    conn = open_db(dest_path)
+    conn.execute("ATTACH DATABASE ? AS src", (src_path,))
+    schema = conn.execute(
+        "SELECT type, name, sql FROM src.sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'"
+    ).fetchall()
+    for kind, name, sql in schema:
+        if kind == "table":
+            conn.execute(sql)
+            columns = [col for _, col, *_ in conn.execute(f"PRAGMA src.table_info({_quote(name)})")]
+            where = " WHERE height < ?" if "height" in columns else ""
+            names = ", ".join(_quote(c) for c in columns)
+            conn.execute(f"INSERT INTO main.{_quote(name)} ({names}) SELECT {names} FROM src.{_quote(name)}{where}",
+                         (max_height,) if where else ())
+    for kind, name, sql in schema:
+        if kind in ("index", "view", "trigger"):
+            conn.execute(sql)
+    conn.commit()
+    conn.execute("DETACH DATABASE src")
+    conn.execute("ANALYZE")
+    conn.execute("CREATE TABLE bench_source (value TEXT)")
+    conn.execute("INSERT INTO bench_source VALUES (?)", (marker,))
+    conn.commit()
+    conn.close()
+    return dest_path
+
+def storage_profile(path: str) -> Dict[str, Any]:
+    """What a run's numbers depend on besides the SQL: schema, indexes, storage"""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        ddl = "\n".join(row[0] for row in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL ORDER BY type, name"))
+        return {
+            "schema_hash": hashlib.sha1(ddl.encode()).hexdigest()[:12],
+            "indexes": [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' ORDER BY name")],
+            "page_size": conn.execute("PRAGMA page_size").fetchone()[0],
+            "journal_mode": conn.execute("PRAGMA journal_mode").fetchone()[0],
+            "file_bytes": os.path.getsize(path),
+            "sqlite_version": sqlite3.sqlite_version,
+        }
+    finally:
+        conn.close()
+
+def _drop_os_cache(path: str):
+    """Ask the kernel to evict the file's clean pages (best effort, Linux)"""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    for suffix in ("", "-wal"):
+        if os.path.exists(path + suffix):
+            fd = os.open(path + suffix, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+
+def _cold_child(path: str, sql: str, pipe):
+    """Cold run, then a VM-step-counting run, in a fresh process.
+
+    A fresh process and connection start with an empty SQLite page cache
+    and no prepared statement; the peak RSS growth of the process covers
+    SQLite's sorters and temp b-trees as well as the fetched rows.
+    """
+    try:
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        _drop_os_cache(path)
+        conn = open_db(path, readonly=True)
+        start = time.perf_counter()
+        rows = conn.execute(sql).fetchall()
+        cold = time.perf_counter() - start
+
+        steps = [0]
+        def count() -> int:
+            steps[0] += STEP_INTERVAL
+            return 0
+        conn.set_progress_handler(count, STEP_INTERVAL)
+        for _ in conn.execute(sql):
+            pass
+        conn.close()
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+        pipe.send({"cold_ms": cold * 1000, "vm_steps": steps[0], "peak_kib": max(peak, 0),
+                   "row_count": len(rows), "error": None})
+    except sqlite3.Error as e:
+        pipe.send({"error": str(e)})
+    finally:
+        pipe.close()
+
+def measure(path: str, conn: sqlite3.Connection, sql: str, repeat: int = REPEAT) -> Dict[str, Any]:
+    """Cold and warm latency, VM steps, peak memory and plan of one query.
+
+    Returns:
+        Dict with cold_ms, warm_ms (median), warm_min_ms, vm_steps,
+        peak_kib, row_count, est_cost, plan and error
+    """
+    result: Dict[str, Any] = {"cold_ms": None, "warm_ms": None, "warm_min_ms": None, "vm_steps": None,
+                              "peak_kib": None, "row_count": None, "est_cost": None, "plan": None}
+    try:
+        result["est_cost"], result["plan"] = estimate_cost(conn, sql)
+    except sqlite3.Error as e:
+        return {**result, "error": str(e)}
+
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    child = context.Process(target=_cold_child, args=(path, sql, sender))
+    child.start()
+    sender.close()
+    if not receiver.poll(QUERY_TIMEOUT):
+        child.terminate()
+        child.join()
+        return {**result, "error": f"cold run exceeded {QUERY_TIMEOUT}s"}
+    cold = receiver.recv()
+    child.join()
+    if cold["error"]:
+        return {**result, "error": cold["error"]}
+    result.update(cold)
+
+    conn.execute(sql).fetchall()  # Warm the page cache and statement cache
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    result["warm_ms"] = statistics.median(timings)
+    result["warm_min_ms"] = min(timings)
+    return result
+
+class BenchmarkStore:
+    """Benchmark runs and per-query results, in a SQLite file"""
+    def __init__(self, path: str = RESULTS_DB):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY, label TEXT, started TEXT, db_path TEXT, profile JSON
+            );
+            CREATE TABLE IF NOT EXISTS results (
+                run_id INTEGER, size TEXT, query_id TEXT, sql_hash TEXT,
+                cold_ms REAL, warm_ms REAL, warm_min_ms REAL, vm_steps INTEGER, peak_kib INTEGER,
+                row_count INTEGER, est_cost INTEGER, plan TEXT, error TEXT,
+                PRIMARY KEY (run_id, size, query_id)
+            );
+        """)
+
+    def start_run(self, label: str, db_path: str, profile: Dict[str, Any]) -> int:
+        cursor = self.conn.execute(
+            "INSERT INTO runs (label, started, db_path, profile) VALUES (?, ?, ?, ?)",
+            (label, datetime.now().isoformat(timespec="seconds"), db_path, json.dumps(profile))
+        )
+        self.conn.commit()
+        return cursor.lastrowid
+
+    def add(self, run_id: int, size: str, query_id: str, sql: str, result: Dict[str, Any]):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (run_id, size, query_id, hashlib.sha1(sql.encode()).hexdigest()[:12],
+             result["cold_ms"], result["warm_ms"], result["warm_min_ms"], result["vm_steps"],
+             result["peak_kib"], result["row_count"], result["est_cost"], result["plan"], result["error"])
+        )
+        self.conn.commit()
+
+    def previous_run(self, run_id: int) -> Optional[int]:
+        row = self.conn.execute("SELECT MAX(id) FROM runs WHERE id < ?", (run_id,)).fetchone()
+        return row[0]
+
+    def results(self, run_id: int) -> Dict[tuple, Dict[str, Any]]:
+        cursor = self.conn.execute("SELECT * FROM results WHERE run_id = ?", (run_id,))
+        names = [d[0] for d in cursor.description]
+        return {(r["size"], r["query_id"]): r for r in (dict(zip(names, row)) for row in cursor)}
+
+    def run(self, run_id: int) -> Dict[str, Any]:
+        label, started, profile = self.conn.execute(
+            "SELECT label, started, profile FROM runs WHERE id = ?", (run_id,)).fetchone()
+        return {"id": run_id, "label": label, "started": started, "profile": json.loads(profile)}
+
+def _ratio(new: Optional[float], old: Optional[float]) -> Optional[float]:
+    if new is None or not old:
+        return None
+    return new / old
+
+def diff_report(store: BenchmarkStore, run_id: int, baseline_id: int,
+                threshold: float = REGRESSION) -> str:
+    """Markdown comparison of two runs: regressions, improvements, plan changes"""
+    run, base = store.run(run_id), store.run(baseline_id)
+    new, old = store.results(run_id), store.results(baseline_id)
+    lines = [f"# Query benchmark: run {run_id} ({run['label']}) vs run {baseline_id} ({base['label']})", ""]
+    changed = {k: (base["profile"].get(k), v) for k, v in run["profile"].items()
+               if base["profile"].get(k) != v}
+    for key, (before, after) in changed.items():
+        lines.append(f"- {key}: {before} -> {after}")
+    lines += ["", "| Size | Query | Warm ms (old -> new) | Ratio | VM steps ratio | Cold ms (old -> new) | Note |",
+              "|------|-------|----------------------|-------|----------------|----------------------|------|"]
+    counts = {"regressed": 0, "improved": 0, "plan changed": 0, "errors": 0}
+    for key in sorted(new, key=lambda k: (len(k[0]), k)):
+        a, b = old.get(key), new[key]
+        notes = []
+        if b["error"]:
+            notes.append(f"error: {b['error'][:60]}")
+            counts["errors"] += 1
+        if a is None:
+            notes.append("new query")
+        else:
+            warm = _ratio(b["warm_ms"], a["warm_ms"])
+            steps = _ratio(b["vm_steps"], a["vm_steps"])
+            delta = (b["warm_ms"] or 0) - (a["warm_ms"] or 0)
+            if (warm and warm >= threshold and delta >= MIN_DELTA_MS) or (steps and steps >= threshold):
+                notes.append("**regression**")
+                counts["regressed"] += 1
+            elif (warm and warm <= 1 / threshold and -delta >= MIN_DELTA_MS) or (steps and steps <= 1 / threshold):
+                notes.append("improvement")
+                counts["improved"] += 1
+            if a["plan"] != b["plan"]:
+                notes.append("plan changed")
+                counts["plan changed"] += 1
+            if a["sql_hash"] != b["sql_hash"]:
+                notes.append("SQL changed")
+        if not notes:
+            continue
+        def fmt(value):
+            return "-" if value is None else f"{value:.1f}"
+        lines.append(
+            f"| {key[0]} | {key[1]} | {fmt(a and a['warm_ms'])} -> {fmt(b['warm_ms'])} | "
+            f"{fmt(_ratio(b['warm_ms'], a and a['warm_ms']))} | {fmt(_ratio(b['vm_steps'], a and a['vm_steps']))} | "
+            f"{fmt(a and a['cold_ms'])} -> {fmt(b['cold_ms'])} | {', '.join(notes)} |"
+        )
+    lines += ["", ", ".join(f"{n} {k}" for k, n in counts.items())]
+    return "\n".join(lines) + "\n"
+
+def run_benchmark(db_path: str, sizes: List[str], label: str, store: BenchmarkStore,
+                  suites: List[str], repeat: int = REPEAT, work_dir: str = WORK_DIR) -> int:
+    """Measure every reference query of ``suites`` at every size; returns the run id.
+
+    Args:
+        db_path: Source database
+        sizes: Block counts, or "full" for the source database itself
+        label: Name of the run (e.g. the schema or index change under test)
+        store: Where the results go
+        suites: Test suites whose expected SQL is benchmarked
+        repeat: Warm runs per query
+        work_dir: Where the sized copies are kept between runs
+    """
+    run_id = store.start_run(label, db_path, storage_profile(db_path))
+    cases = load_cases(suites)
+    os.makedirs(work_dir, exist_ok=True)
+    for size in sizes:
+        if size == "full":
+            path = db_path
+        else:
+            path = make_sized_copy(db_path, os.path.join(work_dir, f"blocks_{size}.db"), int(size))
+        conn = open_db(path, readonly=True)
+        for case in cases:
+            query_id = f"{case['suite']}-{case['id']}"
+            result = measure(path, conn, case["expected_sql"], repeat)
+            store.add(run_id, size, query_id, case["expected_sql"], result)
+            status = result["error"] or f"warm {result['warm_ms']:.1f}ms, cold {result['cold_ms']:.1f}ms"
+            print(f"[{size}] {query_id}: {status}")
+        conn.close()
+    return run_id
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark the reference SQL of the QA test suites.")
+    parser.add_argument("db_path", help="SQLite database to benchmark")
+    parser.add_argument("--sizes", default="10000,100000,full",
+                        help="Comma-separated block counts; 'full' is the database itself")
+    parser.add_argument("--label", default="", help="Name of this run, e.g. the change under test")
+    parser.add_argument("--suites", default="normal,hard,extra")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="Warm runs per query")
+    parser.add_argument("--results", default=RESULTS_DB, help="SQLite file storing all runs")
+    parser.add_argument("--baseline", type=int, help="Run id to diff against (default: previous run)")
+    parser.add_argument("--work-dir", default=WORK_DIR, help="Where the sized copies are kept")
+    args = parser.parse_args()
+
+    store = BenchmarkStore(args.results)
+    run_id = run_benchmark(args.db_path, [s.strip() for s in args.sizes.split(",")], args.label,
+                           store, args.suites.split(","), args.repeat, args.work_dir)
+    baseline = args.baseline or store.previous_run(run_id)
+    if baseline:
+        print(diff_report(store, run_id, baseline))
+    else:
+        print(f"Stored run {run_id}; run again after a change to get a diff report.")
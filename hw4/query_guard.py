@@ -0,0 +1,115 @@
+import time
+import sqlite3
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+# Defaults for LLM-generated SQL on the serving path
+TIME_BUDGET = 10.0             # seconds of wall clock, execution and fetch
+MAX_ROWS = 1000
+MAX_BYTES = 4 * 1024 * 1024
+PROGRESS_INTERVAL = 10000      # SQLite VM instructions between budget checks
+FETCH_BATCH = 256
+
+class QueryTimeout(sqlite3.OperationalError):
+    """A statement was interrupted by its time budget"""
+
+def _row_size(row: Tuple) -> int:
+    size = 56
+    for value in row:
+        size += 49 + len(value) if isinstance(value, (str, bytes)) else 24
+    return size
+
+def iter_rows(cursor: sqlite3.Cursor, batch: int = FETCH_BATCH) -> Iterator[Tuple]:
+    """Yield rows a batch at a time instead of materializing them all"""
+    while True:
+        rows = cursor.fetchmany(batch)
+        if not rows:
+            return
+        yield from rows
+
+def guarded_execute(conn: sqlite3.Connection, sql: str,
+                    params: Sequence = (),
+                    time_budget: float = TIME_BUDGET,
+                    max_rows: int = MAX_ROWS,
+                    max_bytes: int = MAX_BYTES) -> Dict[str, Any]:
+    """Run untrusted SQL with a time budget and a result size cap.
+
+    A progress handler counts VM instructions and aborts the statement once
+    the wall-clock deadline passes, which also covers time spent stepping
+    the cursor while fetching. Rows are streamed until ``max_rows`` or
+    ``max_bytes`` is reached; the rest is never computed and ``truncated``
+    is set. Errors, including the timeout, are returned, not raised.
+
+    Returns:
+        Dict with columns, rows, truncated, error, elapsed, cpu_time,
+        vm_steps (approximate, a proxy for rows scanned) and row_count.
+    """
+    steps = [0]
+    deadline = time.monotonic() + time_budget
+
+    def progress() -> int:
+        steps[0] += PROGRESS_INTERVAL
+        return 1 if time.monotonic() > deadline else 0
+
+    columns: List[str] = []
+    rows: List[Tuple] = []
+    truncated = False
+    error = None
+    start, cpu_start = time.perf_counter(), time.thread_time()
+    conn.set_progress_handler(progress, PROGRESS_INTERVAL)
+    cursor = None
+    try:
+        cursor = conn.execute(sql, params)
+        columns = [d[0] for d in cursor.description] if cursor.description else []
+        size = 0
+        for row in iter_rows(cursor):
+            size += _row_size(row)
+            if len(rows) >= max_rows or size > max_bytes:
+                truncated = True
+                break
+            rows.append(row)
+    except sqlite3.Error as e:
+        if time.monotonic() > deadline:
+            error = f"Query exceeded the {time_budget:g}s time budget"
+        else:
+            error = str(e)
+    finally:
+        conn.set_progress_handler(None, 0)
+        if cursor is not None:
+            cursor.close()
+
+    return {
+        "columns": columns,
+        "rows": rows,
+        "truncated": truncated,
+        "error": error,
+        "elapsed": time.perf_counter() - start,
+        "cpu_time": time.thread_time() - cpu_start,
+        "vm_steps": steps[0],
+        "row_count": len(rows),
+    }
+
+@contextmanager
+def guarded_cursor(conn: sqlite3.Connection, sql: str, params: Sequence = (),
+                   time_budget: float = TIME_BUDGET) -> Iterator[sqlite3.Cursor]:
+    """Cursor over untrusted SQL for callers that stream the rows themselves.
+
+    Executing and fetching share one wall-clock budget, enforced by the
+    same progress handler as ``guarded_execute``. Nothing is collected or
+    capped here, and errors are raised: QueryTimeout once the budget
+    interrupts the statement, in the block that was fetching.
+    """
+    deadline = time.monotonic() + time_budget
+    conn.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, PROGRESS_INTERVAL)
+    cursor = None
+    try:
+        cursor = conn.execute(sql, params)
+        yield cursor
+    except sqlite3.OperationalError as e:
+        if time.monotonic() > deadline:
+            raise QueryTimeout(f"Query exceeded the {time_budget:g}s time budget") from e
+        raise
+    finally:
+        conn.set_progress_handler(None, 0)
+        if cursor is not None:
+            cursor.close()
@@ -1,8 +1,12 @@
 import sqlite3
+import modal
 from modal import App, Volume
 
+from sql_functions import register_functions
+
 app = App("chongchen-bitcoin-rpc")
 volume = Volume.from_name("chongchen-bitcoin-data")
+image = modal.Image.debian_slim().add_local_python_source("sql_functions")
 
 query = '''
     
@@ -31,10 +35,10 @@ sql_statement = '''
         b1.height;
 '''
 
-@app.function(volumes={"/data": volume})
+@app.function(volumes={"/data": volume}, image=image)
 def query_bitcoin_db():
     """Query the Bitcoin blockchain database stored in Modal Volume."""
-    conn = sqlite3.connect("/data/bitcoin.db")
+    conn = register_functions(sqlite3.connect("/data/bitcoin.db"))
     cursor = conn.cursor()
 
     # Execute the query
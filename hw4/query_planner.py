@@ -0,0 +1,282 @@
+import re
+import calendar
+import sqlite3
+from typing import Dict, List, Tuple
+
+# Estimated row visits above which generated SQL is sent back to the LLM
+MAX_COST = 50_000_000
+# Assumed rows per outer row for a table-valued function (json_each etc.)
+VIRTUAL_TABLE_ROWS = 25
+
+# strftime('%Y-%m', datetime(time, 'unixepoch')) = '2013-02', also with
+# strftime(fmt, time, 'unixepoch') and BETWEEN '2009' AND '2015'
+STRFTIME_FILTER_RE = re.compile(
+    r"strftime\(\s*'(?P<fmt>%Y|%Y-%m)'\s*,\s*"
+    r"(?:datetime\(\s*(?P<col1>[\w.]+)\s*,\s*'unixepoch'\s*\)|(?P<col2>[\w.]+)\s*,\s*'unixepoch')\s*\)"
+    r"\s*(?:=\s*'(?P<eq>[\d-]+)'|BETWEEN\s+'(?P<lo>[\d-]+)'\s+AND\s+'(?P<hi>[\d-]+)')",
+    re.IGNORECASE
+)
+
+# (SELECT AVG(b3.mediantime) FROM block b3
+#  WHERE b3.height BETWEEN b1.height - 50 AND b1.height - 1)
+PRIOR_WINDOW_RE = re.compile(
+    r"\(\s*SELECT\s+(?P<agg>AVG|SUM|MIN|MAX|COUNT)\(\s*(?P<a1>\w+)\.(?P<col>\w+)\s*\)\s+"
+    r"FROM\s+(?P<table>\w+)\s+(?:AS\s+)?(?P<a2>\w+)\s+"
+    r"WHERE\s+(?P<a3>\w+)\.height\s+BETWEEN\s+(?P<outer>\w+)\.height\s*-\s*(?P<far>\d+)\s+"
+    r"AND\s+(?P=outer)\.height\s*-\s*(?P<near>\d+)\s*\)",
+    re.IGNORECASE
+)
+
+# Literals strftime itself produces for each format; anything else (e.g.
+# '2013-2') never compares equal and must keep its original result
+FORMAT_LITERAL_RE = {"%Y": re.compile(r"^\d{4}$"), "%Y-%m": re.compile(r"^\d{4}-(?:0[1-9]|1[0-2])$")}
+
+WITH_RE = re.compile(r"^\s*WITH\s+(?:RECURSIVE\s+)?", re.IGNORECASE)
+
+# b.hash = '<hex>' and b2.hash = b1.previousblockhash. With binary hash
+# storage the block view exposes lower(hex(...)), which no index covers.
+HASH_COLUMN = r"(?<![\w.])(?:(?P<{0}a>\w+)\.)?(?P<{0}c>hash|previousblockhash)\b"
+HASH_LITERAL = r"'(?P<{0}x>[0-9a-f]{{64}})'"
+HASH_FILTER_RE = re.compile(
+    r"(?:{l}|{lx})\s*=\s*(?:{r}|{rx})".format(
+        l=HASH_COLUMN.format("l"), lx=HASH_LITERAL.format("l"),
+        r=HASH_COLUMN.format("r"), rx=HASH_LITERAL.format("r")),
+    re.IGNORECASE
+)
+TABLE_REF_RE = re.compile(
+    r"(?:\bFROM|\bJOIN|,)\s+(?P<table>\w+)(?:\s+(?:AS\s+)?(?!(?:WHERE|JOIN|ON|USING|INNER|LEFT|"
+    r"RIGHT|FULL|CROSS|NATURAL|GROUP|ORDER|LIMIT|UNION|EXCEPT|INTERSECT|HAVING|WINDOW|FROM|AS)\b)"
+    r"(?P<alias>\w+))?",
+    re.IGNORECASE
+)
+BLOCK_TABLES = ("block", "block_header")
+
+def _period_start(value: str) -> Tuple[int, int]:
+    year, _, month = value.partition("-")
+    return int(year), int(month or 1)
+
+def _epoch(year: int, month: int) -> int:
+    return calendar.timegm((year, month, 1, 0, 0, 0))
+
+def _next_period(year: int, month: int, by_month: bool) -> int:
+    if not by_month:
+        return _epoch(year + 1, 1)
+    return _epoch(year + month // 12, month % 12 + 1)
+
+def rewrite_strftime_filters(sql: str) -> Tuple[str, int]:
+    """Turn strftime year/month equality and BETWEEN filters into time ranges.
+
+    ``strftime`` on every row defeats the time index; the equivalent
+    half-open range on the raw unix timestamp is an index range search.
+    """
+    rewritten = []
+
+    def replace(m: re.Match) -> str:
+        column = m.group("col1") or m.group("col2")
+        fmt = m.group("fmt")
+        by_month = fmt == "%Y-%m"
+        lo = m.group("eq") or m.group("lo")
+        hi = m.group("eq") or m.group("hi")
+        if not all(FORMAT_LITERAL_RE[fmt].match(v) for v in (lo, hi)):
+            return m.group(0)  # Literal does not match the format exactly: leave it
+        start = _epoch(*_period_start(lo))
+        end = _next_period(*_period_start(hi), by_month)
+        rewritten.append(m.group(0))
+        return f"({column} >= {start} AND {column} < {end})"
+
+    sql = STRFTIME_FILTER_RE.sub(replace, sql)
+    return sql, len(rewritten)
+
+def rewrite_prior_windows(sql: str) -> Tuple[str, int]:
+    """Turn correlated "previous N blocks" aggregates into window functions.
+
+    The window is computed once over the whole table in a materialized CTE
+    (RANGE over height matches the BETWEEN exactly, gaps included) and
+    looked up by height, instead of re-aggregating N rows per outer row.
+    """
+    ctes: List[str] = []
+
+    def replace(m: re.Match) -> str:
+        if not m.group("a1") == m.group("a2") == m.group("a3"):
+            return m.group(0)
+        name = f"__window_{len(ctes) + 1}"
+        ctes.append(
+            f"{name} AS MATERIALIZED (SELECT height, {m.group('agg')}({m.group('col')}) OVER "
+            f"(ORDER BY height RANGE BETWEEN {m.group('far')} PRECEDING AND {m.group('near')} PRECEDING) "
+            f"AS value FROM {m.group('table')})"
+        )
+        return f"(SELECT {name}.value FROM {name} WHERE {name}.height = {m.group('outer')}.height)"
+
+    sql = PRIOR_WINDOW_RE.sub(replace, sql)
+    if not ctes:
+        return sql, 0
+    with_clause = WITH_RE.match(sql)
+    if with_clause:
+        head = with_clause.group(0)
+        return head + ", ".join(ctes) + ", " + sql[len(head):], len(ctes)
+    return "WITH " + ", ".join(ctes) + " " + sql, len(ctes)
+
+def has_binary_hashes(conn: sqlite3.Connection) -> bool:
+    """Whether block_header stores hashes as BLOBs (binary storage format)"""
+    return any(name == "hash" and (col_type or "").upper() == "BLOB"
+               for _, name, col_type, *_ in conn.execute("PRAGMA table_info(block_header)"))
+
+def rewrite_hash_filters(sql: str) -> Tuple[str, int]:
+    """Turn hash equality filters and joins into block_header index seeks.
+
+    Only for binary hash storage, where ``block.hash`` is ``lower(hex(...))``
+    of a BLOB. The stored bytes are compared instead and the row is found by
+    id, so ``hash = '<hex>'`` uses idx_block_hash and a hash/previousblockhash
+    join uses idx_block_hash or idx_block_previousblockhash per outer row.
+    Unqualified columns are rewritten only when every table the query reads
+    is block or block_header.
+    """
+    refs = {(m.group("alias") or m.group("table")).lower(): m.group("table").lower()
+            for m in TABLE_REF_RE.finditer(sql)}
+    only_blocks = bool(refs) and all(t in BLOCK_TABLES for t in refs.values())
+    rewritten = []
+
+    def owner(alias):
+        if alias is None:
+            return "" if only_blocks else None
+        return f"{alias}." if refs.get(alias.lower()) in BLOCK_TABLES else None
+
+    def replace(m: re.Match) -> str:
+        left, right = m.group("lc"), m.group("rc")
+        if left and right:
+            if m.group("la") is None or m.group("ra") is None or m.group("la") == m.group("ra"):
+                return m.group(0)
+            outer, inner = owner(m.group("ra")), owner(m.group("la"))
+            if outer is None or inner is None:
+                return m.group(0)
+            rewritten.append(m.group(0))
+            return (f"{inner}id IN (SELECT __h.id FROM block_header __h, block_header __p "
+                    f"WHERE __p.id = {outer}id AND __h.{left} = __p.{right})")
+        column, alias, literal = (left, m.group("la"), m.group("rx")) if left else (right, m.group("ra"), m.group("lx"))
+        if column is None or literal is None or owner(alias) is None:
+            return m.group(0)
+        rewritten.append(m.group(0))
+        return f"{owner(alias)}id IN (SELECT __h.id FROM block_header __h WHERE __h.{column} = X'{literal}')"
+
+    sql = HASH_FILTER_RE.sub(replace, sql)
+    return sql, len(rewritten)
+
+def table_rows(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Row count per table, from sqlite_stat1 when ANALYZEd, else MAX(rowid)"""
+    counts = {}
+    try:
+        for table, stat in conn.execute("SELECT tbl, stat FROM sqlite_stat1"):
+            counts[table] = max(counts.get(table, 0), int(stat.split()[0]))
+    except sqlite3.OperationalError:  # Never ANALYZEd
+        pass
+    for (table,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    ):
+        if table not in counts:
+            try:
+                counts[table] = conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()[0] or 0
+            except sqlite3.OperationalError:  # WITHOUT ROWID
+                counts[table] = 0
+    return counts
+
+def index_rows_per_key(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Average rows per first-column key of each ANALYZEd index"""
+    try:
+        return {idx: int(stat.split()[1]) for idx, stat in conn.execute(
+            "SELECT idx, stat FROM sqlite_stat1 WHERE idx IS NOT NULL") if len(stat.split()) > 1}
+    except sqlite3.OperationalError:
+        return {}
+
+def _loop_rows(detail: str, rows: Dict[str, int], per_key: Dict[str, int]) -> int:
+    """Estimated rows one SCAN/SEARCH step visits per execution"""
+    name = detail.split()[1]
+    total = rows.get(name) or max(rows.values(), default=1)  # Aliases map to the big table
+    if "VIRTUAL TABLE" in detail:
+        return VIRTUAL_TABLE_ROWS
+    if detail.startswith("SCAN"):
+        return total
+    if "(rowid=?)" in detail:
+        return 1
+    index = re.search(r"INDEX (\w+)", detail)
+    if "=?" in detail and ">" not in detail and "<" not in detail:
+        return per_key.get(index.group(1), 10) if index else 10
+    bounds = detail.count(">") + detail.count("<")
+    return max(1, total // (4 ** max(bounds, 1)))
+
+def estimate_cost(conn: sqlite3.Connection, sql: str) -> Tuple[int, str]:
+    """Estimate the row visits of ``sql`` from its query plan.
+
+    Sibling SCAN/SEARCH steps are nested loops and multiply; a correlated
+    subquery runs once per row of the loops before it; materialized CTEs
+    and plain subqueries run once.
+
+    Returns:
+        Tuple[int, str]: Estimated row visits and the plan as indented text
+    """
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    rows = table_rows(conn)
+    per_key = index_rows_per_key(conn)
+    children: Dict[int, List[Tuple[int, str]]] = {}
+    for node_id, parent, _, detail in plan:
+        children.setdefault(parent, []).append((node_id, detail))
+
+    def level_cost(parent: int, outer: int) -> int:
+        total, loop = 0, outer
+        for node_id, detail in children.get(parent, []):
+            if detail.startswith(("SCAN", "SEARCH")) and not detail.startswith("SCAN CONSTANT"):
+                loop *= _loop_rows(detail, rows, per_key)
+                total += loop + level_cost(node_id, loop)
+            elif detail.startswith("CORRELATED"):
+                total += level_cost(node_id, loop)
+            elif detail.startswith(("MATERIALIZE", "CO-ROUTINE", "SCALAR SUBQUERY", "LIST SUBQUERY")):
+                total += level_cost(node_id, 1)  # Evaluated once, even inside a correlated subquery
+            else:  # Compound parts, multi-index OR branches, temp b-trees
+                total += level_cost(node_id, outer)
+        return total
+
+    lines, depth = [], {0: 0}
+    for node_id, parent, _, detail in plan:
+        depth[node_id] = depth.get(parent, 0) + 1
+        lines.append("  " * (depth[node_id] - 1) + detail)
+    return level_cost(0, 1), "\n".join(lines)
+
+def review_sql(conn: sqlite3.Connection, sql: str) -> Dict[str, object]:
+    """Apply the known rewrites and estimate the cost of the result.
+
+    A rewrite is kept only if it still prepares and does not raise the
+    estimated cost. ``error`` is set when the SQL does not prepare at all.
+
+    Returns:
+        Dict with sql, cost, plan, rewrites (names applied) and error
+    """
+    try:
+        cost, plan = estimate_cost(conn, sql)
+    except sqlite3.Error as e:
+        return {"sql": sql, "cost": None, "plan": None, "rewrites": [], "error": str(e)}
+
+    applied = []
+    rewrites = [("strftime_range", rewrite_strftime_filters), ("prior_window", rewrite_prior_windows)]
+    if has_binary_hashes(conn):
+        rewrites.append(("hash_seek", rewrite_hash_filters))
+    for name, rewrite in rewrites:
+        candidate, count = rewrite(sql)
+        if not count:
+            continue
+        try:
+            candidate_cost, candidate_plan = estimate_cost(conn, candidate)
+        except sqlite3.Error:
+            continue
+        if candidate_cost <= cost:
+            sql, cost, plan = candidate, candidate_cost, candidate_plan
+            applied.append(name)
+    return {"sql": sql, "cost": cost, "plan": plan, "rewrites": applied, "error": None}
+
+def cheaper_query_prompt(sql: str, plan: str, cost: int) -> str:
+    """Follow-up prompt asking the LLM for a cheaper equivalent query"""
+    return (
+        f"This query is estimated to visit about {cost:,} rows, which is too slow:\n{sql}\n\n"
+        f"SQLite query plan:\n{plan}\n\n"
+        "Rewrite it to return the same result more cheaply: filter on indexed columns "
+        "(height, time, hash), avoid correlated subqueries (use window functions or joins), "
+        "and avoid functions on columns inside WHERE. Respond only with the SQL statement."
+    )
@@ -0,0 +1,137 @@
+import re
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Blocks this deep are treated as immutable (coinbase maturity)
+FINALITY_DEPTH = 100
+
+STRING_RE = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+HEIGHT_BOUND_RE = re.compile(r"\bheight\s*(?:<=?|=)\s*(\d+)|\bheight\s+between\s+\d+\s+and\s+(\d+)")
+# Results that change with the tip even for old blocks, or on every run
+TIP_DEPENDENT_RE = re.compile(r"\bconfirmations\b|(?:select|,)\s*(?:\w+\.)?\*|random\s*\(|'now'")
+# An OR can widen any bound ("height <= 100 or time > 0")
+OR_RE = re.compile(r"\bor\b")
+# Index searches that bound height from above: height<?, height=?, BETWEEN
+UPPER_BOUND_SEARCH_RE = re.compile(r"\bheight(?:<|=)\?")
+
+def normalize_sql(sql: str) -> str:
+    """Lowercase and collapse whitespace outside string literals"""
+    parts = STRING_RE.split(sql.strip().rstrip(";").strip())
+    return "".join(part if i % 2 else re.sub(r"\s+", " ", part.lower())
+                   for i, part in enumerate(parts))
+
+def height_upper_bound(normalized: str) -> Optional[int]:
+    """Largest literal upper bound on ``height`` in the query, if any"""
+    bounds = [int(a or b) for a, b in HEIGHT_BOUND_RE.findall(normalized)]
+    return max(bounds) if bounds else None
+
+def plan_is_height_bounded(conn: sqlite3.Connection, sql: str) -> bool:
+    """True if every table access in the plan is bounded above on height.
+
+    Full scans, multi-index ORs, searches on other indexes and height
+    searches with only a lower bound (``b2.height > b1.height``) could reach
+    blocks above the literal height bound. The child lookup behind the
+    block view's nextblockhash is the one allowed non-height search.
+    """
+    searched_height = False
+    for *_, detail in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+        if detail.startswith("SCAN") and not detail.startswith(("SCAN CONSTANT", "SCAN (")):
+            return False
+        if detail.startswith("MULTI-INDEX"):
+            return False
+        if detail.startswith("SEARCH"):
+            if UPPER_BOUND_SEARCH_RE.search(detail):
+                searched_height = True
+            elif "previousblockhash" not in detail:
+                return False
+    return searched_height
+
+def estimate_size(value: Any) -> int:
+    """Rough in-memory size of a result (rows of scalars)"""
+    if isinstance(value, (list, tuple)):
+        return 56 + sum(estimate_size(v) for v in value)
+    if isinstance(value, dict):
+        return 64 + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (str, bytes)):
+        return 49 + len(value)
+    return 24
+
+class ResultCache:
+    """Size-bounded LRU cache of query results.
+
+    Keys are the normalized SQL's fingerprint plus the data version, which is
+    the tip height and hash, so a new block (or a reorg) invalidates them.
+    A query without OR whose literal height bound is at least
+    ``finality_depth`` below the tip, and whose plan reaches every table
+    through a height-index search bounded from above, is keyed as "final"
+    instead and stays valid across new blocks.
+    """
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, finality_depth: int = FINALITY_DEPTH):
+        self.max_bytes = max_bytes
+        self.finality_depth = finality_depth
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, conn: sqlite3.Connection, sql: str, tip_height: Optional[int]) -> Tuple[str, str]:
+        """Cache key for ``sql`` in the snapshot ``conn`` is reading"""
+        normalized = normalize_sql(sql)
+        fingerprint = hashlib.sha1(normalized.encode()).hexdigest()
+        if tip_height is None:
+            return fingerprint, "empty"
+
+        bound = height_upper_bound(normalized)
+        code = "".join(STRING_RE.split(normalized)[::2])  # Without string literals
+        if (bound is not None and bound <= tip_height - self.finality_depth
+                and not TIP_DEPENDENT_RE.search(normalized) and not OR_RE.search(code)):
+            try:
+                if plan_is_height_bounded(conn, sql):
+                    return fingerprint, "final"
+            except sqlite3.Error:
+                pass  # Let execution report the error
+
+        row = conn.execute("SELECT hash FROM block_header WHERE height = ?", (tip_height,)).fetchone()
+        tip_hash = row[0].hex() if isinstance(row[0], bytes) else row[0]
+        return fingerprint, f"{tip_height}:{tip_hash}"
+
+    def get(self, key: Tuple[str, str]) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Tuple[str, str], value: Any):
+        size = estimate_size(value)
+        if size > self.max_bytes // 4:  # One huge result would flush everything else
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "bytes": self._bytes,
+                "hits": self.hits, "misses": self.misses}
+
+_caches: Dict[str, ResultCache] = {}
+_caches_lock = threading.Lock()
+
+def get_result_cache(db_path: str) -> ResultCache:
+    """Return the container-wide result cache for ``db_path``"""
+    with _caches_lock:
+        if db_path not in _caches:
+            _caches[db_path] = ResultCache()
+        return _caches[db_path]
@@ -0,0 +1,174 @@
+import re
+import sqlite3
+from itertools import zip_longest
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from query_guard import guarded_cursor, iter_rows
+
+FLOAT_DIGITS = 9           # significant digits two floats must share
+DIFF_SAMPLE = 5            # differing rows reported
+MAX_PENDING = 100_000      # unmatched rows held in multiset mode before hashing only
+MASK64 = (1 << 64) - 1
+
+def normalize_value(value: Any, digits: int = FLOAT_DIGITS) -> Any:
+    """Canonical form of one cell: floats rounded to ``digits`` significant
+    digits (integral ones become ints, so 5.0 equals 5), bytes as hex"""
+    if isinstance(value, float):
+        value = float(f"{value:.{digits}g}")
+        return int(value) if value.is_integer() else value
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).hex()
+    return value
+
+def column_order(expected: Optional[Sequence[str]], generated: Optional[Sequence[str]]) -> Optional[List[int]]:
+    """Positions of the expected columns in the generated row, matched by name.
+
+    None when the names do not correspond one to one; rows are then
+    compared with their cells sorted, ignoring column order entirely.
+    """
+    if not expected or not generated or len(expected) != len(generated):
+        return None
+    positions = {name.lower(): i for i, name in enumerate(generated)}
+    if len(positions) != len(generated):
+        return None
+    order = [positions.get(name.lower()) for name in expected]
+    return None if None in order else order
+
+def _row_key(row: Sequence, order: Optional[List[int]], digits: int) -> Tuple:
+    cells = [normalize_value(v, digits) if type(v) in (float, bytes, memoryview) else v for v in row]
+    if order is not None:
+        return tuple(cells[i] for i in order) if len(cells) == len(order) else tuple(cells)
+    return tuple(sorted(cells, key=lambda v: (type(v).__name__ in ("int", "float"), repr(v))))
+
+def _row_hash(key: Tuple) -> int:
+    # Only ever compared within one comparison, so the per-process hash seed is fine
+    return hash(key) & MASK64
+
+def is_ordered(sql: str) -> bool:
+    """True if the statement's outermost query has an ORDER BY"""
+    text = re.sub(r"'(?:[^']|'')*'", "''", sql.lower())
+    while True:
+        stripped = re.sub(r"\([^()]*\)", "", text)
+        if stripped == text:
+            break
+        text = stripped
+    return re.search(r"\border\s+by\b", text) is not None
+
+def compare_results(expected: Iterable[Sequence], generated: Iterable[Sequence], ordered: bool = False,
+                    expected_columns: Optional[Sequence[str]] = None,
+                    generated_columns: Optional[Sequence[str]] = None,
+                    digits: int = FLOAT_DIGITS, sample: int = DIFF_SAMPLE,
+                    max_pending: int = MAX_PENDING) -> Dict[str, Any]:
+    """Compare two row streams without materializing them.
+
+    Ordered results are compared row by row and stop at the first
+    difference. Otherwise rows are compared as multisets: unmatched rows
+    wait in a table that matching rows from the other side cancel, so
+    memory stays proportional to the difference. Past ``max_pending``
+    unmatched rows only an order-insensitive hash sum (plus the row
+    counts) is compared and the verdict is no longer exact. Either mode
+    stops as soon as one side has rows the other cannot match.
+
+    Returns:
+        Dict with match, reason, ordered, exact, expected_rows and
+        generated_rows (counted up to the stop) and diff, a sample of
+        differing rows as {side, row} or {index, expected, generated}
+    """
+    order = column_order(expected_columns, generated_columns)
+    # Expected rows keep their column order; generated rows are permuted to it
+    orders = (None if order is None else list(range(len(order))), order)
+    result = {"match": True, "reason": None, "ordered": ordered, "exact": True,
+              "expected_rows": 0, "generated_rows": 0, "diff": []}
+    missing = object()
+
+    if ordered:
+        for index, (a, b) in enumerate(zip_longest(expected, generated, fillvalue=missing)):
+            result["expected_rows"] += a is not missing
+            result["generated_rows"] += b is not missing
+            if a is missing or b is missing:
+                result.update(match=False, reason="row count differs")
+                result["diff"].append({"index": index, "expected": None if a is missing else list(a),
+                                       "generated": None if b is missing else list(b)})
+                break
+            if (order is not None or a != b) and _row_key(a, orders[0], digits) != _row_key(b, orders[1], digits):
+                result.update(match=False, reason=f"row {index} differs")
+                result["diff"].append({"index": index, "expected": list(a), "generated": list(b)})
+                break
+        return result
+
+    # pending: row hash -> [count (+ expected, - generated), sample row];
+    # surplus: pending entries where the expected / generated side has more
+    pending: Dict[int, List] = {}
+    surplus = [0, 0]
+    sums = [0, 0]
+    for a, b in zip_longest(expected, generated, fillvalue=missing):
+        for side, row in ((0, a), (1, b)):
+            if row is missing:
+                continue
+            result["generated_rows" if side else "expected_rows"] += 1
+            h = _row_hash(_row_key(row, orders[side], digits))
+            sums[side] = (sums[side] + h) & MASK64
+            if not result["exact"]:
+                continue
+            entry = pending.setdefault(h, [0, row])
+            before = entry[0]
+            entry[0] += -1 if side else 1
+            if before:
+                surplus[before < 0] -= 1
+            if entry[0]:
+                surplus[entry[0] < 0] += 1
+            else:
+                del pending[h]
+            if len(pending) > max_pending:
+                pending.clear()
+                result["exact"] = False
+        # Once one side has ended, the other side's unmatched rows are final
+        if result["exact"] and ((a is missing and surplus[1]) or (b is missing and surplus[0])):
+            longer = "generated" if a is missing else "expected"
+            result.update(match=False, reason=f"{longer} has extra rows")
+            break
+
+    if result["match"]:
+        if result["exact"]:
+            result["match"] = not pending
+        else:
+            result["match"] = (sums[0] == sums[1]
+                               and result["expected_rows"] == result["generated_rows"])
+        if not result["match"]:
+            result["reason"] = "rows differ"
+    for count, row in pending.values():
+        if len(result["diff"]) >= sample:
+            break
+        result["diff"].append({"side": "expected" if count > 0 else "generated", "row": list(row)})
+    return result
+
+def compare_queries(conn: sqlite3.Connection, expected_sql: str, generated_sql: str,
+                    ordered: Optional[bool] = None, time_budget: Optional[float] = None,
+                    **options) -> Dict[str, Any]:
+    """Stream both queries' cursors through ``compare_results``.
+
+    ``ordered`` defaults to whether the expected SQL has an outer ORDER BY.
+    With ``time_budget``, both statements run as ``guarded_cursor``s and
+    QueryTimeout is raised once the comparison takes longer.
+    """
+    def compare(expected, generated):
+        return compare_results(
+            iter_rows(expected), iter_rows(generated),
+            ordered=is_ordered(expected_sql) if ordered is None else ordered,
+            expected_columns=[d[0] for d in expected.description or []],
+            generated_columns=[d[0] for d in generated.description or []],
+            **options
+        )
+
+    if time_budget is not None:
+        # The inner cursor's progress handler (same deadline) covers both
+        with guarded_cursor(conn, expected_sql, time_budget=time_budget) as expected, \
+                guarded_cursor(conn, generated_sql, time_budget=time_budget) as generated:
+            return compare(expected, generated)
+    expected = conn.execute(expected_sql)
+    generated = conn.execute(generated_sql)
+    try:
+        return compare(expected, generated)
+    finally:
+        expected.close()
+        generated.close()
@@ -0,0 +1,342 @@
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import sqlite3
+import tempfile
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from db_pool import get_pool
+from result_cache import get_result_cache
+from query_guard import QueryTimeout, guarded_cursor, iter_rows
+
+PAGE_SIZE = 200                          # rows per page unless the client asks otherwise
+MAX_PAGE_SIZE = 2000
+MAX_PAGE_BYTES = 1024 * 1024             # a page ends early once its rows reach this much JSON
+MAX_RESULT_BYTES = 64 * 1024 * 1024      # row JSON materialized per result for paging
+MAX_STORED_BYTES = 512 * 1024 * 1024     # kept across results before the least recent are evicted
+PAGE_TIME_BUDGET = 15.0                  # seconds to materialize a result
+STREAM_TIME_BUDGET = 60.0                # seconds for a whole NDJSON stream
+STREAM_BATCH = 500                       # rows per NDJSON chunk
+MAX_STREAMS = 8                          # NDJSON streams at once, each on its own connection
+WRITE_BATCH = 1000
+
+class StaleCursor(Exception):
+    """The data a cursor was issued for has changed (new block or reorg)"""
+
+def encode_value(value: Any) -> Any:
+    """JSON-safe cell: BLOBs as hex, everything else as is"""
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).hex()
+    return value
+
+def value_type(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, float):
+        return "real"
+    if isinstance(value, (bytes, memoryview)):
+        return "blob"
+    return "text"
+
+def merge_types(types: List[str], row: Sequence) -> List[str]:
+    """Fold one row into per-column types.
+
+    NULLs take the type of the other values and integers mixed with reals
+    are real; any other mix is "mixed". A column that is only NULL stays
+    "null".
+    """
+    for i, value in enumerate(row):
+        seen, current = value_type(value), types[i]
+        if seen == "null" or seen == current:
+            continue
+        if current == "null":
+            types[i] = seen
+        elif {seen, current} == {"integer", "real"}:
+            types[i] = "real"
+        else:
+            types[i] = "mixed"
+    return types
+
+def encode_row(row: Sequence) -> str:
+    return json.dumps([encode_value(v) for v in row], separators=(",", ":"))
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def encode_cursor(sql: str, key: Tuple[str, str], after: int, secret: bytes) -> str:
+    """Opaque cursor: the SQL, its result-cache key and the last row sent.
+
+    Signed with ``secret``, since the SQL in it is run again when another
+    container has to rebuild the result.
+    """
+    payload = json.dumps({"q": sql, "f": key[0], "v": key[1], "s": after}, separators=(",", ":")).encode()
+    signature = hmac.new(secret, payload, hashlib.sha256).digest()[:16]
+    return f"{_b64(payload)}.{_b64(signature)}"
+
+def decode_cursor(cursor: str, secret: bytes) -> Tuple[str, Tuple[str, str], int]:
+    """(sql, key, after) of a cursor; ValueError if it is malformed or forged"""
+    try:
+        payload_text, signature_text = cursor.split(".")
+        payload, signature = _unb64(payload_text), _unb64(signature_text)
+        if not hmac.compare_digest(signature, hmac.new(secret, payload, hashlib.sha256).digest()[:16]):
+            raise ValueError("bad signature")
+        fields = json.loads(payload)
+        return fields["q"], (fields["f"], fields["v"]), int(fields["s"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError("Malformed cursor") from e
+
+def _columns(names: List[str], types: List[str]) -> List[Dict[str, str]]:
+    return [{"name": name, "type": kind} for name, kind in zip(names, types)]
+
+class ResultPages:
+    """Query results materialized once per data version, read page by page.
+
+    The first request for a result streams it from a pooled snapshot into
+    a container-local SQLite file as one JSON row per ``seq``, keyed like
+    the result cache (SQL fingerprint plus tip height and hash, or "final").
+    Pages are keyset reads on ``(result, seq)``, so page N costs the same
+    as page 1 and never re-runs the query. Cursors carry the SQL and key:
+    another container rebuilds the result on demand while the data version
+    is unchanged, and a cursor from before a new block is stale. Cursors
+    are signed with ``secret``, which containers must share for that; a
+    random one keeps cursors valid in this process only.
+    """
+    def __init__(self, db_path: str, secret: Optional[bytes] = None, path: Optional[str] = None,
+                 max_result_bytes: int = MAX_RESULT_BYTES, max_stored_bytes: int = MAX_STORED_BYTES,
+                 max_streams: int = MAX_STREAMS):
+        self.db_path = db_path
+        self.secret = secret or os.urandom(32)
+        self.max_result_bytes = max_result_bytes
+        self.max_stored_bytes = max_stored_bytes
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="result_pages_", suffix=".db")
+            os.close(fd)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode = OFF")
+        self.conn.execute("PRAGMA synchronous = OFF")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "id INTEGER PRIMARY KEY, fingerprint TEXT, version TEXT, columns JSON, "
+            "row_count INTEGER, truncated INTEGER, bytes INTEGER, last_used REAL, "
+            "UNIQUE (fingerprint, version))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS rows ("
+            "result_id INTEGER, seq INTEGER, row JSON, PRIMARY KEY (result_id, seq)) WITHOUT ROWID"
+        )
+        self._lock = threading.Lock()              # guards self.conn
+        self._building: Dict[Tuple[str, str], threading.Lock] = {}
+        self._building_lock = threading.Lock()
+        self.max_streams = max_streams
+        self._streams = threading.BoundedSemaphore(max_streams)
+
+    def _lookup(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self.conn.execute(
+                # bytes is set once a result is complete
+                "SELECT id, columns, row_count, truncated FROM results "
+                "WHERE fingerprint = ? AND version = ? AND bytes IS NOT NULL",
+                key
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE results SET last_used = ? WHERE id = ?", (time.time(), row[0]))
+        return {"id": row[0], "columns": json.loads(row[1]), "row_count": row[2], "truncated": bool(row[3])}
+
+    def _materialize(self, conn: sqlite3.Connection, sql: str, key: Tuple[str, str]) -> Dict[str, Any]:
+        """Stream ``sql``'s rows into the store, up to ``max_result_bytes``.
+
+        A time budget hit after some rows keeps them as a truncated result;
+        one before the first row, or any other error, is raised.
+        """
+        with self._lock:
+            result_id = self.conn.execute(
+                "INSERT INTO results (fingerprint, version, last_used) VALUES (?, ?, ?)", (*key, time.time())
+            ).lastrowid
+        names: List[str] = []
+        types: List[str] = []
+        batch: List[Tuple[int, int, str]] = []
+        count = size = 0
+        truncated = False
+
+        def flush():
+            with self._lock:
+                self.conn.executemany("INSERT INTO rows VALUES (?, ?, ?)", batch)
+            batch.clear()
+
+        try:
+            with guarded_cursor(conn, sql, time_budget=PAGE_TIME_BUDGET) as cursor:
+                names = [d[0] for d in cursor.description or []]
+                types = ["null"] * len(names)
+                for row in iter_rows(cursor):
+                    text = encode_row(row)
+                    size += len(text)
+                    if size > self.max_result_bytes:
+                        truncated = True
+                        break
+                    count += 1
+                    merge_types(types, row)
+                    batch.append((result_id, count, text))
+                    if len(batch) >= WRITE_BATCH:
+                        flush()
+        except QueryTimeout:
+            if not count:
+                self._drop(result_id)
+                raise
+            truncated = True
+        except Exception:
+            self._drop(result_id)
+            raise
+        flush()
+        columns = _columns(names, types)
+        with self._lock:
+            self.conn.execute(
+                "UPDATE results SET columns = ?, row_count = ?, truncated = ?, bytes = ? WHERE id = ?",
+                (json.dumps(columns), count, truncated, size, result_id)
+            )
+        self._evict(keep=result_id)
+        return {"id": result_id, "columns": columns, "row_count": count, "truncated": truncated}
+
+    def _drop(self, result_id: int):
+        with self._lock:
+            self.conn.execute("DELETE FROM rows WHERE result_id = ?", (result_id,))
+            self.conn.execute("DELETE FROM results WHERE id = ?", (result_id,))
+
+    def _evict(self, keep: int):
+        """Drop least recently used results until the store fits ``max_stored_bytes``"""
+        while True:
+            with self._lock:
+                total = self.conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM results").fetchone()[0]
+                oldest = self.conn.execute(
+                    "SELECT id FROM results WHERE id != ? AND bytes IS NOT NULL ORDER BY last_used LIMIT 1", (keep,)
+                ).fetchone()
+            if total <= self.max_stored_bytes or oldest is None:
+                return
+            self._drop(oldest[0])
+
+    def _result(self, sql: str, key: Optional[Tuple[str, str]]) -> Tuple[Dict[str, Any], Tuple[str, str], Optional[int]]:
+        """Stored result of ``sql`` at the current data version, built if needed"""
+        with get_pool(self.db_path).snapshot() as (conn, tip_height):
+            current = get_result_cache(self.db_path).key(conn, sql, tip_height)
+            if key is not None and tuple(key) != current:
+                raise StaleCursor("The data changed since this cursor was issued; run the query again")
+            meta = self._lookup(current)
+            if meta is None:
+                # One build per result even when its first pages race
+                with self._building_lock:
+                    lock = self._building.setdefault(current, threading.Lock())
+                with lock:
+                    meta = self._lookup(current) or self._materialize(conn, sql, current)
+                with self._building_lock:
+                    self._building.pop(current, None)
+        return meta, current, tip_height
+
+    def page(self, sql: str, after: int = 0, limit: int = PAGE_SIZE,
+             key: Optional[Tuple[str, str]] = None) -> Dict[str, Any]:
+        """The rows of ``sql``'s result after row ``after`` (0 for the first page).
+
+        ``key`` is the data version a cursor was issued for; StaleCursor is
+        raised if it is no longer current. Rows are returned as JSON text,
+        ready for ``render_page``.
+
+        Returns:
+            Dict with columns ({name, type}), rows, row_count (the whole
+            result), truncated, tip_height, cursor (this page) and
+            next_cursor (None on the last page)
+        """
+        meta, current, tip_height = self._result(sql, key)
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        rows, size = [], 0
+        with self._lock:
+            for (text,) in self.conn.execute(
+                "SELECT row FROM rows WHERE result_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (meta["id"], after, limit)
+            ):
+                rows.append(text)
+                size += len(text)
+                if size >= MAX_PAGE_BYTES:
+                    break
+        last = after + len(rows)
+        return {
+            "columns": meta["columns"],
+            "rows": rows,
+            "row_count": meta["row_count"],
+            "truncated": meta["truncated"],
+            "tip_height": tip_height,
+            "cursor": encode_cursor(sql, current, after, self.secret),
+            "next_cursor": encode_cursor(sql, current, last, self.secret) if last < meta["row_count"] else None,
+        }
+
+    def decode_cursor(self, cursor: str) -> Tuple[str, Tuple[str, str], int]:
+        """(sql, key, after) of a cursor this store (or one sharing its secret) issued"""
+        return decode_cursor(cursor, self.secret)
+
+    def version(self, sql: str) -> Tuple[str, str]:
+        """Current result-cache key of ``sql``"""
+        with get_pool(self.db_path).snapshot() as (conn, tip_height):
+            return get_result_cache(self.db_path).key(conn, sql, tip_height)
+
+    def stream(self, sql: str, key: Optional[Tuple[str, str]] = None) -> Iterator[str]:
+        """NDJSON chunks of ``sql``'s whole result, straight from a snapshot.
+
+        The first line has the columns (typed from the first batch) and
+        tip_height, then one JSON array per row, then a summary line with
+        row_count and error. Nothing is materialized, so memory stays at one
+        batch. The snapshot is on a connection of its own, not a pooled one,
+        so slow downloads never hold up other queries; at most
+        ``max_streams`` run at once. The connection is closed when the
+        stream ends or the generator is closed (e.g. on a client
+        disconnect); its time budget counts from the start of the stream.
+        """
+        if not self._streams.acquire(blocking=False):
+            yield json.dumps({"error": f"{self.max_streams} result streams are already running; "
+                                       "try again shortly or page through the result"}) + "\n"
+            return
+        try:
+            count, error = 0, None
+            with get_pool(self.db_path).dedicated_snapshot() as (conn, tip_height):
+                if key is not None and tuple(key) != get_result_cache(self.db_path).key(conn, sql, tip_height):
+                    yield json.dumps({"error": "The data changed since this cursor was issued; run the query again"}) + "\n"
+                    return
+                try:
+                    with guarded_cursor(conn, sql, time_budget=STREAM_TIME_BUDGET) as cursor:
+                        names = [d[0] for d in cursor.description or []]
+                        batch = cursor.fetchmany(STREAM_BATCH)
+                        types = ["null"] * len(names)
+                        for row in batch:
+                            merge_types(types, row)
+                        yield json.dumps({"columns": _columns(names, types), "tip_height": tip_height}) + "\n"
+                        while batch:
+                            count += len(batch)
+                            yield "".join(encode_row(row) + "\n" for row in batch)
+                            batch = cursor.fetchmany(STREAM_BATCH)
+                except sqlite3.Error as e:
+                    error = str(e)
+            yield json.dumps({"row_count": count, "error": error}) + "\n"
+        finally:
+            self._streams.release()
+
+def render_page(page: Dict[str, Any], **fields) -> str:
+    """JSON body for a page; the stored row JSON is spliced in, not re-encoded"""
+    head = {key: value for key, value in page.items() if key != "rows"}
+    head.update(fields)
+    return json.dumps(head)[:-1] + ', "rows": [' + ",".join(page["rows"]) + "]}"
+
+_stores: Dict[str, ResultPages] = {}
+_stores_lock = threading.Lock()
+
+def get_result_pages(db_path: str, secret: Optional[bytes] = None) -> ResultPages:
+    """Return the container-wide page store for ``db_path``"""
+    with _stores_lock:
+        if db_path not in _stores:
+            _stores[db_path] = ResultPages(db_path, secret)
+        return _stores[db_path]
@@ -0,0 +1,106 @@
+import re
+from typing import Dict, List, Optional, Set
+
+# What each known column holds, in the words questions use for it
+COLUMN_DESCRIPTIONS = {
+    "id": "row id",
+    "hash": "hash identifier id",
+    "confirmations": "confirmations depth deep",
+    "height": "height number position first last latest earliest range",
+    "version": "version signaling",
+    "versionhex": "version hex bits signaling",
+    "merkleroot": "merkle root",
+    "time": "time timestamp date day month year hour when mined unix epoch period",
+    "mediantime": "median time past timestamp mtp",
+    "nonce": "nonce",
+    "bits": "bits compact target",
+    "difficulty": "difficulty hard hardness target mining",
+    "chainwork": "chain work cumulative total work",
+    "ntx": "number transaction count tx",
+    "previousblockhash": "previous parent prior hash",
+    "nextblockhash": "next child following hash",
+    "strippedsize": "stripped size bytes witness segwit",
+    "size": "size bytes big large small",
+    "weight": "weight unit segwit",
+    "tx": "transaction json input output txid address fee value amount script",
+    "total_output_value": "total output value amount btc bitcoin sent",
+    "input_count": "input count number",
+    "output_count": "output count number",
+    "coinbase_value": "coinbase reward miner subsidy",
+    "total_fee": "fee total paid",
+}
+
+# Question words that say nothing about which columns are needed
+STOPWORDS = {
+    "what", "which", "who", "how", "many", "much", "is", "are", "was", "were", "the", "a",
+    "an", "of", "in", "on", "for", "to", "and", "or", "with", "by", "from", "at", "that",
+    "this", "there", "have", "has", "had", "do", "does", "did", "show", "list", "find",
+    "give", "me", "all", "each", "per", "between", "than", "more", "less", "it", "its",
+}
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def tokenize(text: str) -> Set[str]:
+    """Lowercase stemmed words; camelCase and snake_case names are split"""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text)
+    return {_stem(w) for w in re.findall(r"[a-z0-9]+", text.lower()) if w not in STOPWORDS}
+
+class SchemaRanker:
+    """Relevance ranking of tables and columns for a question.
+
+    Column descriptions (name parts plus ``COLUMN_DESCRIPTIONS``) are
+    tokenized once, when the ranker is built for a schema version. A
+    column scores 3 when the question names it and 1 per description word
+    the question uses; a table scores its best column plus 2 when named.
+    """
+    def __init__(self, info: Dict[str, Dict]):
+        self.info = info
+        self.names = {col: tokenize(col) | {col.lower()}
+                      for entry in info.values() for col, _ in entry["columns"]}
+        self.descriptions = {col: tokenize(COLUMN_DESCRIPTIONS.get(col.lower(), ""))
+                             for col in self.names}
+        # Views have no indexes of their own; their key columns are the tables'
+        table_keys = set().union(*(e["keys"] for e in info.values() if e["type"] == "table"))
+        self.keys = {name: entry["keys"] | (table_keys if entry["type"] == "view" else set())
+                     for name, entry in info.items()}
+
+    def column_scores(self, words: Set[str]) -> Dict[str, int]:
+        return {col: (3 if names & words else 0) + len(self.descriptions[col] & words)
+                for col, names in self.names.items()}
+
+    def select(self, question: str, max_tables: int = 2) -> Optional[Dict[str, List[str]]]:
+        """Columns to show per table, or None when nothing in the question matched.
+
+        Up to ``max_tables`` of the best tables are kept, each with its key
+        (primary key and indexed) columns and every column that scored.
+        """
+        words = tokenize(question)
+        scores = self.column_scores(words)
+        if not any(scores.values()):
+            return None  # No evidence: the full schema is the safe choice
+
+        ranked = []
+        for name, entry in self.info.items():
+            best = max((scores[col] for col, _ in entry["columns"]), default=0)
+            named = 2 if tokenize(name) & words else 0
+            if best:
+                # Views first on ties: they are what questions are written against
+                ranked.append((best + named, entry["type"] == "view", name))
+        ranked.sort(reverse=True)
+
+        keep = {}
+        for _, _, name in ranked:
+            columns = [col for col, _ in self.info[name]["columns"]
+                       if scores[col] or col in self.keys[name]]
+            # A table whose relevant columns a kept view already shows adds nothing
+            if any(set(columns) <= set(kept) for kept in keep.values()):
+                continue
+            keep[name] = columns
+            if len(keep) == max_tables:
+                break
+        return keep
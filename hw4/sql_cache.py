@@ -0,0 +1,278 @@
+import os
+import re
+import math
+import time
+import uuid
+import atexit
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Optional, Set, Tuple
+
+SQL_CACHE_DIR = "/data/qa_cache"
+COMMIT_INTERVAL = 10.0   # seconds between background volume commits
+
+# Literals and words that change a question's meaning however similar the
+# rest is ("block 100" vs "block 200", "above" vs "below"): fuzzy hits
+# require these to match exactly.
+LITERAL_RE = re.compile(r"\b(?:[0-9a-f]{16,}|\d+(?:\.\d+)?)\b")
+CONTRAST_WORDS = frozenset("""
+    above below over under before after since until earlier later more less fewer
+    greater smaller larger bigger most least highest lowest largest smallest biggest
+    min max minimum maximum first last oldest newest earliest latest top bottom
+    ascending descending asc desc increasing decreasing not without except
+""".split())
+
+def normalize_question(question: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    question = re.sub(r"[^\w\s.]", " ", question.lower())
+    question = re.sub(r"(?<!\d)\.|\.(?!\d)", " ", question)  # Keep decimal points
+    return " ".join(question.split())
+
+def shingles(normalized: str, n: int = 3) -> Counter:
+    """Word tokens plus character n-grams of each word"""
+    grams = Counter()
+    for word in normalized.split():
+        grams["w:" + word] += 1
+        padded = f" {word} "
+        for i in range(max(1, len(padded) - n + 1)):
+            grams[padded[i:i + n]] += 1
+    return grams
+
+def literals(normalized: str) -> Set[str]:
+    """Numbers, hashes and direction/comparison words of a question"""
+    return set(LITERAL_RE.findall(normalized)) | (CONTRAST_WORDS & set(normalized.split()))
+
+class QuestionSQLCache:
+    """Persistent cache from question text to generated SQL.
+
+    Exact hits are a dict lookup on the normalized question. Otherwise the
+    closest cached question by TF-IDF cosine over word and character
+    shingles is used if it scores at least ``threshold`` and contains the
+    same numbers, hashes and comparison words. Entries expire after ``ttl``
+    seconds, the least recently used are evicted beyond ``max_entries``, and
+    everything is dropped when the schema key changes.
+
+    Each instance writes only its own SQLite file in ``directory`` (like the
+    history log's segments), so concurrent containers never write the same
+    file. ``commit`` (e.g. ``volume.commit``) is kept off the request path
+    like the history log's: a store only marks the cache dirty, and a
+    background thread commits every ``commit_interval`` seconds if it is,
+    as does ``close`` (also run at interpreter exit). At start the files of
+    earlier containers are read too, and files untouched for longer than
+    ``ttl`` are removed.
+    """
+    def __init__(self, directory: str = SQL_CACHE_DIR, commit: Optional[Callable[[], None]] = None,
+                 threshold: float = 0.85, ttl: float = 7 * 86400, max_entries: int = 5000,
+                 commit_interval: float = COMMIT_INTERVAL):
+        os.makedirs(directory, exist_ok=True)
+        self.commit = commit
+        self.commit_interval = commit_interval
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+        self._registered = False
+        self.path = os.path.join(directory, f"sql_cache_{uuid.uuid4().hex[:8]}.db")
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sql_cache (
+                question TEXT PRIMARY KEY,
+                sql TEXT NOT NULL,
+                schema_key TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+        # In-memory indexes over the persisted entries
+        self._sql: Dict[str, Tuple[str, str, float]] = {}
+        self._grams: Dict[str, Counter] = {}
+        self._postings = defaultdict(set)
+        self._df = Counter()
+        self._vectors: Dict[str, Tuple[Dict[str, float], float]] = {}  # Reset when idf changes
+        self._last_used: Dict[str, float] = {}
+        self._load(directory)
+
+    def _load(self, directory: str):
+        """Index the entries other containers stored, newest entry per question"""
+        now = time.time()
+        entries: Dict[str, Tuple[str, str, float, float]] = {}
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if not (name.startswith("sql_cache") and name.endswith(".db")) or path == self.path:
+                continue
+            if now - os.path.getmtime(path) > self.ttl:
+                os.remove(path)  # Every entry in it has expired
+                continue
+            try:
+                conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+                try:
+                    rows = conn.execute(
+                        "SELECT question, sql, schema_key, created, last_used FROM sql_cache"
+                    ).fetchall()
+                finally:
+                    conn.close()
+            except sqlite3.Error:  # Another container's file mid-write
+                continue
+            for question, sql, schema_key, created, last_used in rows:
+                if now - created <= self.ttl and created > entries.get(question, ("", "", 0.0, 0.0))[2]:
+                    entries[question] = (sql, schema_key, created, last_used)
+        recent = sorted(entries.items(), key=lambda e: e[1][3])[-self.max_entries:]
+        for question, (sql, schema_key, created, last_used) in recent:
+            self._index(question, sql, schema_key, created, last_used)
+
+    def _index(self, question: str, sql: str, schema_key: str, created: float, last_used: float):
+        self._vectors.clear()
+        self._sql[question] = (sql, schema_key, created)
+        self._last_used[question] = last_used
+        grams = shingles(question)
+        self._grams[question] = grams
+        for gram in grams:
+            self._postings[gram].add(question)
+            self._df[gram] += 1
+
+    def _unindex(self, question: str):
+        self._vectors.clear()
+        self._sql.pop(question, None)
+        self._last_used.pop(question, None)
+        for gram in self._grams.pop(question, ()):
+            self._postings[gram].discard(question)
+            self._df[gram] -= 1
+            if not self._df[gram]:
+                del self._df[gram], self._postings[gram]
+
+    def _delete(self, questions):
+        for question in questions:
+            self._unindex(question)
+        self.conn.executemany("DELETE FROM sql_cache WHERE question = ?",
+                              [(q,) for q in questions])
+
+    def _vector(self, grams: Counter) -> Tuple[Dict[str, float], float]:
+        n = len(self._sql) + 1
+        weights = {g: c * (math.log(n / (1 + self._df.get(g, 0))) + 1) for g, c in grams.items()}
+        return weights, math.sqrt(sum(w * w for w in weights.values())) or 1.0
+
+    def _nearest(self, normalized: str, rare: int = 8) -> Tuple[Optional[str], float]:
+        grams = shingles(normalized)
+        query, query_norm = self._vector(grams)
+        # A close match must share the query's rarest shingles, so only
+        # their postings are scored (common ones would pull in every entry)
+        candidates = set()
+        for gram in sorted(grams, key=lambda g: self._df.get(g, 0))[:rare]:
+            candidates |= self._postings.get(gram, set())
+
+        best, best_score = None, 0.0
+        for candidate in candidates:
+            if candidate not in self._vectors:
+                self._vectors[candidate] = self._vector(self._grams[candidate])
+            weights, norm = self._vectors[candidate]
+            dot = sum(w * weights[g] for g, w in query.items() if g in weights)
+            score = dot / (query_norm * norm)
+            if score > best_score:
+                best, best_score = candidate, score
+        return best, best_score
+
+    def _check_schema(self, schema_key: str):
+        stale = [q for q, (_, key, _) in self._sql.items() if key != schema_key]
+        if stale:
+            self._delete(stale)
+            self.conn.commit()
+
+    def lookup(self, question: str, schema_key: str) -> Tuple[Optional[str], Optional[str]]:
+        """Return (sql, "exact" | "fuzzy") on a hit, (None, None) on a miss"""
+        normalized = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            self._check_schema(schema_key)
+            kind = "exact"
+            match = normalized if normalized in self._sql else None
+            if match is None:
+                kind = "fuzzy"
+                match, score = self._nearest(normalized)
+                if match is not None and (score < self.threshold
+                                          or literals(match) != literals(normalized)):
+                    match = None
+            if match is not None and now - self._sql[match][2] > self.ttl:
+                self._delete([match])
+                self.conn.commit()
+                match = None
+            if match is None:
+                self.misses += 1
+                return None, None
+
+            self.hits += 1
+            if kind == "fuzzy":
+                self.fuzzy_hits += 1
+            self._last_used[match] = now
+            self.conn.execute("UPDATE sql_cache SET last_used = ? WHERE question = ?", (now, match))
+            self.conn.commit()
+            return self._sql[match][0], kind
+
+    def store(self, question: str, sql: str, schema_key: str):
+        """Cache SQL that executed successfully for ``question``"""
+        normalized = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            self._unindex(normalized)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sql_cache VALUES (?, ?, ?, ?, ?)",
+                (normalized, sql, schema_key, now, now)
+            )
+            self._index(normalized, sql, schema_key, now, now)
+            overflow = len(self._sql) - self.max_entries
+            if overflow > 0:
+                # In memory: entries loaded from other files are not in ours
+                self._delete(sorted(self._last_used, key=self._last_used.get)[:overflow])
+            self.conn.commit()
+            if self.commit is not None:
+                self._dirty = True
+                if self._thread is None or self._closed:
+                    self._closed = False
+                    self._thread = threading.Thread(target=self._run, daemon=True)
+                    self._thread.start()
+                    if not self._registered:
+                        atexit.register(self.close)
+                        self._registered = True
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.commit_interval)
+            self.flush()
+
+    def flush(self):
+        """Commit the volume if entries were stored since the last commit"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, False
+        if dirty and self.commit is not None:
+            self.commit()
+
+    def close(self):
+        """Stop the background commits and commit what is pending"""
+        self._closed = True
+        self._wake.set()
+        self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._sql), "hits": self.hits,
+                "fuzzy_hits": self.fuzzy_hits, "misses": self.misses}
+
+_cache: Optional[QuestionSQLCache] = None
+_cache_lock = threading.Lock()
+
+def get_sql_cache(directory: str = SQL_CACHE_DIR,
+                  commit: Optional[Callable[[], None]] = None) -> QuestionSQLCache:
+    """Return the container-wide question-to-SQL cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = QuestionSQLCache(directory, commit)
+        return _cache
@@ -0,0 +1,102 @@
+import time
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, ContextManager, Dict, List, Optional
+
+from query_planner import review_sql
+from result_cache import normalize_sql
+
+# (temperature, extra instruction) per candidate, cycled when K is larger
+CANDIDATE_VARIANTS = [
+    (0.0, ""),
+    (0.4, "Prefer filters on the indexed height, time and hash columns and window "
+          "functions over correlated subqueries."),
+    (0.8, "Consider NULLs, ties and empty results before writing the query."),
+]
+GENERATION_TIMEOUT = 20.0      # seconds to wait for the K LLM calls
+LATENCY_BUDGET = 30.0          # seconds from question to answer, generation included
+
+def candidate_messages(messages: List[Dict[str, str]], hint: str) -> List[Dict[str, str]]:
+    """Copy of ``messages`` with ``hint`` appended to the last user message"""
+    if not hint:
+        return messages
+    *head, last = messages
+    return head + [{**last, "content": f"{last['content']}\n\n{hint}"}]
+
+def generate_candidates(complete: Callable[[List[Dict[str, str]], float], str],
+                        review_conn: Callable[[], ContextManager[sqlite3.Connection]],
+                        messages: List[Dict[str, str]], k: int,
+                        timeout: float = GENERATION_TIMEOUT) -> List[Dict[str, object]]:
+    """Request ``k`` SQL candidates concurrently and validate each on arrival.
+
+    Every worker asks the LLM with its own temperature and instruction, then
+    prepares the answer with ``EXPLAIN QUERY PLAN`` through ``review_sql`` on
+    a connection of its own, so validation overlaps the slower LLM calls.
+    Candidates still outstanding after ``timeout`` are abandoned.
+
+    Args:
+        complete: Function (messages, temperature) -> SQL text
+        review_conn: Context manager factory lending a database connection
+        messages: Chat messages of the single-candidate prompt
+        k: Number of candidates
+        timeout: Seconds to wait for the LLM calls
+
+    Returns:
+        List[Dict]: One review per distinct candidate (sql, cost, plan,
+        rewrites, error, variant); valid ones first in ascending cost
+    """
+    def candidate(variant: int) -> Dict[str, object]:
+        temperature, hint = CANDIDATE_VARIANTS[variant % len(CANDIDATE_VARIANTS)]
+        sql = complete(candidate_messages(messages, hint), temperature)
+        with review_conn() as conn:
+            review = review_sql(conn, sql)
+        review["variant"] = variant
+        return review
+
+    executor = ThreadPoolExecutor(max_workers=k)
+    futures = [executor.submit(candidate, i) for i in range(k)]
+    done, _ = wait(futures, timeout=timeout)
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    reviews, seen = [], set()
+    for future in futures:
+        if future not in done or future.exception() is not None:
+            continue
+        review = future.result()
+        fingerprint = normalize_sql(review["sql"])
+        if fingerprint not in seen:
+            seen.add(fingerprint)
+            reviews.append(review)
+    # Valid candidates by estimated cost, then the failures (kept for their errors)
+    reviews.sort(key=lambda r: (r["error"] is not None, r["cost"] or 0, r["variant"]))
+    return reviews
+
+def first_success(candidates: List[str],
+                  execute: Callable[[str, Optional[float]], Dict[str, object]],
+                  deadline: Optional[float] = None) -> Dict[str, object]:
+    """Execute ``candidates`` in order and return the first outcome without error.
+
+    Each execution gets the time left before ``deadline`` (monotonic clock)
+    as its budget; once it has passed, the last error is returned.
+
+    Args:
+        candidates: SQL statements, cheapest first
+        execute: Function (sql, time_budget or None) -> outcome dict with error
+        deadline: time.monotonic() value by which an answer is due
+
+    Returns:
+        Dict: The winning (or last) outcome, with sql and attempts added
+    """
+    outcome = {"error": "No SQL candidate was generated", "sql": None}
+    for attempt, sql in enumerate(candidates, 1):
+        budget = None
+        if deadline is not None:
+            budget = deadline - time.monotonic()
+            if budget <= 0:
+                if outcome["sql"] is None:
+                    outcome = {"error": "Latency budget exhausted", "sql": sql, "attempts": 0}
+                break
+        outcome = {**execute(sql, budget), "sql": sql, "attempts": attempt}
+        if outcome["error"] is None:
+            break
+    return outcome
@@ -0,0 +1,291 @@
+import json
+import math
+import hashlib
+import sqlite3
+import functools
+from typing import Any, List, Optional
+
+# Difficulty-1 target (bits 0x1d00ffff)
+DIFF1_TARGET = 0xFFFF << 208
+HALVING_INTERVAL = 210000
+INITIAL_SUBSIDY = 50 * 10**8  # satoshis
+MASK64 = (1 << 64) - 1
+
+# Appended to the QA system prompt so the LLM uses the functions
+FUNCTION_DOCS = """Extra SQL functions available on this database:
+- median(x), percentile(x, p) with p in 0..100, stddev(x) (sample): aggregates, also usable as window functions
+- approx_count_distinct(x): fast approximate COUNT(DISTINCT x)
+- bits_to_target(bits) -> 64-char hex target; bits_to_difficulty(bits); target_to_difficulty(hex_target)
+- subsidy_at(height) -> block subsidy in BTC at that height
+- hash_hex(h) / hash_blob(hex): convert between hex hashes and 32-byte BLOBs; reverse_hash(hex) flips byte order
+- leading_zero_bits(hash): number of leading zero bits of a hash
+- tx_output_value(tx), tx_input_count(tx), tx_output_count(tx), tx_coinbase_value(tx), tx_total_fee(tx):
+  summaries of a block's tx JSON (BTC values); where block has the matching stored
+  columns (total_output_value, input_count, output_count, coinbase_value, total_fee) use those
+Prefer these over hand-written LIMIT/OFFSET medians, CASE subsidy tables or nested subqueries."""
+
+def _mix64(value: int) -> int:
+    """splitmix64 finalizer; spreads Python's hash() over 64 bits"""
+    value = (value + 0x9E3779B97F4A7C15) & MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK64
+    return value ^ (value >> 31)
+
+def _interpolate(ordered: List[float], fraction: float) -> Optional[float]:
+    if not ordered:
+        return None
+    position = fraction * (len(ordered) - 1)
+    lower = math.floor(position)
+    if position == lower:
+        return ordered[lower]
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+class Median:
+    """median(x): middle value, mean of the two middle values for even counts"""
+    def __init__(self):
+        self.values = []
+
+    def step(self, value):
+        if value is not None:
+            self.values.append(value)
+
+    def inverse(self, value):
+        if value is not None:
+            self.values.remove(value)
+
+    def value(self):
+        return _interpolate(sorted(self.values), 0.5)
+
+    def finalize(self):
+        return self.value()
+
+class Percentile(Median):
+    """percentile(x, p): linear interpolation at p percent (0..100)"""
+    def __init__(self):
+        super().__init__()
+        self.p = None
+
+    def step(self, value, p):
+        self.p = p
+        super().step(value)
+
+    def inverse(self, value, p):
+        super().inverse(value)
+
+    def value(self):
+        if self.p is None or not 0 <= self.p <= 100:
+            return None
+        return _interpolate(sorted(self.values), self.p / 100)
+
+class StdDev:
+    """stddev(x): sample standard deviation (Welford, reversible for windows)"""
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def step(self, value):
+        if value is None:
+            return
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    def inverse(self, value):
+        if value is None:
+            return
+        self.n -= 1
+        if self.n == 0:
+            self.mean = self.m2 = 0.0
+            return
+        delta = value - self.mean
+        self.mean -= delta / self.n
+        self.m2 -= delta * (value - self.mean)
+
+    def value(self):
+        if self.n < 2:
+            return None
+        return math.sqrt(max(self.m2, 0.0) / (self.n - 1))
+
+    def finalize(self):
+        return self.value()
+
+class ApproxCountDistinct:
+    """approx_count_distinct(x): HyperLogLog with 4096 registers (~1.6% error)"""
+    P = 12
+    M = 1 << P
+
+    def __init__(self):
+        self.registers = bytearray(self.M)
+
+    def step(self, value):
+        if value is None:
+            return
+        if isinstance(value, (str, bytes)):
+            # hash() of str/bytes is randomized per process; estimates must
+            # agree across containers (result cache, test comparisons)
+            data, kind = (value.encode("utf-8", "surrogatepass"), b"text") if isinstance(value, str) else (value, b"blob")
+            h = int.from_bytes(hashlib.blake2b(data, digest_size=8, person=kind).digest(), "little")
+        else:
+            h = _mix64(hash(value) & MASK64)  # Numeric hashes are stable (and 1 == 1.0)
+        index = h >> (64 - self.P)
+        rest = (h << self.P) & MASK64
+        rank = 64 - self.P + 1 if rest == 0 else (64 - rest.bit_length()) + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def finalize(self):
+        m = self.M
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # Small-range correction
+        return int(round(estimate))
+
+def _bits_int(bits) -> Optional[int]:
+    if bits is None:
+        return None
+    return int(bits, 16) if isinstance(bits, str) else int(bits)
+
+def _target_int(target) -> Optional[int]:
+    if target is None:
+        return None
+    if isinstance(target, bytes):
+        return int.from_bytes(target, "big")
+    return int(target, 16) if isinstance(target, str) else int(target)
+
+def bits_to_target(bits) -> Optional[str]:
+    """Expand compact ``bits`` (hex text or integer) to a 64-char hex target"""
+    compact = _bits_int(bits)
+    if compact is None:
+        return None
+    exponent, mantissa = compact >> 24, compact & 0x007FFFFF
+    if exponent <= 3:
+        target = mantissa >> (8 * (3 - exponent))
+    else:
+        target = mantissa << (8 * (exponent - 3))
+    return f"{target:064x}"
+
+def target_to_difficulty(target) -> Optional[float]:
+    value = _target_int(target)
+    if not value:
+        return None
+    return DIFF1_TARGET / value
+
+def bits_to_difficulty(bits) -> Optional[float]:
+    return target_to_difficulty(bits_to_target(bits))
+
+def subsidy_at(height) -> Optional[float]:
+    """Block subsidy in BTC at ``height``"""
+    if height is None:
+        return None
+    halvings = int(height) // HALVING_INTERVAL
+    return (INITIAL_SUBSIDY >> halvings) / 10**8 if halvings < 64 else 0.0
+
+def hash_hex(value) -> Optional[str]:
+    if isinstance(value, bytes):
+        return value.hex()
+    return value
+
+def hash_blob(value) -> Optional[bytes]:
+    if isinstance(value, str):
+        return bytes.fromhex(value)
+    return value
+
+def reverse_hash(value) -> Optional[str]:
+    if value is None:
+        return None
+    return hash_blob(value)[::-1].hex()
+
+def leading_zero_bits(value) -> Optional[int]:
+    if value is None:
+        return None
+    raw = hash_blob(value)
+    number = int.from_bytes(raw, "big")
+    return len(raw) * 8 - number.bit_length()
+
+@functools.lru_cache(maxsize=4)
+def _parse_tx(tx: str) -> Any:
+    # The tx_* functions are often called back to back on the same row
+    # (one per summary in a query), so each blob is parsed once
+    return json.loads(tx)
+
+def _txs(tx) -> List[dict]:
+    if tx is None:
+        return []
+    parsed = _parse_tx(tx)
+    return parsed if isinstance(parsed, list) else []
+
+def tx_output_value(tx) -> Optional[float]:
+    """Total value (BTC) of every output in the block"""
+    if tx is None:
+        return None
+    return round(sum(out.get("value") or 0 for t in _txs(tx) for out in t.get("vout", [])), 8)
+
+def tx_input_count(tx) -> Optional[int]:
+    if tx is None:
+        return None
+    return sum(len(t.get("vin", [])) for t in _txs(tx))
+
+def tx_output_count(tx) -> Optional[int]:
+    if tx is None:
+        return None
+    return sum(len(t.get("vout", [])) for t in _txs(tx))
+
+def tx_coinbase_value(tx) -> Optional[float]:
+    """Output value (BTC) of the coinbase transaction: subsidy plus fees"""
+    txs = _txs(tx)
+    if not txs or not any("coinbase" in vin for vin in txs[0].get("vin", [])):
+        return None
+    return round(sum(out.get("value") or 0 for out in txs[0].get("vout", [])), 8)
+
+def tx_total_fee(tx) -> Optional[float]:
+    """Sum of the per-transaction ``fee`` fields, NULL if none are present"""
+    fees = [t["fee"] for t in _txs(tx) if t.get("fee") is not None]
+    return round(sum(fees), 8) if fees else None
+
+SCALAR_FUNCTIONS = [
+    ("bits_to_target", 1, bits_to_target),
+    ("bits_to_difficulty", 1, bits_to_difficulty),
+    ("target_to_difficulty", 1, target_to_difficulty),
+    ("subsidy_at", 1, subsidy_at),
+    ("hash_hex", 1, hash_hex),
+    ("hash_blob", 1, hash_blob),
+    ("reverse_hash", 1, reverse_hash),
+    ("leading_zero_bits", 1, leading_zero_bits),
+    ("tx_output_value", 1, tx_output_value),
+    ("tx_input_count", 1, tx_input_count),
+    ("tx_output_count", 1, tx_output_count),
+    ("tx_coinbase_value", 1, tx_coinbase_value),
+    ("tx_total_fee", 1, tx_total_fee),
+]
+
+WINDOW_FUNCTIONS = [
+    ("median", 1, Median),
+    ("percentile", 2, Percentile),
+    ("stddev", 1, StdDev),
+]
+
+AGGREGATE_FUNCTIONS = [
+    ("approx_count_distinct", 1, ApproxCountDistinct),
+]
+
+def register_functions(conn: sqlite3.Connection) -> sqlite3.Connection:
+    """Register the analytic and block helper functions on ``conn``.
+
+    Window-capable aggregates are registered as window functions where the
+    Python build supports it (3.11+), otherwise as plain aggregates.
+    """
+    for name, n_args, func in SCALAR_FUNCTIONS:
+        conn.create_function(name, n_args, func, deterministic=True)
+    for name, n_args, cls in WINDOW_FUNCTIONS:
+        if hasattr(conn, "create_window_function"):
+            conn.create_window_function(name, n_args, cls)
+        else:
+            conn.create_aggregate(name, n_args, cls)
+    for name, n_args, cls in AGGREGATE_FUNCTIONS:
+        conn.create_aggregate(name, n_args, cls)
+    return conn
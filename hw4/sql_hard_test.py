@@ -2,108 +2,15 @@ import modal
 import sqlite3
 import os
 from openai import OpenAI
-from datetime import datetime
+
+from sql_functions import register_functions
+from qa_history import get_history_log, result_summary
+from result_compare import compare_queries
+from sql_test_cases import extra_hard_test_cases as hard_test_cases
 
 app = modal.App("bitcoin-sql-qa")
 volume = modal.Volume.from_name("chongchen-bitcoin-data", create_if_missing=True)
-image = modal.Image.debian_slim().pip_install("openai")
-
-hard_test_cases = [
-    {
-        "question": "What is the median nonce value for blocks mined in February 2013?",
-        "expected_sql": """
-            SELECT AVG(nonce) 
-            FROM (
-                SELECT nonce 
-                FROM block 
-                WHERE strftime('%Y-%m', datetime(time, 'unixepoch')) = '2013-02' 
-                ORDER BY nonce 
-                LIMIT 2 - (
-                    SELECT COUNT(*) 
-                    FROM block 
-                    WHERE strftime('%Y-%m', datetime(time, 'unixepoch')) = '2013-02'
-                ) % 2 
-                OFFSET (
-                    SELECT COUNT(*) 
-                    FROM block 
-                    WHERE strftime('%Y-%m', datetime(time, 'unixepoch')) = '2013-02'
-                ) / 2
-            );
-        """
-    },
-    {
-        "question": "Analyze the 'fee market' development by calculating the implicit fee per transaction in satoshis for each block from 150000 to 160000. For this, estimate the mining reward by using the formula: (block_reward_bitcoins * 10^8 + (block_size - 80) * 10). Then calculate fee = (reward - expected_subsidy) / ntx where expected_subsidy is 50 BTC per block multiplied by 10^8 to convert to satoshis. Show the top 10 blocks with highest average fee per transaction, including block height, time (formatted as date), number of transactions, and average fee per transaction.",
-        "expected_sql": """
-            WITH block_rewards AS (
-                SELECT
-                    height,
-                    hash,
-                    ntx,
-                    size,
-                    datetime(time, 'unixepoch') AS block_date,
-                    (size - 80) * 10 AS size_reward_satoshis,
-                    CASE
-                        WHEN height < 210000 THEN 5000000000 -- 50 BTC in satoshis
-                        WHEN height < 420000 THEN 2500000000 -- 25 BTC in satoshis
-                        WHEN height < 630000 THEN 1250000000 -- 12.5 BTC in satoshis
-                        ELSE 625000000 -- 6.25 BTC in satoshis
-                    END AS block_subsidy_satoshis
-                FROM block
-                WHERE height BETWEEN 150000 AND 160000 AND ntx > 1
-            )
-            SELECT
-                height,
-                hash,
-                block_date,
-                ntx,
-                size,
-                block_subsidy_satoshis,
-                size_reward_satoshis,
-                CASE
-                    WHEN ntx > 1 THEN ROUND((size_reward_satoshis - block_subsidy_satoshis) / (ntx - 1), 2)
-                    ELSE 0
-                END AS avg_fee_per_tx_satoshis
-            FROM block_rewards
-            ORDER BY avg_fee_per_tx_satoshis DESC
-            LIMIT 10;
-        """
-    },
-    {
-        "question": "Calculate the mining difficulty adjustment pattern by finding the percentage change in difficulty between each difficulty adjustment period (every 2016 blocks) from block 50000 to 100000. Show the starting block of each period, the average block time in minutes for that period, and the percentage difficulty change.",
-        "expected_sql": """
-            WITH adjustment_periods AS (
-                SELECT 
-                    height, 
-                    difficulty,
-                    time,
-                    height / 2016 AS period_number
-                FROM block 
-                WHERE height BETWEEN 50000 AND 100000
-            ),
-            period_stats AS (
-                SELECT 
-                    period_number,
-                    MIN(height) AS start_block,
-                    MAX(difficulty) AS difficulty,
-                    (MAX(time) - MIN(time)) / (COUNT(*) - 1) / 60.0 AS avg_block_time_minutes,
-                    LAG(MAX(difficulty)) OVER (ORDER BY period_number) AS prev_difficulty
-                FROM adjustment_periods
-                GROUP BY period_number
-            )
-            SELECT 
-                start_block,
-                avg_block_time_minutes,
-                difficulty,
-                prev_difficulty,
-                CASE
-                    WHEN prev_difficulty IS NULL THEN NULL
-                    ELSE ROUND((difficulty - prev_difficulty) / prev_difficulty * 100, 2)
-                END AS difficulty_change_percent
-            FROM period_stats
-            ORDER BY start_block;
-        """
-    }
-]
+image = modal.Image.debian_slim().pip_install("openai").add_local_python_source("sql_functions", "qa_history", "query_guard", "result_compare", "sql_test_cases")
 
 SYSTEM_PROMPT = """
     You are a SQL developer that is expert in Bitcoin and you answer natural \
@@ -130,24 +37,11 @@ def execute_sql(conn, sql):
         return None, str(e)
 
 def log_qa_history(volume, question, sql, result, error):
-    """Log QA history to a file in the Modal Volume."""
-    log_dir = "/data/qa_history"
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir, exist_ok=True)
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_file = os.path.join(log_dir, f"{timestamp}.txt")
-    
-    log_content = f"Question: {question}\nGenerated SQL: {sql}\n"
-    if error:
-        log_content += f"Error: {error}\n"
-    else:
-        log_content += f"Result: {result}\n"
-    
-    with open(log_file, 'w') as f:
-        f.write(log_content)
-    
-    volume.commit()  # Persist changes to the volume
+    """Buffer a QA record for the history log; flushed and committed in the background."""
+    get_history_log(commit=volume.commit).append({
+        "kind": "qa", "question": question, "sql": sql, "error": error,
+        **result_summary(result)
+    })
 
 @app.function(
     image=image,
@@ -155,7 +49,7 @@ def log_qa_history(volume, question, sql, result, error):
     secrets=[modal.Secret.from_name("chongchen-llm-api-key")]
 )
 def answer_question(question: str, db_path: str):
-    conn = sqlite3.connect(db_path)
+    conn = register_functions(sqlite3.connect(db_path))
     schema = get_schema(conn)
     user_prompt = f"Database schema:\n{schema}\n\nQuestion: {question}"
     
@@ -186,15 +80,10 @@ def answer_question(question: str, db_path: str):
         "error": error
     }
 
-def log_test_result(test_type: str, content: str, filename: str):
-    log_dir = f"/data/sql_tests/{test_type}"
-    os.makedirs(log_dir, exist_ok=True)
-    # timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_file = os.path.join(log_dir, f"{filename}.txt")
-    
-    with open(log_file, 'w') as f:
-        f.write(content)
-    volume.commit()
+def log_test_result(test_type: str, test_id: int, **fields):
+    get_history_log(commit=volume.commit).append({
+        "kind": f"test_{test_type}", "test_id": test_id, **fields
+    })
 
 @app.function(
     image=image,
@@ -202,7 +91,7 @@ def log_test_result(test_type: str, content: str, filename: str):
     secrets=[modal.Secret.from_name("chongchen-llm-api-key")]
 )
 def test_hard_cases(db_path = "/data/bitcoin.db"):
-    conn = sqlite3.connect(db_path)
+    conn = register_functions(sqlite3.connect(db_path))
     for test_id, case in enumerate(hard_test_cases, start=1):
         question = case["question"]
         expected_sql = case["expected_sql"]
@@ -216,16 +105,11 @@ def test_hard_cases(db_path = "/data/bitcoin.db"):
         generated_answer = response["result"]
         error = response["error"]
         
-        # Build log content
-        log_content = (
-            f"Question: {question}\n"
-            f"Expected SQL: {expected_sql}\n"
-            f"Expected Answer: {expected_answer}\n"
-            f"Generated SQL: {generated_sql}\n"
-            f"Generated Answer: {generated_answer}\n"
+        log_test_result(
+            "hard", test_id, question=question, expected_sql=expected_sql,
+            expected=result_summary(expected_answer), sql=generated_sql,
+            **result_summary(generated_answer), error=error,
+            match=error is None and compare_queries(conn, expected_sql, generated_sql)["match"]
         )
-        if error:
-            log_content += f"Error: {error}\n"
-        
-        log_test_result("hard", log_content, f"test_{test_id}")
-    conn.close()
\ No newline at end of file
+    conn.close()
+    get_history_log(commit=volume.commit).flush(commit=True)
\ No newline at end of file
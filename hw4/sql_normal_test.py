@@ -4,68 +4,14 @@ import os
 from openai import OpenAI
 from datetime import datetime
 
+from sql_functions import register_functions
+from qa_history import get_history_log, result_summary
+from result_compare import compare_queries
+from sql_test_cases import extra_normal_test_cases as test_cases
+
 app = modal.App("bitcoin-sql-qa")
 volume = modal.Volume.from_name("chongchen-bitcoin-data", create_if_missing=True)
-image = modal.Image.debian_slim().pip_install("openai")
-
-test_cases = [
-    {
-        "question": "What is the hash of the genesis block (block at height 0)?",
-        "expected_sql": "SELECT hash FROM block WHERE height = 0;"
-    },
-    {
-        "question": "How many confirmations does block #100000 have?",
-        "expected_sql": "SELECT confirmations FROM block WHERE height = 100000;"
-    },
-    {
-        "question": "What is the average block size for blocks between height 50000 and 55000?",
-        "expected_sql": "SELECT AVG(size) FROM block WHERE height BETWEEN 50000 AND 55000;"
-    },
-    {
-        "question": "Which block has the highest difficulty between blocks 150000 and 160000?",
-        "expected_sql": "SELECT hash, height, difficulty FROM block WHERE height BETWEEN 150000 AND 160000 ORDER BY difficulty DESC LIMIT 1;"
-    },
-    {
-        "question": "How many transactions (ntx) were there in total across all blocks in the range 123000 to 123100?",
-        "expected_sql": "SELECT SUM(ntx) FROM block WHERE height BETWEEN 123000 AND 123100;"
-    },
-    {
-        "question": "What is the timestamp (time) of the latest block in the database?",
-        "expected_sql": "SELECT time, height FROM block ORDER BY height DESC LIMIT 1;"
-    },
-    {
-        "question": "Find the 5 blocks with the largest size difference compared to their previous block between heights 75000 and 80000.",
-        "expected_sql": "SELECT b.height, b.hash, b.size, p.size AS prev_size, (b.size - p.size) AS size_diff FROM block b JOIN block p ON b.previousblockhash = p.hash WHERE b.height BETWEEN 75000 AND 80000 ORDER BY ABS(b.size - p.size) DESC LIMIT 5;"
-    },
-    {
-        "question": "What was the average time (in seconds) between blocks from height 140000 to 140100?",
-        "expected_sql": "WITH block_times AS (SELECT height, time, LAG(time) OVER (ORDER BY height) AS prev_time FROM block WHERE height BETWEEN 140000 AND 140100) SELECT AVG(time - prev_time) FROM block_times WHERE prev_time IS NOT NULL;"
-    },
-    {
-        "question": "How many blocks have a nonce value greater than 3000000000 between heights 50000 and 60000?",
-        "expected_sql": "SELECT COUNT(*) FROM block WHERE height BETWEEN 50000 AND 60000 AND nonce > 3000000000;"
-    },
-    {
-        "question": "What is the distribution of block sizes by month in 2012? Show the month, average size, min size, and max size.",
-        "expected_sql": "SELECT strftime('%Y-%m', datetime(time, 'unixepoch')) AS month, AVG(size) AS avg_size, MIN(size) AS min_size, MAX(size) AS max_size FROM block WHERE strftime('%Y', datetime(time, 'unixepoch')) = '2012' GROUP BY month ORDER BY month;"
-    },
-    {
-        "question": "Find blocks where the difficulty increased by more than 10% compared to the previous block in the range 80000 to 90000.",
-        "expected_sql": "SELECT b.height, b.hash, b.difficulty, p.difficulty AS prev_difficulty, (b.difficulty - p.difficulty)/p.difficulty*100 AS difficulty_increase_pct FROM block b JOIN block p ON b.previousblockhash = p.hash WHERE b.height BETWEEN 80000 AND 90000 AND (b.difficulty - p.difficulty)/p.difficulty > 0.1 ORDER BY difficulty_increase_pct DESC;"
-    },
-    {
-        "question": "What is the correlation between block size and number of transactions (ntx) for blocks 100000 to 110000?",
-        "expected_sql": "SELECT (COUNT(*) * SUM(size * ntx) - SUM(size) * SUM(ntx)) / (SQRT(COUNT(*) * SUM(size * size) - SUM(size) * SUM(size)) * SQRT(COUNT(*) * SUM(ntx * ntx) - SUM(ntx) * SUM(ntx))) AS correlation FROM block WHERE height BETWEEN 100000 AND 110000;"
-    },
-    {
-        "question": "How has the average block size changed each year from 2009 to 2015?",
-        "expected_sql": "SELECT strftime('%Y', datetime(time, 'unixepoch')) AS year, AVG(size) AS avg_size FROM block WHERE strftime('%Y', datetime(time, 'unixepoch')) BETWEEN '2009' AND '2015' GROUP BY year ORDER BY year;"
-    },
-    {
-        "question": "Find the top 5 blocks with the most transactions (ntx) between height 160000 and 170000.",
-        "expected_sql": "SELECT height, hash, ntx FROM block WHERE height BETWEEN 160000 AND 170000 ORDER BY ntx DESC LIMIT 5;"
-    }
-]
+image = modal.Image.debian_slim().pip_install("openai").add_local_python_source("sql_functions", "qa_history", "query_guard", "result_compare", "sql_test_cases")
 
 SYSTEM_PROMPT = """
     You are a SQL developer that is expert in Bitcoin and you answer natural \
@@ -107,24 +53,11 @@ def format_result_for_markdown(result):
         return f"{str(result[:5])}... (showing 5 of {len(result)} rows)"
 
 def log_qa_history(volume, question, sql, result, error):
-    """Log QA history to a file in the Modal Volume."""
-    log_dir = "/data/qa_history"
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir, exist_ok=True)
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_file = os.path.join(log_dir, f"{timestamp}.txt")
-    
-    log_content = f"Question: {question}\nGenerated SQL: {sql}\n"
-    if error:
-        log_content += f"Error: {error}\n"
-    else:
-        log_content += f"Result: {result}\n"
-    
-    with open(log_file, 'w') as f:
-        f.write(log_content)
-    
-    volume.commit()  # Persist changes to the volume
+    """Buffer a QA record for the history log; flushed and committed in the background."""
+    get_history_log(commit=volume.commit).append({
+        "kind": "qa", "question": question, "sql": sql, "error": error,
+        **result_summary(result)
+    })
 
 @app.function(
     image=image,
@@ -132,7 +65,7 @@ def log_qa_history(volume, question, sql, result, error):
     secrets=[modal.Secret.from_name("chongchen-llm-api-key")]
 )
 def answer_question(question: str, db_path: str):
-    conn = sqlite3.connect(db_path)
+    conn = register_functions(sqlite3.connect(db_path))
     schema = get_schema(conn)
     user_prompt = f"Database schema:\n{schema}\n\nQuestion: {question}"
     
@@ -169,7 +102,7 @@ def answer_question(question: str, db_path: str):
     secrets=[modal.Secret.from_name("chongchen-llm-api-key")]
 )
 def generate_markdown_report(db_path = "/data/bitcoin.db"):
-    conn = sqlite3.connect(db_path)
+    conn = register_functions(sqlite3.connect(db_path))
     
     # Initialize markdown content
     markdown_content = "# Bitcoin Database Natural Language to SQL Test Results\n\n"
@@ -218,7 +151,7 @@ def generate_markdown_report(db_path = "/data/bitcoin.db"):
 def run_tests_and_generate_report(db_path = "/data/bitcoin.db"):
     """Run all test cases and generate both individual test results and a comprehensive report"""
     # Run test cases
-    conn = sqlite3.connect(db_path)
+    conn = register_functions(sqlite3.connect(db_path))
     
     # Initialize markdown content
     markdown_content = "# Bitcoin Database Natural Language to SQL Test Results\n\n"
@@ -259,10 +192,13 @@ def run_tests_and_generate_report(db_path = "/data/bitcoin.db"):
         
         # Add comparison
         if expected_error is None and generated_error is None:
-            if str(expected_result) == str(generated_result):
+            # Stream both queries instead of comparing the printed results
+            comparison = compare_queries(conn, expected_sql, generated_sql)
+            if comparison["match"]:
                 markdown_content += "✅ **Result Match**: The generated query produced the correct result.\n\n"
             else:
                 markdown_content += "❌ **Result Mismatch**: The generated query produced a different result than expected.\n\n"
+                markdown_content += f"Difference ({comparison['reason']}): `{comparison['diff'][:3]}`\n\n"
         else:
             markdown_content += "⚠️ **Error in Execution**: One or both queries produced an error.\n\n"
         
@@ -291,7 +227,7 @@ def run_tests_and_generate_report(db_path = "/data/bitcoin.db"):
 )
 def generate_summary_table(db_path = "/data/bitcoin.db"):
     """Generate a single markdown file with just the summary table of all test cases"""
-    conn = sqlite3.connect(db_path)
+    conn = register_functions(sqlite3.connect(db_path))
     
     # Initialize markdown content
     markdown_content = "# Bitcoin Database Natural Language to SQL Test Cases\n\n"
@@ -0,0 +1,254 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Phrases naming a block column, longest first so "previous block hash"
+# wins over "hash". A raw column name right after a phrase, as in
+# "transactions (ntx)", is part of the same mention.
+COLUMN_PHRASES = [
+    ("previous block hash", "previousblockhash"), ("previousblockhash", "previousblockhash"),
+    ("next block hash", "nextblockhash"), ("nextblockhash", "nextblockhash"),
+    ("merkle root", "merkleroot"), ("merkleroot", "merkleroot"),
+    ("number of transactions", "nTx"), ("transaction count", "nTx"),
+    ("transactions", "nTx"), ("ntx", "nTx"),
+    ("stripped size", "strippedsize"), ("strippedsize", "strippedsize"),
+    ("median time", "mediantime"), ("mediantime", "mediantime"),
+    ("block size", "size"), ("size", "size"), ("weight", "weight"),
+    ("difficulty", "difficulty"), ("nonce", "nonce"),
+    ("timestamp", "time"), ("time", "time"),
+    ("confirmations", "confirmations"), ("block hash", "hash"), ("hash", "hash"),
+    ("height", "height"), ("version", "version"), ("bits", "bits"), ("chainwork", "chainwork"),
+]
+COLUMNS = {phrase: column for phrase, column in COLUMN_PHRASES}
+RAW_COLUMNS = "|".join(sorted({p for p in COLUMNS if " " not in p}, key=len, reverse=True))
+COL = ("(?P<col>" + "|".join(re.escape(p) for p, _ in COLUMN_PHRASES) + ")"
+       rf"(?: (?P<raw>{RAW_COLUMNS})\b)?")
+
+AGGREGATES = {
+    "average": "AVG", "avg": "AVG", "mean": "AVG",
+    "total": "SUM", "sum of": "SUM", "sum of the": "SUM",
+    "minimum": "MIN", "min": "MIN", "lowest": "MIN", "smallest": "MIN", "earliest": "MIN",
+    "maximum": "MAX", "max": "MAX", "highest": "MAX", "largest": "MAX", "latest": "MAX",
+}
+DESCENDING = {"highest", "largest", "most", "biggest", "maximum", "latest"}
+ASCENDING = {"lowest", "smallest", "fewest", "least", "minimum", "earliest"}
+ORDER_WORDS = "|".join(sorted(DESCENDING | ASCENDING))
+AGG_WORDS = "|".join(sorted(AGGREGATES, key=len, reverse=True))
+
+COMPARATORS = {
+    "greater than": ">", "more than": ">", "above": ">", "over": ">", ">": ">",
+    "less than": "<", "fewer than": "<", "below": "<", "under": "<", "<": "<",
+    "at least": ">=", ">=": ">=", "at most": "<=", "<=": "<=",
+    "exactly": "=", "equal to": "=", "equals": "=", "=": "=",
+}
+CMP_WORDS = "|".join(re.escape(c) for c in sorted(COMPARATORS, key=len, reverse=True))
+
+TIP = "(SELECT MAX(height) FROM block)"
+
+# Words that carry no meaning once intent, column and filters are consumed;
+# anything else left over means the question is not a known shape
+FILLER = {
+    "what", "whats", "is", "was", "the", "of", "a", "an", "in", "for", "are", "there", "with",
+    "which", "has", "have", "does", "do", "were", "value", "values", "all", "across", "blocks",
+    "block", "mined", "find", "list", "show", "get", "me", "give", "bytes", "that", "where",
+    "and", "to", "by", "among", "from", "at", "it", "its", "database", "chain", "blockchain",
+}
+
+def normalize(question: str) -> str:
+    question = question.lower().replace("’", "'")
+    question = re.sub(r"(?<=\d),(?=\d{3})", "", question)         # 1,000 -> 1000
+    question = re.sub(r"[()?!.,;:]", " ", question)
+    question = re.sub(r"\bwhat's\b", "what is", question)
+    return " ".join(question.split())
+
+def _column(match: re.Match) -> Optional[str]:
+    column = COLUMNS[match.group("col")]
+    raw = match.group("raw")
+    if raw and raw in COLUMNS and COLUMNS[raw] != column:
+        return None  # Two different columns named back to back
+    return column
+
+class _Question:
+    """Normalized question text from which recognized spans are consumed"""
+    def __init__(self, question: str):
+        self.text = normalize(question)
+
+    def take(self, pattern: str) -> Optional[re.Match]:
+        match = re.search(pattern, self.text)
+        if match:
+            self.text = (self.text[:match.start()] + " " + self.text[match.end():]).strip()
+        return match
+
+    def take_all(self, pattern: str) -> List[re.Match]:
+        matches = []
+        while True:
+            match = self.take(pattern)
+            if match is None:
+                return matches
+            matches.append(match)
+
+    def leftover(self) -> List[str]:
+        words = re.sub(r"[^a-z0-9<>=#' ]", " ", self.text).split()
+        return [w for w in words if w not in FILLER and w != "'"]
+
+def _filters(q: _Question) -> Optional[Tuple[List[str], List, Optional[int]]]:
+    """Consume the filter phrases; returns (predicates, params, limit)"""
+    where, params, limit = [], [], None
+
+    for m in q.take_all(r"\b(?:between|from) (?:heights?|blocks?) (\d+) (?:and|to) (\d+)"
+                        r"|\bin the (?:height )?range(?: of)? (\d+) (?:to|and|-) (\d+)"
+                        r"|\bblocks (\d+) (?:to|through) (\d+)"):
+        lo, hi = [int(g) for g in m.groups() if g is not None]
+        where.append("height BETWEEN ? AND ?")
+        params += [lo, hi]
+    for m in q.take_all(r"\bthe first (\d+) blocks\b"):
+        where.append("height < ?")
+        params.append(int(m.group(1)))
+    for m in q.take_all(r"\bthe last (\d+) blocks\b"):
+        where.append(f"height > {TIP} - ?")
+        params.append(int(m.group(1)))
+    for m in q.take_all(r"\b(below|under|above|over) height (\d+)"):
+        where.append("height < ?" if m.group(1) in ("below", "under") else "height > ?")
+        params.append(int(m.group(2)))
+    for m in q.take_all(r"\b(?:limited to|limit) (\d+)"):
+        limit = int(m.group(1))
+
+    # <column> between A and B / <column> > N / exactly N <column>
+    for m in q.take_all(rf"\b{COL} (?:value )?between (\d+) and (\d+)"):
+        column = _column(m)
+        if column is None:
+            return None
+        where.append(f"{column} BETWEEN ? AND ?")
+        params += [int(m.group(3)), int(m.group(4))]
+    for m in q.take_all(rf"\b{COL} (?:value )?(?:is )?({CMP_WORDS}) (\d+(?:\.\d+)?)"):
+        column = _column(m)
+        if column is None:
+            return None
+        where.append(f"{column} {COMPARATORS[m.group(3)]} ?")
+        params.append(float(m.group(4)) if "." in m.group(4) else int(m.group(4)))
+    for m in q.take_all(rf"\b(exactly|at least|at most|more than|fewer than|less than) (\d+) {COL}"):
+        column = _column(m)
+        if column is None:
+            return None
+        where.append(f"{column} {COMPARATORS[m.group(1)]} ?")
+        params.append(int(m.group(2)))
+    for m in q.take_all(rf"\b{COL} starts with '([0-9a-f]+)'"):
+        column = _column(m)
+        if column is None:
+            return None
+        where.append(f"{column} LIKE ?")
+        params.append(m.group(3) + "%")
+
+    # A single block: genesis, tip, or by height
+    if q.take(r"\bgenesis block\b"):
+        where.append("height = ?")
+        params.append(0)
+    if q.take(r"\b(?:latest|most recent|newest|last) block\b|\bchain tip\b"):
+        where.append(f"height = {TIP}")
+    for m in q.take_all(r"\bblock (?:at height |number |# ?|height )?(\d+)\b|\bheight (\d+)\b"):
+        where.append("height = ?")
+        params.append(int(m.group(1) or m.group(2)))
+
+    # The same condition can be stated twice ("genesis block (block at height 0)")
+    unique, unique_params, seen = [], [], set()
+    params_iter = iter(params)
+    for predicate in where:
+        values = [next(params_iter) for _ in range(predicate.count("?"))]
+        if (predicate, tuple(values)) not in seen:
+            seen.add((predicate, tuple(values)))
+            unique.append(predicate)
+            unique_params += values
+
+    # Selectors joined by "and" ("block 5 and block 6", "the first 100 blocks
+    # and the last 100 blocks") mean two result sets, not one AND-ed filter
+    equalities = sum(p.startswith("height = ") for p in unique)
+    ranges = sum(p.startswith(("height BETWEEN", "height <", "height >")) for p in unique)
+    if equalities > 1 or ranges > 1:
+        return None
+    return unique, unique_params, limit
+
+def _render(sql: str, params: List) -> str:
+    """Inline the (numeric or hex-prefix) parameters for display and logs"""
+    parts = sql.split("?")
+    out = parts[0]
+    for value, part in zip(params, parts[1:]):
+        out += (f"'{value}'" if isinstance(value, str) else str(value)) + part
+    return out
+
+def match_template(question: str) -> Optional[Dict[str, object]]:
+    """Answer a common question shape with parameterized SQL, without the LLM.
+
+    Recognized shapes: block counts with filters, aggregates (average, total,
+    min/max) of a column, a column of one block, and top-N blocks by a
+    column. Every recognized phrase is consumed from the question; if
+    anything but filler words is left, the question is not a known shape and
+    None is returned so it falls through to the LLM.
+
+    Returns:
+        Dict with sql (with ? placeholders), params, rendered (literals
+        inlined) and intent, or None
+    """
+    q = _Question(question)
+    select, order, limit, intent = None, None, None, None
+
+    m = q.take(rf"^(?:(?:list|show|find|get|give)(?: me)? |what are )?(?:the )?top (\d+) (?:({ORDER_WORDS}) )?blocks?"
+               rf"(?: by| with the (?P<dir>{ORDER_WORDS}))? {COL}")
+    if m:
+        column = _column(m)
+        words = {m.group(2), m.group("dir")} - {None}
+        if column is None or len(words) > 1:
+            return None
+        word = words.pop() if words else "highest"  # "top 3 blocks by weight"
+        select, intent = "*", "top_n"
+        order = f"{column} {'DESC' if word in DESCENDING else 'ASC'}"
+        limit = int(m.group(1))
+    if select is None:
+        m = q.take(rf"^which block (?:has|had) the ({ORDER_WORDS}) {COL}")
+        if m:
+            column = _column(m)
+            if column is None:
+                return None
+            select, intent, limit = "*", "top_n", 1
+            order = f"{column} {'DESC' if m.group(1) in DESCENDING else 'ASC'}"
+    if select is None and q.take(r"^how many blocks\b"):
+        select, intent = "COUNT(*)", "count"
+    if select is None and q.take(r"^how many transactions(?: ntx)? (?:were there )?in total\b"):
+        select, intent = "SUM(nTx)", "aggregate"
+    if select is None:
+        m = q.take(rf"^(?:what (?:is|was) )?(?:the )?({AGG_WORDS}) {COL}")
+        if m:
+            column = _column(m)
+            if column is None:
+                return None
+            select, intent = f"{AGGREGATES[m.group(1)]}({column})", "aggregate"
+    if select is None:
+        m = (q.take(rf"^how many {COL} does")
+             or q.take(rf"^(?:what (?:is|was) |show |get )?(?:the )?{COL} (?:of|for)"))
+        if m:
+            column = _column(m)
+            if column is None:
+                return None
+            select, intent = column, "lookup"
+    if select is None and q.take(r"^(?:list|show|find|get) (?:the )?blocks\b"):
+        select, intent = "*", "list"
+
+    if select is None:
+        return None
+    filters = _filters(q)
+    if filters is None or q.leftover():
+        return None
+    where, params, stated_limit = filters
+    if intent == "lookup" and not any(w.startswith("height =") for w in where):
+        return None  # "the hash of" what?
+    if intent == "list" and stated_limit is None:
+        return None
+    limit = stated_limit or limit
+
+    sql = f"SELECT {select} FROM block"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    if order:
+        sql += f" ORDER BY {order}"
+    if limit:
+        sql += " LIMIT ?"
+        params = params + [limit]
+    return {"sql": sql, "params": params, "rendered": _render(sql, params), "intent": intent}
@@ -0,0 +1,298 @@
+from typing import Dict, List
+
+# Test questions with their reference SQL. Kept free of Modal and OpenAI
+# imports so local tools (query_bench) can load them.
+
+normal_test_cases = [
+    {
+        "question": "How many blocks are there between height 1000 and 10000?",
+        "correct_sql": "SELECT COUNT(*) FROM block WHERE height BETWEEN 1000 AND 10000;"
+    },
+    {
+        "question": "How many blocks have exactly 100 confirmations (for blocks below height 50000)?",
+        "correct_sql": "SELECT COUNT(*) FROM block WHERE confirmations = 100 AND height < 50000;"
+    },
+    {
+        "question": "What is the average difficulty of the first 1000 blocks?",
+        "correct_sql": "SELECT AVG(difficulty) FROM block WHERE height <= 1000;"
+    },
+    {
+        "question": "List the top 5 smallest blocks by size (where size > 0 bytes).",
+        "correct_sql": "SELECT * FROM block WHERE size > 0 ORDER BY size ASC LIMIT 5;"
+    },
+    {
+        "question": "What is the previous block hash of the block at height 60000?",
+        "correct_sql": "SELECT previousblockhash FROM block WHERE height = 60000;"
+    },
+    {
+        "question": "How many blocks have a nonce value between 1000 and 2000?",
+        "correct_sql": "SELECT COUNT(*) FROM block WHERE nonce BETWEEN 1000 AND 2000;"
+    },
+    {
+        "question": "What is the earliest timestamp (time) of a block with exactly 200 transactions?",
+        "correct_sql": "SELECT MIN(time) FROM block WHERE ntx = 200;"
+    },
+    {
+        "question": "What is the total weight of blocks mined in the last 1000 blocks?",
+        "correct_sql": "SELECT SUM(weight) FROM block WHERE height >= 59000;"
+    },
+    {
+        "question": "Which block has the highest difficulty among the first 1000 blocks?",
+        "correct_sql": "SELECT * FROM block WHERE height <= 1000 ORDER BY difficulty DESC LIMIT 1;"
+    },
+    {
+        "question": "List blocks where the merkleroot starts with '0000' (limited to 10).",
+        "correct_sql": "SELECT * FROM block WHERE merkleroot LIKE '0000%' LIMIT 10;"
+    }
+]
+
+hard_test_cases = [
+    {
+        "question": "Find the block where the difficulty increased by more than 10% compared to its previous block, but only if it was mined at least 2 hours after the median time of the prior 50 blocks. Include the percentage increase and the time difference.",
+        "expected_sql": """
+            WITH BlockPairs AS (
+                SELECT 
+                    b1.height AS current_height,
+                    b1.difficulty AS current_difficulty,
+                    b1.time AS current_time,
+                    b2.difficulty AS prev_difficulty,
+                    b2.time AS prev_time,
+                    (SELECT AVG(b3.mediantime) 
+                     FROM block b3 
+                     WHERE b3.height BETWEEN b1.height - 50 AND b1.height - 1) AS prior_50_median
+                FROM block b1
+                JOIN block b2 ON b1.previousblockhash = b2.hash
+            )
+            SELECT 
+                current_height,
+                ((current_difficulty - prev_difficulty) / prev_difficulty) * 100 AS percent_increase,
+                (current_time - prior_50_median) AS time_diff_seconds
+            FROM BlockPairs
+            WHERE (current_difficulty / prev_difficulty) > 1.10
+            AND (current_time - prior_50_median) >= 7200
+            LIMIT 1;
+        """
+    },
+    {
+        "question": "How many blocks contain at least 3 transactions where the first transaction’s input script contains the hex pattern 'deadbeef' and the last transaction’s output value exceeds 1 BTC?",
+        "expected_sql": """
+            SELECT COUNT(*)
+            FROM block
+            WHERE (
+                SELECT COUNT(*)
+                FROM json_each(block.tx) AS tx
+                WHERE 
+                    json_extract(tx.value, '$.inputs[0].script') LIKE '%deadbeef%'
+                    AND (
+                        SELECT json_extract(tx.value, '$.outputs[0].value')
+                        FROM json_each(tx.value) 
+                        ORDER BY CAST(json_extract(tx.value, '$.index') AS INT) DESC
+                        LIMIT 1
+                    ) > 100000000
+            ) >= 3;
+        """
+    },
+    {
+        "question": "Identify the 10-block consecutive sequence (by height) with the steepest exponential increase in chainwork value, calculated as the sum of chainwork differences between adjacent blocks.",
+        "expected_sql": """
+            WITH ChainworkNumeric AS (
+                SELECT 
+                    height,
+                    CAST(chainwork AS INTEGER) AS chainwork_num  -- Will FAIL in SQLite (hex-to-decimal)
+                FROM block
+            ),
+            Diffs AS (
+                SELECT
+                    height,
+                    chainwork_num - LAG(chainwork_num, 1) OVER (ORDER BY height) AS diff
+                FROM ChainworkNumeric
+            ),
+            Windows AS (
+                SELECT
+                    height,
+                    SUM(diff) OVER (ORDER BY height ROWS BETWEEN 9 PRECEDING AND CURRENT ROW) AS total_diff
+                FROM Diffs
+            )
+            SELECT 
+                height - 9 AS start_height,
+                height AS end_height,
+                total_diff
+            FROM Windows
+            ORDER BY total_diff DESC
+            LIMIT 1;
+        """
+    }
+]
+
+extra_normal_test_cases = [
+    {
+        "question": "What is the hash of the genesis block (block at height 0)?",
+        "expected_sql": "SELECT hash FROM block WHERE height = 0;"
+    },
+    {
+        "question": "How many confirmations does block #100000 have?",
+        "expected_sql": "SELECT confirmations FROM block WHERE height = 100000;"
+    },
+    {
+        "question": "What is the average block size for blocks between height 50000 and 55000?",
+        "expected_sql": "SELECT AVG(size) FROM block WHERE height BETWEEN 50000 AND 55000;"
+    },
+    {
+        "question": "Which block has the highest difficulty between blocks 150000 and 160000?",
+        "expected_sql": "SELECT hash, height, difficulty FROM block WHERE height BETWEEN 150000 AND 160000 ORDER BY difficulty DESC LIMIT 1;"
+    },
+    {
+        "question": "How many transactions (ntx) were there in total across all blocks in the range 123000 to 123100?",
+        "expected_sql": "SELECT SUM(ntx) FROM block WHERE height BETWEEN 123000 AND 123100;"
+    },
+    {
+        "question": "What is the timestamp (time) of the latest block in the database?",
+        "expected_sql": "SELECT time, height FROM block ORDER BY height DESC LIMIT 1;"
+    },
+    {
+        "question": "Find the 5 blocks with the largest size difference compared to their previous block between heights 75000 and 80000.",
+        "expected_sql": "SELECT b.height, b.hash, b.size, p.size AS prev_size, (b.size - p.size) AS size_diff FROM block b JOIN block p ON b.previousblockhash = p.hash WHERE b.height BETWEEN 75000 AND 80000 ORDER BY ABS(b.size - p.size) DESC LIMIT 5;"
+    },
+    {
+        "question": "What was the average time (in seconds) between blocks from height 140000 to 140100?",
+        "expected_sql": "WITH block_times AS (SELECT height, time, LAG(time) OVER (ORDER BY height) AS prev_time FROM block WHERE height BETWEEN 140000 AND 140100) SELECT AVG(time - prev_time) FROM block_times WHERE prev_time IS NOT NULL;"
+    },
+    {
+        "question": "How many blocks have a nonce value greater than 3000000000 between heights 50000 and 60000?",
+        "expected_sql": "SELECT COUNT(*) FROM block WHERE height BETWEEN 50000 AND 60000 AND nonce > 3000000000;"
+    },
+    {
+        "question": "What is the distribution of block sizes by month in 2012? Show the month, average size, min size, and max size.",
+        "expected_sql": "SELECT strftime('%Y-%m', datetime(time, 'unixepoch')) AS month, AVG(size) AS avg_size, MIN(size) AS min_size, MAX(size) AS max_size FROM block WHERE strftime('%Y', datetime(time, 'unixepoch')) = '2012' GROUP BY month ORDER BY month;"
+    },
+    {
+        "question": "Find blocks where the difficulty increased by more than 10% compared to the previous block in the range 80000 to 90000.",
+        "expected_sql": "SELECT b.height, b.hash, b.difficulty, p.difficulty AS prev_difficulty, (b.difficulty - p.difficulty)/p.difficulty*100 AS difficulty_increase_pct FROM block b JOIN block p ON b.previousblockhash = p.hash WHERE b.height BETWEEN 80000 AND 90000 AND (b.difficulty - p.difficulty)/p.difficulty > 0.1 ORDER BY difficulty_increase_pct DESC;"
+    },
+    {
+        "question": "What is the correlation between block size and number of transactions (ntx) for blocks 100000 to 110000?",
+        "expected_sql": "SELECT (COUNT(*) * SUM(size * ntx) - SUM(size) * SUM(ntx)) / (SQRT(COUNT(*) * SUM(size * size) - SUM(size) * SUM(size)) * SQRT(COUNT(*) * SUM(ntx * ntx) - SUM(ntx) * SUM(ntx))) AS correlation FROM block WHERE height BETWEEN 100000 AND 110000;"
+    },
+    {
+        "question": "How has the average block size changed each year from 2009 to 2015?",
+        "expected_sql": "SELECT strftime('%Y', datetime(time, 'unixepoch')) AS year, AVG(size) AS avg_size FROM block WHERE strftime('%Y', datetime(time, 'unixepoch')) BETWEEN '2009' AND '2015' GROUP BY year ORDER BY year;"
+    },
+    {
+        "question": "Find the top 5 blocks with the most transactions (ntx) between height 160000 and 170000.",
+        "expected_sql": "SELECT height, hash, ntx FROM block WHERE height BETWEEN 160000 AND 170000 ORDER BY ntx DESC LIMIT 5;"
+    }
+]
+
+extra_hard_test_cases = [
+    {
+        "question": "What is the median nonce value for blocks mined in February 2013?",
+        "expected_sql": """
+            SELECT AVG(nonce) 
+            FROM (
+                SELECT nonce 
+                FROM block 
+                WHERE strftime('%Y-%m', datetime(time, 'unixepoch')) = '2013-02' 
+                ORDER BY nonce 
+                LIMIT 2 - (
+                    SELECT COUNT(*) 
+                    FROM block 
+                    WHERE strftime('%Y-%m', datetime(time, 'unixepoch')) = '2013-02'
+                ) % 2 
+                OFFSET (
+                    SELECT COUNT(*) 
+                    FROM block 
+                    WHERE strftime('%Y-%m', datetime(time, 'unixepoch')) = '2013-02'
+                ) / 2
+            );
+        """
+    },
+    {
+        "question": "Analyze the 'fee market' development by calculating the implicit fee per transaction in satoshis for each block from 150000 to 160000. For this, estimate the mining reward by using the formula: (block_reward_bitcoins * 10^8 + (block_size - 80) * 10). Then calculate fee = (reward - expected_subsidy) / ntx where expected_subsidy is 50 BTC per block multiplied by 10^8 to convert to satoshis. Show the top 10 blocks with highest average fee per transaction, including block height, time (formatted as date), number of transactions, and average fee per transaction.",
+        "expected_sql": """
+            WITH block_rewards AS (
+                SELECT
+                    height,
+                    hash,
+                    ntx,
+                    size,
+                    datetime(time, 'unixepoch') AS block_date,
+                    (size - 80) * 10 AS size_reward_satoshis,
+                    CASE
+                        WHEN height < 210000 THEN 5000000000 -- 50 BTC in satoshis
+                        WHEN height < 420000 THEN 2500000000 -- 25 BTC in satoshis
+                        WHEN height < 630000 THEN 1250000000 -- 12.5 BTC in satoshis
+                        ELSE 625000000 -- 6.25 BTC in satoshis
+                    END AS block_subsidy_satoshis
+                FROM block
+                WHERE height BETWEEN 150000 AND 160000 AND ntx > 1
+            )
+            SELECT
+                height,
+                hash,
+                block_date,
+                ntx,
+                size,
+                block_subsidy_satoshis,
+                size_reward_satoshis,
+                CASE
+                    WHEN ntx > 1 THEN ROUND((size_reward_satoshis - block_subsidy_satoshis) / (ntx - 1), 2)
+                    ELSE 0
+                END AS avg_fee_per_tx_satoshis
+            FROM block_rewards
+            ORDER BY avg_fee_per_tx_satoshis DESC
+            LIMIT 10;
+        """
+    },
+    {
+        "question": "Calculate the mining difficulty adjustment pattern by finding the percentage change in difficulty between each difficulty adjustment period (every 2016 blocks) from block 50000 to 100000. Show the starting block of each period, the average block time in minutes for that period, and the percentage difficulty change.",
+        "expected_sql": """
+            WITH adjustment_periods AS (
+                SELECT 
+                    height, 
+                    difficulty,
+                    time,
+                    height / 2016 AS period_number
+                FROM block 
+                WHERE height BETWEEN 50000 AND 100000
+            ),
+            period_stats AS (
+                SELECT 
+                    period_number,
+                    MIN(height) AS start_block,
+                    MAX(difficulty) AS difficulty,
+                    (MAX(time) - MIN(time)) / (COUNT(*) - 1) / 60.0 AS avg_block_time_minutes,
+                    LAG(MAX(difficulty)) OVER (ORDER BY period_number) AS prev_difficulty
+                FROM adjustment_periods
+                GROUP BY period_number
+            )
+            SELECT 
+                start_block,
+                avg_block_time_minutes,
+                difficulty,
+                prev_difficulty,
+                CASE
+                    WHEN prev_difficulty IS NULL THEN NULL
+                    ELSE ROUND((difficulty - prev_difficulty) / prev_difficulty * 100, 2)
+                END AS difficulty_change_percent
+            FROM period_stats
+            ORDER BY start_block;
+        """
+    }
+]
+
+SUITES = {
+    "normal": normal_test_cases,
+    "hard": hard_test_cases,
+    "extra": extra_normal_test_cases + extra_hard_test_cases,
+}
+
+def load_cases(suites: List[str]) -> List[Dict]:
+    """Flatten the named suites into cases with suite, id, question and expected_sql"""
+    cases = []
+    for suite in suites:
+        for case_id, case in enumerate(SUITES[suite], start=1):
+            cases.append({
+                "suite": suite, "id": case_id, "question": case["question"],
+                "expected_sql": (case.get("expected_sql") or case["correct_sql"]).strip(),
+            })
+    return cases
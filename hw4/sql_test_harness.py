@@ -0,0 +1,258 @@
+import modal
+import os
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from db_pool import get_pool
+from result_cache import get_result_cache
+from qa_history import get_history_log, result_summary
+from result_compare import compare_queries, compare_results, is_ordered
+from query_guard import QueryTimeout, guarded_execute
+from bitcoin_sql_qa import answer_question
+from sql_test_cases import load_cases
+
+app = modal.App("bitcoin-sql-test-harness")
+volume = modal.Volume.from_name("chongchen-bitcoin-data", create_if_missing=True)
+image = (
+    modal.Image.debian_slim()
+    .pip_install("openai")
+    .add_local_python_source(
+        "db_pool", "prompt_context", "schema_pruner", "sql_cache", "result_cache", "query_guard",
+        "query_planner", "sql_functions", "sql_templates", "sql_candidates", "qa_history", "result_compare",
+        "bitcoin_sql_qa", "sql_test_cases"
+    )
+)
+
+DB_PATH = "/data/bitcoin.db"
+EXPECTED_CACHE = "/data/sql_tests/expected.db"
+REPORT_DIR = "/data/reports"
+MAX_CONTAINERS = 16   # Upper bound on run_case containers for .map
+CONCURRENCY = 0       # Cases in flight; 0 submits every case at once
+REFERENCE_BUDGET = 600.0  # Seconds per reference query; rows and bytes are capped like generated SQL
+COMPARE_BUDGET = 120.0    # Seconds to stream both queries of a truncated case
+
+def _json_value(value):
+    return value.hex() if isinstance(value, bytes) else str(value)
+
+class ExpectedAnswers:
+    """Reference SQL results, persisted across runs.
+
+    Keyed like the result cache: the SQL fingerprint plus "final" for
+    queries only touching blocks deep below the tip, else the tip height
+    and hash. A new block only recomputes the tip-dependent answers.
+    """
+    def __init__(self, path: str = EXPECTED_CACHE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        columns = [r[1] for r in self.conn.execute("PRAGMA table_info(expected)")]
+        if columns and "truncated" not in columns:
+            self.conn.execute("DROP TABLE expected")  # Answers cached without column names
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS expected ("
+            "fingerprint TEXT, version TEXT, columns JSON, rows JSON, truncated INTEGER, "
+            "error TEXT, elapsed REAL, PRIMARY KEY (fingerprint, version))"
+        )
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[Dict]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT columns, rows, truncated, error, elapsed FROM expected "
+                "WHERE fingerprint = ? AND version = ?", key
+            ).fetchone()
+        if row is None:
+            return None
+        return {"columns": json.loads(row[0]), "rows": json.loads(row[1]) if row[1] else None,
+                "truncated": bool(row[2]), "error": row[3], "elapsed": row[4], "cached": True}
+
+    def put(self, key, answer: Dict):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO expected VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*key, json.dumps(answer["columns"]),
+                 json.dumps(answer["rows"], default=_json_value) if answer["rows"] is not None else None,
+                 answer["truncated"], answer["error"], answer["elapsed"])
+            )
+            self.conn.commit()
+
+def expected_answer(db_path: str, sql: str, store: ExpectedAnswers) -> Dict:
+    """Result of reference ``sql``, from ``store`` unless its data version changed.
+
+    Rows are capped like generated SQL's; a truncated reference is compared
+    by streaming both queries instead.
+    """
+    with get_pool(db_path).snapshot() as (conn, tip_height):
+        key = get_result_cache(db_path).key(conn, sql, tip_height)
+        answer = store.get(key)
+        if answer is not None:
+            return answer
+        outcome = guarded_execute(conn, sql, time_budget=REFERENCE_BUDGET)
+    error = outcome["error"]
+    answer = {"columns": outcome["columns"], "rows": None if error else [list(r) for r in outcome["rows"]],
+              "truncated": outcome["truncated"], "error": error, "elapsed": outcome["elapsed"], "cached": False}
+    store.put(key, answer)
+    return answer
+
+def verdict(db_path: str, case: Dict, reference: Dict) -> Dict:
+    """Compare a case's answer with the reference answer.
+
+    Complete answers are compared in memory with the cached reference rows,
+    columns matched by name; if either side was truncated, both queries are
+    streamed within COMPARE_BUDGET, so large results are checked in full
+    without being materialized. A comparison that times out or fails
+    counts as a mismatch.
+    """
+    if reference["error"] is not None or case["error"] is not None or case["rows"] is None:
+        return {"match": False, "reason": "error", "diff": []}
+    ordered = is_ordered(case["expected_sql"])
+    if not case["truncated"] and not reference["truncated"]:
+        return compare_results(reference["rows"], case["rows"], ordered=ordered,
+                               expected_columns=reference["columns"], generated_columns=case["columns"])
+    with get_pool(db_path).connection() as conn:
+        try:
+            return compare_queries(conn, case["expected_sql"], case["sql"], ordered=ordered,
+                                   time_budget=COMPARE_BUDGET)
+        except QueryTimeout as e:
+            return {"match": False, "reason": f"comparison timed out: {e}", "diff": []}
+        except sqlite3.Error as e:
+            return {"match": False, "reason": f"comparison failed: {e}", "diff": []}
+
+@app.function(
+    image=image,
+    volumes={"/data": volume},
+    secrets=[modal.Secret.from_name("chongchen-llm-api-key")],
+    concurrency_limit=MAX_CONTAINERS,
+    timeout=600
+)
+def run_case(case: Dict, db_path: str = DB_PATH) -> Dict:
+    """Answer one case through the serving QA path and time it"""
+    start = time.perf_counter()
+    try:
+        response = answer_question.local(case["question"], db_path)
+    except Exception as e:  # One failing case must not sink the run
+        response = {"result": None, "columns": None, "error": f"{type(e).__name__}: {e}", "truncated": False}
+    return {
+        **case,
+        "sql": response.get("sql"),
+        "rows": response["result"],
+        "columns": response.get("columns"),
+        "error": response["error"],
+        "truncated": response["truncated"],
+        "path": response.get("path"),
+        "latency": time.perf_counter() - start,
+    }
+
+def render_report(outcomes: List[Dict], wall_time: float) -> str:
+    """Markdown report: accuracy per suite, per-case results and latency, totals"""
+    lines = ["# Bitcoin SQL QA Test Run", "",
+             f"Run at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", "",
+             "| Suite | Cases | Correct | Accuracy | Mean latency (s) | Max latency (s) |",
+             "|-------|-------|---------|----------|------------------|-----------------|"]
+    for suite in dict.fromkeys(o["suite"] for o in outcomes):
+        rows = [o for o in outcomes if o["suite"] == suite]
+        correct = sum(o["match"] for o in rows)
+        latencies = [o["latency"] for o in rows]
+        lines.append(f"| {suite} | {len(rows)} | {correct} | {correct / len(rows):.0%} | "
+                     f"{sum(latencies) / len(latencies):.2f} | {max(latencies):.2f} |")
+    correct = sum(o["match"] for o in outcomes)
+    latency_sum = sum(o["latency"] for o in outcomes)
+    lines += ["", f"**Total:** {correct}/{len(outcomes)} correct ({correct / max(len(outcomes), 1):.0%}), "
+              f"wall time {wall_time:.2f}s, sum of case latencies {latency_sum:.2f}s, "
+              f"slowest case {max((o['latency'] for o in outcomes), default=0):.2f}s", "",
+              "| Suite | # | Question | Match | Latency (s) | Path | Error / first difference |",
+              "|-------|---|----------|-------|-------------|------|-------|"]
+    for o in outcomes:
+        question = o["question"].replace("|", "\\|")
+        detail = o["error"] or o["expected"]["error"] or ""
+        if not detail and not o["match"]:
+            diff = o["comparison"]["diff"][:1]
+            detail = f"{o['comparison']['reason']}: {diff[0]}" if diff else o["comparison"]["reason"]
+        detail = str(detail).replace("|", "\\|")[:120]
+        lines.append(f"| {o['suite']} | {o['id']} | {question} | {'✅' if o['match'] else '❌'} | "
+                     f"{o['latency']:.2f} | {o['path'] or ''} | {detail} |")
+    return "\n".join(lines) + "\n"
+
+@app.function(
+    image=image,
+    volumes={"/data": volume},
+    secrets=[modal.Secret.from_name("chongchen-llm-api-key")],
+    timeout=1800
+)
+def run_suites(suites: str = "normal,hard,extra", concurrency: int = CONCURRENCY,
+               db_path: str = DB_PATH, remote: bool = True) -> Dict:
+    """Run the suites' cases concurrently and write one consolidated report.
+
+    By default every case is submitted at once: with ``run_case.map``
+    remotely, bounded only by MAX_CONTAINERS, or one thread per case
+    in-process when ``remote`` is False. A positive ``concurrency`` caps
+    the cases in flight with that many threads instead. The
+    reference answers are computed meanwhile on this container, from the
+    persistent cache where the data they depend on has not changed.
+
+    Returns:
+        Dict with report (path), accuracy, correct, cases and wall_time
+    """
+    cases = load_cases([s.strip() for s in suites.split(",") if s.strip()])
+    started = time.perf_counter()
+
+    # Reference answers run alongside the LLM cases, not before them
+    store = ExpectedAnswers()
+    reference_pool = ThreadPoolExecutor(max_workers=get_pool(db_path).size)
+    expected = {case["expected_sql"]: reference_pool.submit(expected_answer, db_path, case["expected_sql"], store)
+                for case in cases}
+
+    if remote and concurrency <= 0:
+        answers = list(run_case.map(cases, kwargs={"db_path": db_path}))
+    else:
+        runner = run_case.remote if remote else run_case.local
+        workers = concurrency if concurrency > 0 else len(cases)
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as case_pool:
+            answers = list(case_pool.map(lambda case: runner(case, db_path), cases))
+    reference_pool.shutdown(wait=True)
+    wall_time = time.perf_counter() - started
+
+    history = get_history_log(commit=volume.commit)
+    outcomes = []
+    for answer in answers:
+        reference = expected[answer["expected_sql"]].result()
+        comparison = verdict(db_path, answer, reference)
+        outcome = {**answer, "expected": reference, "match": comparison["match"], "comparison": comparison}
+        outcomes.append(outcome)
+        history.append({
+            "kind": f"test_{answer['suite']}", "test_id": answer["id"], "question": answer["question"],
+            "expected_sql": answer["expected_sql"], "expected": result_summary(reference["rows"]),
+            "sql": answer["sql"], **result_summary(answer["rows"]), "error": answer["error"],
+            "path": answer["path"], "latency": answer["latency"], "match": outcome["match"],
+            "mismatch": comparison["reason"], "diff": comparison["diff"],
+        })
+
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    report_file = os.path.join(REPORT_DIR, f"sql_test_run_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md")
+    with open(report_file, "w") as f:
+        f.write(render_report(outcomes, wall_time))
+    history.flush(commit=True)  # Also commits the report
+
+    correct = sum(o["match"] for o in outcomes)
+    return {"report": report_file, "correct": correct, "cases": len(outcomes),
+            "accuracy": correct / max(len(outcomes), 1), "wall_time": wall_time,
+            "slowest_case": max((o["latency"] for o in outcomes), default=0.0)}
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Run the SQL QA test suites concurrently.")
+    parser.add_argument("--suites", default="normal,hard,extra", help="Comma-separated suites")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY,
+                        help="Cases in flight; 0 (default) submits all of them at once")
+    parser.add_argument("--db-path", default=DB_PATH)
+    args = parser.parse_args()
+
+    with app.run():
+        summary = run_suites.remote(args.suites, args.concurrency, args.db_path)
+        print(f"{summary['correct']}/{summary['cases']} correct ({summary['accuracy']:.0%}) "
+              f"in {summary['wall_time']:.1f}s, slowest case {summary['slowest_case']:.1f}s")
+        print(f"Report: {summary['report']}")
@@ -1,12 +1,25 @@
-# File: static/app.js
+// File: static/app.js
 const { useState, useEffect } = React;
 
+const NUMERIC_TYPES = ['integer', 'real'];
+
+// Reads /api/query/page JSON or the error the API returned instead
+async function readJson(response) {
+    const data = await response.json();
+    if (!response.ok) {
+        throw new Error(data.error || `Request failed (${response.status})`);
+    }
+    return data;
+}
+
 function BitcoinExplorer() {
     const [dbInfo, setDbInfo] = useState(null);
     const [question, setQuestion] = useState('');
     const [sql, setSql] = useState('');
     const [results, setResults] = useState(null);
+    const [nextCursor, setNextCursor] = useState(null);
     const [loading, setLoading] = useState(false);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [error, setError] = useState(null);
 
     useEffect(() => {
@@ -16,8 +29,7 @@ function BitcoinExplorer() {
     const fetchDbInfo = async () => {
         try {
             const response = await fetch('/api/db-info');
-            const data = await response.json();
-            setDbInfo(data);
+            setDbInfo(await readJson(response));
         } catch (err) {
             setError('Failed to fetch database info');
         }
@@ -27,6 +39,8 @@ function BitcoinExplorer() {
         e.preventDefault();
         setLoading(true);
         setError(null);
+        setResults(null);
+        setNextCursor(null);
         
         try {
             const response = await fetch('/api/query', {
@@ -37,16 +51,32 @@ function BitcoinExplorer() {
                 body: JSON.stringify({ question }),
             });
             
-            const data = await response.json();
+            const data = await readJson(response);
             setSql(data.sql);
-            setResults(data.results);
+            // One page of typed rows; the rest is fetched with the cursor
+            setResults(data);
+            setNextCursor(data.next_cursor);
         } catch (err) {
-            setError('Failed to process query');
+            setError(err.message || 'Failed to process query');
         } finally {
             setLoading(false);
         }
     };
 
+    const loadMore = async () => {
+        setLoadingMore(true);
+        try {
+            const response = await fetch(`/api/query/page?cursor=${encodeURIComponent(nextCursor)}`);
+            const data = await readJson(response);
+            setResults((previous) => ({ ...data, rows: previous.rows.concat(data.rows) }));
+            setNextCursor(data.next_cursor);
+        } catch (err) {
+            setError(err.message || 'Failed to load more rows');
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     return (
         <div className="app-container">
             <div className="content-container">
@@ -114,21 +144,33 @@ function BitcoinExplorer() {
                 {results && (
                     <div className="card">
                         <h2 className="card-title">Query Results</h2>
+                        <div className="results-summary">
+                            Showing {results.rows.length} of {results.row_count}
+                            {results.truncated ? '+' : ''} rows
+                            {' '}(block {results.tip_height})
+                            {' '}&middot;{' '}
+                            <a href={`/api/query/stream?cursor=${encodeURIComponent(results.cursor)}`}>
+                                Download all as NDJSON
+                            </a>
+                        </div>
                         <div className="table-container">
                             <table className="table">
                                 <thead>
                                     <tr>
-                                        {Object.keys(results[0] || {}).map((key) => (
-                                            <th key={key}>{key}</th>
+                                        {results.columns.map((column) => (
+                                            <th key={column.name} title={column.type}>{column.name}</th>
                                         ))}
                                     </tr>
                                 </thead>
                                 <tbody>
-                                    {results.map((row, i) => (
+                                    {results.rows.map((row, i) => (
                                         <tr key={i}>
-                                            {Object.values(row).map((value, j) => (
-                                                <td key={j}>
-                                                    {typeof value === 'object' ? JSON.stringify(value) : value}
+                                            {row.map((value, j) => (
+                                                <td
+                                                    key={j}
+                                                    className={NUMERIC_TYPES.includes(results.columns[j].type) ? 'numeric' : ''}
+                                                >
+                                                    {value !== null && typeof value === 'object' ? JSON.stringify(value) : value}
                                                 </td>
                                             ))}
                                         </tr>
@@ -136,6 +178,16 @@ function BitcoinExplorer() {
                                 </tbody>
                             </table>
                         </div>
+                        {nextCursor && (
+                            <button
+                                type="button"
+                                onClick={loadMore}
+                                disabled={loadingMore}
+                                className="button load-more"
+                            >
+                                {loadingMore ? 'Loading...' : 'Load more'}
+                            </button>
+                        )}
                     </div>
                 )}
 
@@ -1,7 +1,15 @@
 import modal
 import sqlite3
+import asyncio
 import os
 
+from db_pool import get_pool
+from prompt_context import get_prompt_context_cache
+from result_cache import get_result_cache
+from query_guard import guarded_execute
+from query_planner import review_sql
+from sql_functions import FUNCTION_DOCS
+
 app = modal.App(name="bitcoin-query-app")
 volume = modal.Volume.from_name("chongchen-bitcoin-data", create_if_missing=True)
 
@@ -17,10 +25,12 @@ bitcoin_image = (
     )
     .add_local_dir("templates", remote_path="/root/templates")
     .add_local_dir("static", remote_path="/root/static")
+    .add_local_python_source("db_pool", "prompt_context", "schema_pruner", "result_cache", "query_guard", "query_planner", "sql_functions")
 )
 
 DB_PATH = "/data/bitcoin.db"
 OPENAI_SECRET = modal.Secret.from_name("openai-api-key")
+BLOCK_COUNT_SQL = "SELECT COUNT(*) FROM block"
 
 # Move FastAPI creation inside a function to ensure proper dependency loading
 def create_app():
@@ -40,9 +50,15 @@ def create_app():
     @web_app.post("/query", response_class=HTMLResponse)
     async def handle_query(request: Request, question: str = Form(...)):
         try:
-            generated_sql = generate_sql.remote(question)
-            results = execute_query.remote(generated_sql)
-            db_info = get_database_info.remote()
+            # With the volume mounted here, generation and execution run in
+            # this warm process instead of hopping to other containers
+            call = "local" if os.path.exists(DB_PATH) else "remote"
+            # The LLM call and the DB info lookup overlap; the query follows
+            generated_sql, db_info = await asyncio.gather(
+                asyncio.to_thread(getattr(generate_sql, call), question),
+                asyncio.to_thread(getattr(get_database_info, call))
+            )
+            results = await asyncio.to_thread(getattr(execute_query, call), generated_sql)
             
             return templates.TemplateResponse("index.html", {
                 "request": request,
@@ -63,42 +79,22 @@ def create_app():
 @app.function(
     image=bitcoin_image,
     secrets=[OPENAI_SECRET],
+    volumes={"/data": volume},
     keep_warm=1
 )
 def generate_sql(question: str) -> str:
     import openai
     openai.api_key = os.environ["OPENAI_API_KEY"]
     
-    schema = """
-    CREATE TABLE block (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        hash VARCHAR(255) NOT NULL,
-        confirmations INTEGER NOT NULL,
-        height INTEGER NOT NULL,
-        version INTEGER NOT NULL,
-        versionhex VARCHAR(255) NOT NULL,
-        merkleroot VARCHAR(255) NOT NULL,
-        time INTEGER NOT NULL,
-        mediantime INTEGER NOT NULL,
-        nonce INTEGER NOT NULL,
-        bits VARCHAR(255) NOT NULL,
-        difficulty REAL NOT NULL,
-        chainwork VARCHAR(255) NOT NULL,
-        ntx INTEGER NOT NULL,
-        previousblockhash VARCHAR(255) NOT NULL,
-        nextblockhash VARCHAR(255) NOT NULL,
-        strippedsize INTEGER NOT NULL,
-        size INTEGER NOT NULL,
-        weight INTEGER NOT NULL,
-        tx JSON NOT NULL
-    );
-    """
+    # Only the tables and columns the question needs, from the live schema
+    with get_pool(DB_PATH).connection() as conn:
+        schema = get_prompt_context_cache(DB_PATH).get(conn, question, details=False)
     
     response = openai.ChatCompletion.create(
         model="gpt-4",
         messages=[{
             "role": "system",
-            "content": f"Convert this natural language question into a SQL query for the following schema. Only respond with SQL, no explanation.\n\nSchema:\n{schema}"
+            "content": f"Convert this natural language question into a SQL query for the following schema. Only respond with SQL, no explanation.\n\n{schema}\n\n{FUNCTION_DOCS}"
         }, {
             "role": "user",
             "content": question
@@ -112,9 +108,25 @@ def generate_sql(question: str) -> str:
     volumes={"/data": volume},
     keep_warm=1
 )
-def execute_query(sql: str) -> list:
-    # Keep your existing query execution logic
-    pass  
+def execute_query(sql: str) -> dict:
+    # Pooled read-only connection; the result is tied to the snapshot's tip.
+    # Repeated queries are served from the result cache for that data version.
+    result_cache = get_result_cache(DB_PATH)
+    with get_pool(DB_PATH).snapshot() as (conn, tip_height):
+        # Known-slow patterns (e.g. hash lookups on binary storage) become
+        # index seeks; SQL that does not prepare runs as is and errors below
+        sql = review_sql(conn, sql)["sql"]
+        key = result_cache.key(conn, sql, tip_height)
+        cached = result_cache.get(key)
+        if cached is None:
+            outcome = guarded_execute(conn, sql)
+            if outcome["error"]:
+                # Surfaces through handle_query's error branch, as before
+                raise sqlite3.OperationalError(outcome["error"])
+            cached = {"columns": outcome["columns"], "data": outcome["rows"],
+                      "truncated": outcome["truncated"]}
+            result_cache.put(key, cached)
+    return {**cached, "tip_height": tip_height}
 
 @app.function(
     image=bitcoin_image,
@@ -122,10 +134,28 @@ def execute_query(sql: str) -> list:
     keep_warm=1
 )
 def get_database_info() -> dict:
-    # Keep your existing database info logic
-    pass
+    # The block count is cached like a query result, so it is only
+    # recomputed once a new block (or a reorg) changes the tip
+    result_cache = get_result_cache(DB_PATH)
+    with get_pool(DB_PATH).snapshot() as (conn, tip_height):
+        key = result_cache.key(conn, BLOCK_COUNT_SQL, tip_height)
+        block_count = result_cache.get(key)
+        if block_count is None:
+            block_count = conn.execute(BLOCK_COUNT_SQL).fetchone()[0]
+            result_cache.put(key, block_count)
+    return {
+        "block_count": block_count,
+        "max_height": tip_height,
+        "database_size": os.path.getsize(DB_PATH),
+        "tip_height": tip_height
+    }
 
-@app.function(image=bitcoin_image)
+@app.function(
+    image=bitcoin_image,
+    secrets=[OPENAI_SECRET],
+    volumes={"/data": volume},
+    keep_warm=1
+)
 @modal.asgi_app()
 def fastapi_app():
     return create_app()
\ No newline at end of file
@@ -1,25 +1,100 @@
 import modal
 from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from pydantic import BaseModel
+from concurrent.futures import ThreadPoolExecutor
 import openai
 import sqlite3
+import asyncio
+import json
 import os
 
+from db_pool import get_pool
+from prompt_context import get_prompt_context_cache
+from result_cache import get_result_cache
+from query_guard import guarded_execute
+from query_planner import review_sql
+from sql_functions import FUNCTION_DOCS
+from result_pages import PAGE_SIZE, StaleCursor, get_result_pages, render_page
+from http_compression import CompressionMiddleware
+
 app = modal.App(name="bitcoin-query-app")
 volume = modal.Volume.from_name("chongchen-bitcoin-data", create_if_missing=True)
 bitcoin_image = (
     modal.Image.debian_slim()
-    .pip_install("openai", "fastapi", "jinja2", "python-multipart")
+    .pip_install("openai", "fastapi", "jinja2", "python-multipart", "brotli")
     .add_local_dir("templates", remote_path="/root/templates")
     .add_local_dir("static", remote_path="/root/static")
+    .add_local_python_source(
+        "db_pool", "prompt_context", "schema_pruner", "result_cache", "query_guard",
+        "query_planner", "sql_functions", "result_pages", "http_compression"
+    )
 )
 
 DB_PATH = "/data/bitcoin.db"
 OPENAI_SECRET = modal.Secret.from_name("openai-api-key")
+CURSOR_SECRET = modal.Secret.from_name("result-cursor-secret")  # Sets RESULT_CURSOR_SECRET
+LLM_TIMEOUT = 30          # seconds for the SQL generation call
+QUERY_TIMEOUT = 15        # seconds a query may run before SQLite interrupts it
+REQUEST_TIMEOUT = 50      # seconds for a whole /query request
+CONCURRENT_REQUESTS = 32  # requests one container serves at once
+BLOCK_COUNT_SQL = "SELECT COUNT(*) FROM block"
+
+# SQLite work runs on these threads, never on the event loop. One worker per
+# pooled read-only connection, so a worker never waits for a connection.
+db_executor = ThreadPoolExecutor(max_workers=get_pool(DB_PATH).size, thread_name_prefix="sqlite")
+_llm_client = None
+
+def llm_client() -> "openai.AsyncOpenAI":
+    """Container-wide async OpenAI client (one HTTP connection pool)"""
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = openai.AsyncOpenAI(api_key=os.environ["OPENAI_API_KEY"], timeout=LLM_TIMEOUT)
+    return _llm_client
+
+async def run_db(fn, *args):
+    """Run blocking SQLite work on the bounded database thread pool"""
+    return await asyncio.get_running_loop().run_in_executor(db_executor, fn, *args)
+
+async def closing_stream(chunks):
+    """Iterate a blocking generator off the event loop and close it when
+    the response ends, including when the client disconnects mid-stream"""
+    try:
+        while True:
+            chunk = await run_in_threadpool(next, chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        chunks.close()  # A cancelled next() has returned by now; this only runs its cleanup
+
+def result_pages():
+    """Container-wide page store; cursors are signed with the dedicated
+    shared secret, so any container can serve the next page"""
+    return get_result_pages(DB_PATH, os.environ["RESULT_CURSOR_SECRET"].encode())
+
+def planned_sql(sql: str) -> str:
+    """Generated SQL with the planner's rewrites applied (e.g. hash lookups
+    on binary storage become index seeks); SQL that does not prepare is
+    returned as is and fails when it runs"""
+    with get_pool(DB_PATH).connection() as conn:
+        return review_sql(conn, sql)["sql"]
+
+def first_page(sql: str) -> dict:
+    """First page of ``sql``'s result, shaped like execute_query's result"""
+    page = result_pages().page(sql)
+    return {
+        "columns": [column["name"] for column in page["columns"]],
+        "data": [json.loads(row) for row in page["rows"]],
+        "truncated": page["truncated"] or page["next_cursor"] is not None,
+        "tip_height": page["tip_height"],
+    }
 
 web_app = FastAPI()
+web_app.add_middleware(CompressionMiddleware)
 templates = Jinja2Templates(directory="templates")
 web_app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -27,17 +102,23 @@ web_app.mount("/static", StaticFiles(directory="static"), name="static")
 async def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
+async def answer(question: str):
+    """Generate SQL and run it; the DB info lookup overlaps the LLM call"""
+    db_info = asyncio.ensure_future(run_db(get_database_info.local))
+    try:
+        generated_sql = await run_db(planned_sql, await complete_sql(question))
+        results = await run_db(first_page, generated_sql)
+    except BaseException:  # Including the cancellation on timeout
+        db_info.cancel()
+        raise
+    return generated_sql, results, await db_info
+
 @web_app.post("/query", response_class=HTMLResponse)
 async def handle_query(request: Request, question: str = Form(...)):
+    # Only awaits: the LLM call is async and SQLite runs on db_executor, so
+    # a slow question never stalls the other requests on the event loop
     try:
-        # Generate SQL
-        generated_sql = generate_sql(question)
-        
-        # Execute query
-        results = execute_query(generated_sql)
-        
-        # Get database info
-        db_info = get_database_info()
+        generated_sql, results, db_info = await asyncio.wait_for(answer(question), REQUEST_TIMEOUT)
         
         return templates.TemplateResponse("index.html", {
             "request": request,
@@ -46,12 +127,76 @@ async def handle_query(request: Request, question: str = Form(...)):
             "results": results,
             "db_info": db_info
         })
+    except asyncio.TimeoutError:
+        error = f"Request timed out after {REQUEST_TIMEOUT}s"
     except Exception as e:
-        return templates.TemplateResponse("index.html", {
-            "request": request,
-            "error": str(e),
-            "question": question
-        })
+        error = str(e)
+    return templates.TemplateResponse("index.html", {
+        "request": request,
+        "error": error,
+        "question": question
+    })
+
+# JSON API used by static/app.js (served at /app). Results come a page at a
+# time with a signed keyset cursor, or as one NDJSON stream.
+
+class QueryRequest(BaseModel):
+    question: str
+    page_size: int = PAGE_SIZE
+
+def json_error(message: str, status_code: int, **fields) -> JSONResponse:
+    return JSONResponse({"error": message, **fields}, status_code=status_code)
+
+@web_app.get("/app", response_class=HTMLResponse)
+async def react_app():
+    return FileResponse("static/index.html")
+
+@web_app.get("/api/db-info")
+async def api_db_info():
+    info = await run_db(get_database_info.local)
+    return {**info, "total_blocks": info["block_count"]}
+
+@web_app.post("/api/query")
+async def api_query(body: QueryRequest):
+    try:
+        sql = await asyncio.wait_for(complete_sql(body.question), LLM_TIMEOUT)
+    except asyncio.TimeoutError:
+        return json_error(f"SQL generation timed out after {LLM_TIMEOUT}s", 504)
+    except Exception as e:
+        return json_error(f"SQL generation failed: {e}", 502)
+    try:
+        sql = await run_db(planned_sql, sql)
+        page = await run_db(result_pages().page, sql, 0, body.page_size)
+    except sqlite3.Error as e:
+        return json_error(str(e), 400, sql=sql)
+    return Response(render_page(page, sql=sql), media_type="application/json")
+
+@web_app.get("/api/query/page")
+async def api_query_page(cursor: str, page_size: int = PAGE_SIZE):
+    store = result_pages()
+    try:
+        sql, key, after = store.decode_cursor(cursor)
+        page = await run_db(store.page, sql, after, page_size, key)
+    except ValueError as e:
+        return json_error(str(e), 400)
+    except StaleCursor as e:
+        return json_error(str(e), 410)
+    except sqlite3.Error as e:
+        return json_error(str(e), 400)
+    return Response(render_page(page, sql=sql), media_type="application/json")
+
+@web_app.get("/api/query/stream")
+async def api_query_stream(cursor: str):
+    store = result_pages()
+    try:
+        sql, key, _ = store.decode_cursor(cursor)
+    except ValueError as e:
+        return json_error(str(e), 400)
+    if await run_db(store.version, sql) != key:
+        return json_error("The data changed since this cursor was issued; run the query again", 410)
+    # Rows are read on Starlette's worker threads from a connection outside
+    # the pool, so a slow download never holds up db_executor
+    return StreamingResponse(closing_stream(store.stream(sql, key)), media_type="application/x-ndjson")
 
 @app.function(
     volumes={"/data": volume},
@@ -59,39 +204,22 @@ async def handle_query(request: Request, question: str = Form(...)):
     secrets=[OPENAI_SECRET],
     keep_warm=1
 )
-def generate_sql(question: str) -> str:
-    openai.api_key = os.environ["OPENAI_API_KEY"]
-    
-    schema = """
-    CREATE TABLE block (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        hash VARCHAR(255) NOT NULL,
-        confirmations INTEGER NOT NULL,
-        height INTEGER NOT NULL,
-        version INTEGER NOT NULL,
-        versionhex VARCHAR(255) NOT NULL,
-        merkleroot VARCHAR(255) NOT NULL,
-        time INTEGER NOT NULL,
-        mediantime INTEGER NOT NULL,
-        nonce INTEGER NOT NULL,
-        bits VARCHAR(255) NOT NULL,
-        difficulty REAL NOT NULL,
-        chainwork VARCHAR(255) NOT NULL,
-        ntx INTEGER NOT NULL,
-        previousblockhash VARCHAR(255) NOT NULL,
-        nextblockhash VARCHAR(255) NOT NULL,
-        strippedsize INTEGER NOT NULL,
-        size INTEGER NOT NULL,
-        weight INTEGER NOT NULL,
-        tx JSON NOT NULL
-    );
-    """
+async def generate_sql(question: str) -> str:
+    return await complete_sql(question)
+
+def prompt_schema(question: str) -> str:
+    """Only the tables and columns the question needs, from the live schema"""
+    with get_pool(DB_PATH).connection() as conn:
+        return get_prompt_context_cache(DB_PATH).get(conn, question, details=False)
+
+async def complete_sql(question: str) -> str:
+    schema = await run_db(prompt_schema, question)
     
-    response = openai.ChatCompletion.create(
+    response = await llm_client().chat.completions.create(
         model="gpt-4",
         messages=[{
             "role": "system",
-            "content": f"Convert this natural language question into a SQL query for the following schema. Only respond with SQL, no explanation.\n\nSchema:\n{schema}"
+            "content": f"Convert this natural language question into a SQL query for the following schema. Only respond with SQL, no explanation.\n\n{schema}\n\n{FUNCTION_DOCS}"
         }, {
             "role": "user",
             "content": question
@@ -105,13 +233,22 @@ def generate_sql(question: str) -> str:
     image=bitcoin_image,
     keep_warm=1
 )
-def execute_query(sql: str) -> list:
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute(sql)
-        results = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
-        return {"columns": columns, "data": results}
+def execute_query(sql: str) -> dict:
+    # Pooled read-only connection; the result is tied to the snapshot's tip.
+    # Repeated queries are served from the result cache for that data version.
+    result_cache = get_result_cache(DB_PATH)
+    with get_pool(DB_PATH).snapshot() as (conn, tip_height):
+        key = result_cache.key(conn, sql, tip_height)
+        cached = result_cache.get(key)
+        if cached is None:
+            outcome = guarded_execute(conn, sql, time_budget=QUERY_TIMEOUT)
+            if outcome["error"]:
+                # Surfaces through handle_query's error branch, as before
+                raise sqlite3.OperationalError(outcome["error"])
+            cached = {"columns": outcome["columns"], "data": outcome["rows"],
+                      "truncated": outcome["truncated"]}
+            result_cache.put(key, cached)
+    return {**cached, "tip_height": tip_height}
 
 @app.function(
     volumes={"/data": volume},
@@ -119,25 +256,36 @@ def execute_query(sql: str) -> list:
     keep_warm=1
 )
 def get_database_info() -> dict:
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM block")
-        block_count = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT MAX(height) FROM block")
-        max_height = cursor.fetchone()[0]
-        
-        return {
-            "block_count": block_count,
-            "max_height": max_height,
-            "database_size": os.path.getsize(DB_PATH)
-        }
+    # The block count is cached like a query result, so it is only
+    # recomputed once a new block (or a reorg) changes the tip
+    result_cache = get_result_cache(DB_PATH)
+    with get_pool(DB_PATH).snapshot() as (conn, tip_height):
+        key = result_cache.key(conn, BLOCK_COUNT_SQL, tip_height)
+        block_count = result_cache.get(key)
+        if block_count is None:
+            block_count = conn.execute(BLOCK_COUNT_SQL).fetchone()[0]
+            result_cache.put(key, block_count)
+        min_height = conn.execute("SELECT MIN(height) FROM block_header").fetchone()[0]
+        total_tables = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+    return {
+        "block_count": block_count,
+        "min_height": min_height,
+        "total_tables": total_tables,
+        "max_height": tip_height,
+        "database_size": os.path.getsize(DB_PATH),
+        "tip_height": tip_height
+    }
 
 @app.function(
+    image=bitcoin_image,
+    volumes={"/data": volume},
+    secrets=[OPENAI_SECRET, CURSOR_SECRET],
     mounts=[
         modal.Mount.from_local_dir("templates", remote_path="/root/templates"),
         modal.Mount.from_local_dir("static", remote_path="/root/static")
-    ]
+    ],
+    allow_concurrent_inputs=CONCURRENT_REQUESTS,
+    keep_warm=1
 )
 
 @modal.asgi_app()
@@ -0,0 +1,105 @@
+import time
+import json
+import argparse
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import requests
+
+QUESTIONS = [
+    "What is the height of the latest block?",
+    "How many blocks are in the database?",
+    "What is the average block size?",
+    "Which block has the most transactions?",
+    "What is the average difficulty of the last 100 blocks?",
+    "Show the 5 largest blocks by size.",
+    "How many blocks were mined in 2009?",
+    "What is the total number of transactions across all blocks?",
+]
+REQUEST_TIMEOUT = 120   # client-side seconds per request
+PROBE_INTERVAL = 0.5    # seconds between GET / probes while a level runs
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+def probe(url: str, stop: threading.Event, latencies: List[float]):
+    """Time GET / until ``stop``; slow probes mean the event loop is blocked"""
+    with requests.Session() as session:
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                session.get(url, timeout=REQUEST_TIMEOUT).raise_for_status()
+                latencies.append(time.perf_counter() - start)
+            except requests.RequestException:
+                pass
+            stop.wait(PROBE_INTERVAL)
+
+def user(url: str, questions: List[str], offset: int, count: int) -> List[Dict]:
+    """One simulated user posting ``count`` questions back to back"""
+    outcomes = []
+    with requests.Session() as session:
+        for i in range(count):
+            question = questions[(offset + i) % len(questions)]
+            start = time.perf_counter()
+            try:
+                response = session.post(f"{url}/query", data={"question": question}, timeout=REQUEST_TIMEOUT)
+                ok = response.ok and "timed out" not in response.text
+                status = response.status_code
+            except requests.RequestException as e:
+                ok, status = False, type(e).__name__
+            outcomes.append({"latency": time.perf_counter() - start, "ok": ok, "status": status})
+    return outcomes
+
+def run_level(url: str, users: int, per_user: int, questions: List[str]) -> Dict:
+    """Run ``users`` concurrent users and summarize latency and throughput"""
+    stop = threading.Event()
+    probes: List[float] = []
+    prober = threading.Thread(target=probe, args=(url, stop, probes), daemon=True)
+    prober.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        runs = pool.map(lambda u: user(url, questions, u * per_user, per_user), range(users))
+        outcomes = [o for run in runs for o in run]
+    wall = time.perf_counter() - start
+    stop.set()
+    prober.join()
+
+    latencies = [o["latency"] for o in outcomes if o["ok"]]
+    return {
+        "users": users,
+        "requests": len(outcomes),
+        "errors": sum(not o["ok"] for o in outcomes),
+        "throughput": round(len(latencies) / wall, 3),
+        "p50": round(statistics.median(latencies), 3) if latencies else None,
+        "p95": round(_percentile(latencies, 0.95), 3),
+        "max": round(max(latencies, default=0.0), 3),
+        "probe_p95": round(_percentile(probes, 0.95), 3),
+        "wall_time": round(wall, 3),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the explorer's /query endpoint.")
+    parser.add_argument("url", help="Base URL of the deployed app, e.g. https://...modal.run")
+    parser.add_argument("--users", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=8, help="Questions per user per level")
+    parser.add_argument("--questions-file", help="File with one question per line")
+    args = parser.parse_args()
+
+    questions = QUESTIONS
+    if args.questions_file:
+        with open(args.questions_file) as f:
+            questions = [line.strip() for line in f if line.strip()]
+    url = args.url.rstrip("/")
+
+    results = [run_level(url, int(u), args.requests, questions) for u in args.users.split(",")]
+    print("| Users | Requests | Errors | Throughput (req/s) | p50 (s) | p95 (s) | Max (s) | GET / p95 (s) |")
+    print("|-------|----------|--------|--------------------|---------|---------|---------|---------------|")
+    for r in results:
+        print(f"| {r['users']} | {r['requests']} | {r['errors']} | {r['throughput']} | "
+              f"{r['p50']} | {r['p95']} | {r['max']} | {r['probe_p95']} |")
+    print(json.dumps(results, indent=2))